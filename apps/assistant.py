@@ -3,16 +3,23 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import streamlit as st
 from langchain_core.messages import HumanMessage, AIMessage
-from src.graph import legal_assistant
-from src.vector_store import VectorStoreManager
+from src.graph import legal_assistant, cached_answer, remember_answer
+from src.answer_cache import stream_cached
+from src.embedding_cache import embedding_turn
+from src.api_client import AssistantAPIClient
+from src.clients import get_vector_store_manager
+from src.tracing import trace_turn, start_metrics_server
+from src.content_worker import enqueue_conversation, create_job_queue
 from config.database import FAQDatabase
 from config.settings import settings
-import subprocess
-import json
 import os
-import uuid
 import sys
+import logging
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextvars import copy_context
+
+logger = logging.getLogger(__name__)
 
 # Page configuration
 st.set_page_config(
@@ -23,16 +30,43 @@ st.set_page_config(
 )
 
 # Initialize Managers once using Streamlit's cache
-@st.cache_resource
-def get_vector_store_manager():
-    return VectorStoreManager()
-
 @st.cache_resource
 def get_faq_database():
     return FAQDatabase(db_path=settings.DATABASE_PATH)
 
+@st.cache_resource
+def get_job_queue():
+    return create_job_queue()
+
+@st.cache_resource
+def get_api_client():
+    # With ASSISTANT_API_URL set, answers come from the HTTP API instead of an in-process graph
+    if not settings.ASSISTANT_API_URL:
+        return None
+    return AssistantAPIClient(settings.ASSISTANT_API_URL, timeout=settings.ASSISTANT_API_TIMEOUT_SECONDS)
+
+@st.cache_resource
+def get_related_questions_executor():
+    # Shared by all sessions; lookups are I/O bound and short. The pool size caps how many
+    # lookups, including timed-out ones that still run to completion, use threads at once
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="related-questions")
+
+@st.cache_resource
+def get_metrics_server():
+    try:
+        return start_metrics_server(settings.METRICS_PORT)
+    except OSError as e:
+        # Another app process on this host already serves the port
+        logger.warning(f"Metrics endpoint not started: {e}")
+        return None
+
 vector_store_manager = get_vector_store_manager()
 faq_db = get_faq_database()
+api_client = get_api_client()
+
+# User types map onto the API's personas
+USER_TYPE_PERSONAS = {"Legal Professional": "professional", "Law Student": "student", "General Public": "general"}
+get_metrics_server()
 
 # --- MODIFIED ---
 def initialize_session_state():
@@ -52,7 +86,7 @@ def initialize_session_state():
         st.session_state.related_questions = []
 
 def trigger_content_generation():
-    """Saves conversation and triggers the unified background content generation script."""
+    """Queues the conversation for the background content worker (`generate_content_task.py --worker`)."""
     if not st.session_state.get("messages") or len(st.session_state.messages) < 2:
         st.toast("Conversation is too short for analysis.", icon="INFO")
         return
@@ -62,20 +96,11 @@ def trigger_content_generation():
         for msg in st.session_state.messages
     ]
 
-    temp_dir = "temp_conversations"
-    os.makedirs(temp_dir, exist_ok=True)
-    file_path = os.path.join(temp_dir, f"conv_{uuid.uuid4()}.json")
-    with open(file_path, 'w') as f:
-        json.dump(conversation_history, f)
-        
-    script_path = "generate_content_task.py"
-    command = [sys.executable, script_path, file_path]
-    
     try:
-        subprocess.Popen(command)
+        enqueue_conversation(get_job_queue(), conversation_history)
         st.toast("Thanks for your chat! We'll use it to improve future suggestions and FAQs.", icon="✅")
     except Exception as e:
-        st.error(f"Failed to start background task: {e}")
+        st.error(f"Failed to queue background task: {e}")
 
 # --- MODIFIED ---
 def reset_conversation():
@@ -98,22 +123,56 @@ def display_faq_page():
         st.rerun()
     
     st.markdown("---")
-    all_faqs = faq_db.get_all_faqs()
-    if not all_faqs:
+    categories = faq_db.get_categories()
+    if not categories:
         st.info("No FAQs have been generated yet. Complete a few chats and they will appear here.")
         return
 
+    col1, col2 = st.columns([2, 1])
+    search = col1.text_input("🔍 Search FAQs", placeholder="e.g. notice period")
+    category_counts = dict(categories)
+    category = col2.selectbox(
+        "Category",
+        [None] + list(category_counts),
+        format_func=lambda c: "All categories" if c is None else f"{c} ({category_counts[c]})"
+    )
+
+    # Start from the first page whenever the filters change
+    if st.session_state.get("faq_filters") != (search, category):
+        st.session_state.faq_filters = (search, category)
+        st.session_state.faq_page = 0
+
+    total = faq_db.count_faqs(category=category, search=search)
+    if not total:
+        st.info("No FAQs match your search.")
+        return
+
+    page_size = settings.FAQ_PAGE_SIZE
+    page_count = (total + page_size - 1) // page_size
+    page = min(st.session_state.faq_page, page_count - 1)
+    faqs = faq_db.get_faqs(category=category, search=search, limit=page_size, offset=page * page_size)
+    st.caption(f"Showing {page * page_size + 1}-{page * page_size + len(faqs)} of {total} FAQs")
+
     faqs_by_category = defaultdict(list)
-    for faq in all_faqs:
+    for faq in faqs:
         faqs_by_category[faq['category']].append(faq)
 
-    for category, faqs in faqs_by_category.items():
-        st.subheader(category)
-        for faq in faqs:
+    for faq_category, category_faqs in faqs_by_category.items():
+        st.subheader(faq_category)
+        for faq in category_faqs:
             with st.expander(f"Q: {faq['question']}"):
                 st.markdown(f"**A:** {faq['answer']}")
         st.markdown("---")
 
+    col1, col2, col3 = st.columns([1, 2, 1])
+    if col1.button("⬅ Previous", disabled=page == 0, use_container_width=True):
+        st.session_state.faq_page = page - 1
+        st.rerun()
+    col2.markdown(f"<p style='text-align: center;'>Page {page + 1} of {page_count}</p>", unsafe_allow_html=True)
+    if col3.button("Next ➡", disabled=page >= page_count - 1, use_container_width=True):
+        st.session_state.faq_page = page + 1
+        st.rerun()
+
 def user_type_selection():
     st.markdown("<h1 style='text-align: center;'>⚖️ Legal Assistant</h1>", unsafe_allow_html=True)
     st.markdown("---")
@@ -170,27 +229,56 @@ def display_chat_interface():
     
     if st.session_state.messages and isinstance(st.session_state.messages[-1], HumanMessage):
         last_user_message = st.session_state.messages[-1]
-        with st.chat_message("assistant"):
-            try:
-                graph_input = {"messages": st.session_state.messages, "is_professional": st.session_state.is_professional}
-                
-                def stream_generator(input_data):
-                    for chunk, metadata in legal_assistant.stream(input_data, stream_mode="messages"):
-                        if metadata.get("langgraph_node") == "assistant" and chunk.content:
-                            yield chunk.content
-                
-                full_response = st.write_stream(stream_generator(graph_input))
-                
-                # Get related questions and store them in the dedicated session state
-                st.session_state.related_questions = vector_store_manager.get_similar_faq_questions(last_user_message.content, k=3)
-                
-                # The AIMessage no longer needs additional_kwargs for this
-                assistant_message = AIMessage(content=full_response)
-                st.session_state.messages.append(assistant_message)
-                st.rerun()
-
-            except Exception as e:
-                st.error(f"An error occurred: {str(e)}")
+        # One embedding of the question serves both the related-question lookup and retrieval
+        with embedding_turn():
+            # Look up related questions while the answer streams instead of after it
+            if api_client is not None:
+                related_questions = get_related_questions_executor().submit(
+                    api_client.related_questions, last_user_message.content, 3
+                )
+            else:
+                related_questions = get_related_questions_executor().submit(
+                    copy_context().run, vector_store_manager.get_similar_faq_questions, last_user_message.content, 3
+                )
+            with st.chat_message("assistant"):
+                try:
+                    graph_input = {"messages": st.session_state.messages, "is_professional": st.session_state.is_professional}
+                    
+                    def stream_generator(input_data):
+                        for chunk, metadata in legal_assistant.stream(input_data, stream_mode="messages"):
+                            if metadata.get("langgraph_node") == "assistant" and chunk.content:
+                                yield chunk.content
+                    
+                    cached = None if api_client is not None else cached_answer(st.session_state.messages, st.session_state.is_professional)
+                    if api_client is not None:
+                        # The API serves and records cached answers itself
+                        persona = USER_TYPE_PERSONAS[st.session_state.user_type]
+                        with trace_turn(persona=st.session_state.user_type, history_messages=len(st.session_state.messages), channel="api_client"):
+                            full_response = st.write_stream(api_client.stream_answer(st.session_state.messages, persona))
+                    elif cached is not None:
+                        with trace_turn(persona=st.session_state.user_type, history_messages=1, answer_cache="hit"):
+                            full_response = st.write_stream(stream_cached(cached))
+                    else:
+                        kb_version = vector_store_manager.get_kb_version()
+                        with trace_turn(persona=st.session_state.user_type, history_messages=len(st.session_state.messages)):
+                            full_response = st.write_stream(stream_generator(graph_input))
+                        remember_answer(st.session_state.messages, st.session_state.is_professional, full_response, kb_version)
+                    
+                    # Attach related questions if the lookup is done in time; never hold the answer back for them
+                    try:
+                        st.session_state.related_questions = related_questions.result(timeout=settings.RELATED_QUESTIONS_TIMEOUT_SECONDS)
+                    except FutureTimeoutError:
+                        # A running lookup cannot be stopped; it finishes in the background and its result is dropped
+                        logger.warning(f"Related questions took over {settings.RELATED_QUESTIONS_TIMEOUT_SECONDS}s; showing none.")
+                        st.session_state.related_questions = []
+                    
+                    # The AIMessage no longer needs additional_kwargs for this
+                    assistant_message = AIMessage(content=full_response)
+                    st.session_state.messages.append(assistant_message)
+                    st.rerun()
+
+                except Exception as e:
+                    st.error(f"An error occurred: {str(e)}")
 
 # --- MODIFIED ---
 def add_sidebar():
@@ -1,7 +1,11 @@
 import streamlit as st
 import os
+import time
 from src.document_processor import LegalDocumentProcessor
-from src.vector_store import VectorStoreManager
+from src.ingestion_pipeline import IngestionPipeline
+from src.tracing import load_stage_percentiles
+from src.content_worker import create_job_queue, enqueue_answer_warming
+from src.clients import get_vector_store_manager
 from config.settings import settings
 
 def main():
@@ -11,6 +15,11 @@ def main():
         layout="wide"
     )
     
+    page = st.sidebar.radio("Page", ["📄 Documents", "⏱️ Performance"])
+    if page == "⏱️ Performance":
+        display_performance_page()
+        return
+    
     st.title("📚 Document Management Dashboard")
     st.markdown("---")
     
@@ -22,7 +31,7 @@ def main():
         )
     
     if 'vector_store' not in st.session_state:
-        st.session_state.vector_store = VectorStoreManager()
+        st.session_state.vector_store = get_vector_store_manager()
     
     # Main dashboard
     col1, col2 = st.columns([2, 1])
@@ -61,44 +70,91 @@ def main():
         for status in st.session_state.processing_status:
             st.write(status)
 
+def display_performance_page():
+    """Per-stage latency percentiles computed from the assistant's trace log"""
+    st.title("⏱️ Assistant Performance")
+    st.markdown("---")
+    
+    if st.button("🔄 Refresh"):
+        st.rerun()
+    
+    stage_stats = load_stage_percentiles(settings.TRACE_PATH)
+    if not stage_stats:
+        st.info("No traces recorded yet. Chat with the assistant to collect latency data.")
+        return
+    
+    st.subheader("Latency by stage (ms)")
+    st.dataframe(stage_stats, use_container_width=True, hide_index=True)
+    st.bar_chart(stage_stats, x="stage", y=["p50_ms", "p95_ms", "p99_ms"], stack=False)
+
 def process_documents(uploaded_files):
-    """Process uploaded documents"""
+    """Process uploaded documents through the streaming ingestion pipeline"""
     st.session_state.processing_status = []
     
     status_text = st.empty()
+    throughput_text = st.empty()
+    
+    files = [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files]
+    progress_bars = {name: st.progress(0.0, text=f"{name}: queued") for name, _ in files}
+    totals = {name: None for name, _ in files}
+    stored = {name: 0 for name, _ in files}
+    unchanged = {name: 0 for name, _ in files}
+    failed = {}
+    
+    pipeline = IngestionPipeline(
+        doc_processor=st.session_state.doc_processor,
+        vector_store_manager=st.session_state.vector_store
+    )
     
-    all_documents = []
+    status_text.text("Parsing, embedding and storing documents...")
+    started_at = time.monotonic()
     
-    for i, uploaded_file in enumerate(uploaded_files):
-        status_text.text(f"Processing {uploaded_file.name}...")
+    for event in pipeline.run(files):
+        name = event.file_name
+        if event.stage == "parsed":
+            totals[name] = event.chunks_total
+            unchanged[name] = event.chunks_unchanged
+        elif event.stage == "stored":
+            stored[name] += event.chunks_stored
+        elif event.stage == "failed":
+            failed[name] = event.error
+            st.error(f"Error processing {name}: {event.error}")
         
-        try:
-            # Process document
-            documents = st.session_state.doc_processor.process_uploaded_file(uploaded_file)
-            all_documents.extend(documents)
-            
-            st.session_state.processing_status.append(
-                f"✅ {uploaded_file.name}: {len(documents)} chunks processed"
+        total = totals[name]
+        if name in failed:
+            progress_bars[name].progress(stored[name] / total if total else 0.0, text=f"❌ {name}: failed")
+        elif total is not None:
+            progress_bars[name].progress(
+                stored[name] / total if total else 1.0,
+                text=f"{name}: {stored[name]}/{total} chunks stored ({unchanged[name]} unchanged)"
             )
-            
-        except Exception as e:
+        
+        elapsed = time.monotonic() - started_at
+        throughput_text.text(f"Throughput: {sum(stored.values()) / elapsed:.1f} chunks/s")
+    
+    for name, _ in files:
+        if name in failed:
+            st.session_state.processing_status.append(f"❌ {name}: Error - {failed[name]}")
+        else:
             st.session_state.processing_status.append(
-                f"❌ {uploaded_file.name}: Error - {str(e)}"
+                f"✅ {name}: {stored[name]} chunks processed, {unchanged[name]} unchanged"
             )
-            st.error(f"Error processing {uploaded_file.name}: {str(e)}")
-    
-    # Store all documents in vector store
-    if all_documents:
-        status_text.text("Storing documents in vector database...")
-        if st.session_state.vector_store.store_documents(all_documents):
-            st.success(f"Successfully processed and stored {len(all_documents)} document chunks!")
-            
-            # Update statistics
-            st.session_state.docs_processed = st.session_state.get('docs_processed', 0) + len(uploaded_files)
-            st.session_state.total_chunks = st.session_state.get('total_chunks', 0) + len(all_documents)
-            
-        else:
-            st.error("Failed to store documents in vector database!")
+    
+    total_stored = sum(stored.values())
+    succeeded = [name for name, _ in files if name not in failed]
+    if total_stored:
+        st.success(f"Successfully processed and stored {total_stored} document chunks!")
+        
+        # Update statistics
+        st.session_state.docs_processed = st.session_state.get('docs_processed', 0) + len(succeeded)
+        st.session_state.total_chunks = st.session_state.get('total_chunks', 0) + total_stored
+        
+        # New chunks change the knowledge base version, which retires cached answers; re-answer the popular ones
+        enqueue_answer_warming(create_job_queue())
+    elif failed:
+        st.error("Failed to store documents in vector database!")
+    else:
+        st.info("No changes detected; the knowledge base is already up to date.")
 
     status_text.text("Processing complete!")
 
@@ -0,0 +1 @@
+"""Offline performance benchmarks; run with `python -m benchmarks.run`."""
@@ -0,0 +1,117 @@
+"""Deterministic local stand-ins for the OpenAI models and embeddings used by the assistant."""
+
+import asyncio
+import hashlib
+import itertools
+import math
+import re
+import time
+from typing import Any, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import PrivateAttr
+
+
+def _usage(messages: List[BaseMessage], output: str) -> dict:
+    input_tokens = sum(len(str(message.content)) for message in messages) // 4
+    output_tokens = max(1, len(output) // 4)
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model that answers from a script after a fixed latency.
+
+    As the agent, it calls `search_knowledge_base` when the last message is
+    from the user and answers otherwise. Structured-output calls return
+    relevance scores cycled from `scores`, or a rewritten query.
+    """
+
+    latency: float = 0.0
+    answer: str = "Under Section 23(4) a licence is required. ### References\n1. Medicines Act - Section 23(4)"
+    scores: List[int] = [8]
+    _score_cycle: Any = PrivateAttr(default=None)
+    _calls: Any = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._score_cycle = itertools.cycle(self.scores)
+        self._calls = itertools.count()
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        last = messages[-1]
+        if isinstance(last, HumanMessage):
+            message = AIMessage(content="", tool_calls=[{
+                "name": "search_knowledge_base",
+                "args": {"query": last.content},
+                "id": f"call_{next(self._calls)}",
+            }])
+        else:
+            message = AIMessage(content=self.answer)
+        message.usage_metadata = _usage(messages, str(message.content))
+        return message
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def with_structured_output(self, schema, include_raw: bool = False, **kwargs):
+        def structured(messages):
+            time.sleep(self.latency)
+            prompt = str(messages[-1].content)
+            if "score" in schema.model_fields:
+                parsed = schema(score=next(self._score_cycle))
+            elif "query" in schema.model_fields:
+                parsed = schema(query=f"{prompt[-200:]} (rewritten)")
+            else:
+                parsed = schema.model_construct()
+            if include_raw:
+                raw = AIMessage(content="", usage_metadata=_usage(messages, str(parsed)))
+                return {"raw": raw, "parsed": parsed, "parsing_error": None}
+            return parsed
+
+        return RunnableLambda(structured)
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Bag-of-words feature hashing: every token adds a signed unit to one of
+    `size` buckets. Texts sharing words get similar vectors, which keeps
+    retrieval and relevance scores meaningful without a model.
+    """
+
+    def __init__(self, size: int = 256, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.size
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
@@ -0,0 +1,66 @@
+"""
+Cold-start import profile of the entry-point modules.
+
+Each module is imported in a fresh interpreter with `-X importtime`, from a
+scratch working directory so on-disk stores created at import land there.
+
+    python -m benchmarks.import_profile
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List, Sequence
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["src.graph", "src.tools", "src.content_worker"]
+
+_SCRIPT = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+
+def _slowest_imports(importtime_log: str, limit: int) -> List[Dict[str, Any]]:
+    """Top-level packages with the largest cumulative import time, from `-X importtime` output."""
+    cumulative = {}
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        if not cumulative_us.strip().isdigit():
+            continue
+        # Indentation marks nesting; only direct imports of the profiled module are comparable
+        if len(name) - len(name.lstrip()) == 3:
+            cumulative[name.strip()] = int(cumulative_us) / 1000
+    slowest = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [{"module": module, "ms": round(ms, 1)} for module, ms in slowest]
+
+
+def profile_module(module: str, top: int = 5) -> Dict[str, Any]:
+    env = {
+        **os.environ,
+        "PYTHONPATH": PROJECT_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "benchmark"),
+        "VECTOR_STORE_BACKEND": "local",
+    }
+    with tempfile.TemporaryDirectory(prefix="legal-assistant-imports-") as cwd:
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _SCRIPT.format(module=module)],
+            cwd=cwd, env=env, capture_output=True, text=True
+        )
+    if completed.returncode != 0:
+        return {"module": module, "error": completed.stderr.strip().splitlines()[-1]}
+    return {
+        "module": module,
+        "import_ms": round(float(completed.stdout.strip().splitlines()[-1]) * 1000, 1),
+        "slowest": _slowest_imports(completed.stderr, top),
+    }
+
+
+def profile_imports(modules: Sequence[str] = MODULES) -> List[Dict[str, Any]]:
+    return [profile_module(module) for module in modules]
+
+
+if __name__ == "__main__":
+    print(json.dumps(profile_imports(sys.argv[1:] or MODULES), indent=2))
@@ -0,0 +1,333 @@
+"""
+Offline benchmark for the legal assistant.
+
+Runs ingestion and conversational turns against deterministic fakes
+(scripted chat model, hashing embedder, local vector store in a temporary
+directory), so no API calls are made. Results are written as JSON.
+
+    python -m benchmarks.run --pages 300 --files 3 --turns 50 --output benchmark.json
+    python -m benchmarks.run --baseline benchmark.json   # exit 1 on regression
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# The fakes replace every client, but settings and clients are created at import time
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ["VECTOR_STORE_BACKEND"] = "local"
+
+from config.settings import settings  # noqa: E402
+
+QUESTIONS = [
+    "Does a manufacturer need a licence to supply products?",
+    "What penalty applies to an offence under Section 23(4)?",
+    "Can the tribunal suspend a registration on appeal?",
+    "How long is the notice period before revocation of an approval?",
+    "Who may inspect premises and records of a licence holder?",
+    "What conditions can the minister attach to an import licence?",
+]
+
+
+def _use_temporary_storage(root: str):
+    """Points every on-disk store at a scratch directory so runs start cold and leave no trace."""
+    settings.LOCAL_VECTOR_STORE_PATH = os.path.join(root, "vectors")
+    settings.INGESTION_MANIFEST_PATH = os.path.join(root, "ingestion_manifest.db")
+    settings.LEXICAL_INDEX_PATH = os.path.join(root, "lexical_index.db")
+    settings.KB_VERSION_PATH = os.path.join(root, "kb_version")
+    settings.EMBEDDING_CACHE_PATH = os.path.join(root, "embeddings.db")
+    settings.DATABASE_PATH = os.path.join(root, "faqs.db")
+    settings.TRACE_PATH = os.path.join(root, "traces.jsonl")
+    settings.ANSWER_CACHE_PATH = os.path.join(root, "answer_cache.db")
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)) * 1000, 2),
+        "p95_ms": round(float(np.percentile(values, 95)) * 1000, 2),
+        "mean_ms": round(float(np.mean(values)) * 1000, 2),
+    }
+
+
+def _max_rss_mb(who: int) -> float:
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(who).ru_maxrss / scale, 1)
+
+
+def bench_ingestion(vector_store_manager, files: int, pages: int, parse_workers: int) -> Dict[str, Any]:
+    from benchmarks.synthetic_pdf import build_pdf
+    from src.document_processor import LegalDocumentProcessor
+    from src.ingestion_pipeline import IngestionPipeline
+
+    documents = [(f"synthetic_act_{i}.pdf", build_pdf(pages, seed=i)) for i in range(files)]
+    pipeline = IngestionPipeline(
+        doc_processor=LegalDocumentProcessor(chunk_size=settings.CHUNK_SIZE, chunk_overlap=settings.CHUNK_OVERLAP),
+        vector_store_manager=vector_store_manager,
+        parse_workers=parse_workers,
+    )
+
+    def run_once() -> Dict[str, Any]:
+        stored = unchanged = failed = 0
+        start = time.perf_counter()
+        for event in pipeline.run(documents):
+            stored += event.chunks_stored
+            unchanged += event.chunks_unchanged
+            failed += event.stage == "failed"
+        elapsed = time.perf_counter() - start
+        return {
+            "seconds": round(elapsed, 3),
+            "pages_per_second": round(files * pages / elapsed, 1),
+            "chunks_stored": stored,
+            "chunks_unchanged": unchanged,
+            "chunks_per_second": round((stored + unchanged) / elapsed, 1),
+            "failed_files": failed,
+        }
+
+    # The second pass re-ingests identical files and should skip every chunk.
+    # Memory comes from rusage: tracemalloc would be inherited by, and slow down, the forked parse workers.
+    return {
+        "files": files,
+        "pages_per_file": pages,
+        "pdf_bytes": sum(len(data) for _, data in documents),
+        "cold": run_once(),
+        "unchanged": run_once(),
+        "max_rss_mb": _max_rss_mb(resource.RUSAGE_SELF),
+        "max_rss_parse_workers_mb": _max_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+
+def _run_turns(turns: int) -> List[float]:
+    from langchain_core.messages import HumanMessage
+    from src.graph import legal_assistant
+    from src.tracing import trace_turn
+
+    durations = []
+    for i in range(turns):
+        graph_input = {"messages": [HumanMessage(content=QUESTIONS[i % len(QUESTIONS)])], "is_professional": i % 2 == 0}
+        start = time.perf_counter()
+        with trace_turn(persona="benchmark"):
+            for _ in legal_assistant.stream(graph_input, stream_mode="messages"):
+                pass
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def _rag_loop_stats(offset: int = 0) -> Dict[str, Any]:
+    """Rewrite statistics from the trace records written after byte `offset` of the trace file."""
+    rag_loops = []
+    grader_calls = 0
+    with open(settings.TRACE_PATH, "r") as f:
+        f.seek(offset)
+        for line in f:
+            record = json.loads(line)
+            if record["span"] == "rag_loop":
+                rag_loops.append(record.get("rewrites", 0))
+            grader_calls += record["span"] == "score_documents"
+    return {
+        "rag_loops": len(rag_loops),
+        "rewrite_rate": round(sum(1 for rewrites in rag_loops if rewrites) / len(rag_loops), 3) if rag_loops else 0.0,
+        "mean_rewrites": round(float(np.mean(rag_loops)), 3) if rag_loops else 0.0,
+        "llm_grader_calls": grader_calls,
+    }
+
+
+def bench_turns(turns: int) -> Dict[str, Any]:
+    from src.tracing import load_stage_percentiles
+
+    tracemalloc.start()
+    durations = _run_turns(turns)
+    results = {
+        "turns": turns,
+        "latency": _percentiles(durations),
+        **_rag_loop_stats(),
+        "peak_traced_mb": round(tracemalloc.get_traced_memory()[1] / 2**20, 1),
+        "stages": load_stage_percentiles(settings.TRACE_PATH),
+    }
+    tracemalloc.stop()
+    return results
+
+
+def bench_chunking(files: int, pages: int, turns: int, root: str) -> Dict[str, Any]:
+    """Ingests the same documents with each chunking strategy into its own store and compares retrieval outcomes."""
+    from benchmarks.synthetic_pdf import build_pdf
+    from src import clients
+    from src.document_processor import LegalDocumentProcessor, iter_pdf_pages
+    from src.vector_store import VectorStoreManager
+
+    documents = [(f"synthetic_act_{i}.pdf", build_pdf(pages, seed=i)) for i in range(files)]
+    shared_manager = clients.get_vector_store_manager()
+    results = {}
+    try:
+        for strategy in ("character", "legal"):
+            processor = LegalDocumentProcessor(
+                chunk_size=settings.CHUNK_SIZE, chunk_overlap=settings.CHUNK_OVERLAP, strategy=strategy
+            )
+            chunks = [
+                chunk for name, data in documents for chunk in processor.split_pages(iter_pdf_pages(data), source=name)
+            ]
+
+            store_root = os.path.join(root, f"chunking_{strategy}")
+            settings.LOCAL_VECTOR_STORE_PATH = os.path.join(store_root, "vectors")
+            settings.INGESTION_MANIFEST_PATH = os.path.join(store_root, "ingestion_manifest.db")
+            settings.LEXICAL_INDEX_PATH = os.path.join(store_root, "lexical_index.db")
+            settings.KB_VERSION_PATH = os.path.join(store_root, "kb_version")
+            manager = VectorStoreManager()
+            manager.store_documents(chunks)
+
+            # Retrieval in the graph goes through the registry's manager
+            clients.override("vector_store_manager", manager)
+            offset = os.path.getsize(settings.TRACE_PATH) if os.path.exists(settings.TRACE_PATH) else 0
+            durations = _run_turns(turns)
+            lengths = [len(chunk.page_content) for chunk in chunks]
+            results[strategy] = {
+                "chunks": len(chunks),
+                "mean_tokens": round(float(np.mean(lengths)) / 4, 1) if lengths else 0.0,
+                "max_tokens": max(lengths) // 4 if lengths else 0,
+                "chunks_with_section": sum(1 for chunk in chunks if "section" in chunk.metadata),
+                "turn_p50_ms": _percentiles(durations)["p50_ms"],
+                **_rag_loop_stats(offset),
+            }
+    finally:
+        clients.override("vector_store_manager", shared_manager)
+    return results
+
+
+def bench_reranking() -> Dict[str, Any]:
+    """Retrieves every benchmark question with and without diversity reranking and compares the returned context."""
+    from src import tools
+
+    enabled = settings.RERANK_ENABLED
+    results = {}
+    try:
+        for label, rerank in (("top_k", False), ("mmr", True)):
+            settings.RERANK_ENABLED = rerank
+            tools.retrieval_cache.clear()
+            durations, context_chars, passages, adjacent_pairs, pages = [], [], [], 0, []
+            for question in QUESTIONS:
+                start = time.perf_counter()
+                scored_docs = tools._retrieve_documents(question, settings.RETRIEVAL_TOP_K)
+                durations.append(time.perf_counter() - start)
+                positions = {
+                    (doc.metadata["source"], int(doc.metadata["page"]), chunk_id)
+                    for doc, _ in scored_docs for chunk_id in doc.metadata.get("chunk_ids", [int(doc.metadata["chunk_id"])])
+                }
+                # Neighbouring chunks returned as separate results repeat their overlap in the prompt
+                adjacent_pairs += sum(
+                    1 for doc, _ in scored_docs
+                    if (doc.metadata["source"], int(doc.metadata["page"]), int(doc.metadata["chunk_id"]) - 1) in positions
+                    and len(doc.metadata.get("chunk_ids", [])) <= 1
+                )
+                context_chars.append(sum(len(doc.page_content) for doc, _ in scored_docs))
+                passages.append(len(scored_docs))
+                pages.append(len({(source, page) for source, page, _ in positions}))
+            results[label] = {
+                "retrieve_p50_ms": _percentiles(durations)["p50_ms"],
+                "mean_context_tokens": round(float(np.mean(context_chars)) / 4, 1),
+                "mean_passages": round(float(np.mean(passages)), 2),
+                "mean_distinct_pages": round(float(np.mean(pages)), 2),
+                "separate_adjacent_chunks": adjacent_pairs,
+            }
+    finally:
+        settings.RERANK_ENABLED = enabled
+        tools.retrieval_cache.clear()
+    return results
+
+
+def find_regressions(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Compares headline metrics with a previous run; higher latency or lower throughput beyond `tolerance` is a regression."""
+    checks = [
+        ("turn p95", results["turns"]["latency"]["p95_ms"], baseline["turns"]["latency"]["p95_ms"], True),
+        ("turn p50", results["turns"]["latency"]["p50_ms"], baseline["turns"]["latency"]["p50_ms"], True),
+        ("ingestion pages/s", results["ingestion"]["cold"]["pages_per_second"],
+         baseline["ingestion"]["cold"]["pages_per_second"], False),
+        ("peak RSS", results["memory"]["max_rss_mb"], baseline["memory"]["max_rss_mb"], True),
+    ]
+    regressions = []
+    for name, current, previous, lower_is_better in checks:
+        if not previous:
+            continue
+        change = (current - previous) / previous
+        if (change > tolerance) if lower_is_better else (change < -tolerance):
+            regressions.append(f"{name}: {previous} -> {current} ({change:+.0%})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=2, help="synthetic PDFs to ingest")
+    parser.add_argument("--pages", type=int, default=300, help="pages per synthetic PDF")
+    parser.add_argument("--parse-workers", type=int, default=settings.INGEST_PARSE_WORKERS)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--chunking-turns", type=int, default=12, help="turns per chunking strategy in the comparison, 0 to skip")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake chat model call")
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="seconds per fake embedding call")
+    parser.add_argument("--scores", type=int, nargs="+", default=[8, 4, 9, 6], help="scores the fake LLM grader cycles through")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="previous results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression versus the baseline")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory(prefix="legal-assistant-bench-") as root:
+        _use_temporary_storage(root)
+
+        import random
+        random.seed(args.seed)  # the pre-scorer samples audit calls at random
+
+        from src import clients
+        from benchmarks.fakes import HashEmbeddings, ScriptedChatModel
+        from benchmarks.import_profile import profile_imports
+
+        chat_model = ScriptedChatModel(latency=args.llm_latency, scores=args.scores)
+        for name in ("chat_model", "agent_with_tool", "scoring_model", "rewriter_model", "summary_model"):
+            clients.override(name, chat_model)
+        clients.get_embeddings().underlying = HashEmbeddings(latency=args.embed_latency)
+
+        results = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+            "import_profile": profile_imports(),
+            "ingestion": bench_ingestion(clients.get_vector_store_manager(), args.files, args.pages, args.parse_workers),
+            "turns": bench_turns(args.turns),
+            "reranking": bench_reranking(),
+        }
+        if args.chunking_turns:
+            results["chunking"] = bench_chunking(args.files, args.pages, args.chunking_turns, root)
+        results["memory"] = {
+            "max_rss_mb": _max_rss_mb(resource.RUSAGE_SELF),
+            "max_rss_parse_workers_mb": _max_rss_mb(resource.RUSAGE_CHILDREN),
+        }
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps({key: results[key] for key in ("import_profile", "ingestion", "memory")}, indent=2))
+    print(json.dumps({key: value for key, value in results["turns"].items() if key != "stages"}, indent=2))
+    print(json.dumps(results["reranking"], indent=2))
+    if "chunking" in results:
+        print(json.dumps(results["chunking"], indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""Builds synthetic statute-like PDFs in memory, so ingestion can be benchmarked without real documents."""
+
+import random
+from typing import List
+
+_WORDS = (
+    "licence authority minister person shall may application regulation premises product "
+    "registration inspector offence penalty notice appeal tribunal order period condition "
+    "manufacture supply import export record holder approval suspension revocation board"
+).split()
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_lines(rng: random.Random, page: int, lines_per_page: int) -> List[str]:
+    lines = []
+    section = page * 3
+    while len(lines) < lines_per_page:
+        section += 1
+        lines.append(f"Section {section}. {rng.choice(_WORDS).capitalize()} {rng.choice(_WORDS)}")
+        for subsection in range(1, rng.randint(2, 5)):
+            words = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 14)))
+            lines.append(f"({subsection}) A {words}.")
+    return lines[:lines_per_page]
+
+
+def build_pdf(pages: int, lines_per_page: int = 40, seed: int = 0) -> bytes:
+    """Returns the bytes of a `pages`-page PDF whose pages hold numbered sections of filler text."""
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in range(pages):
+        text = "BT /F1 10 Tf 12 TL 50 800 Td " + " ".join(
+            f"({_escape(line)}) '" for line in _page_lines(rng, page, lines_per_page)
+        ) + " ET"
+        stream = text.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode("ascii")
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
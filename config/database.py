@@ -1,19 +1,45 @@
 import sqlite3
 import os
+import re
+import threading
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+def question_key(question: str) -> str:
+    """Normalized form of a question used to detect duplicates: case, punctuation and spacing are ignored."""
+    return " ".join(re.findall(r"\w+", question.lower()))
+
+def _fts_query(search: str) -> str:
+    """Turns free text into an FTS5 query: every word must match, the last one as a prefix for type-ahead."""
+    words = re.findall(r"\w+", search.lower())
+    if not words:
+        return ""
+    return " ".join(f'"{word}"' for word in words[:-1]) + f' "{words[-1]}"*'
+
+def _normalize(vector: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
 
 class FAQDatabase:
     def __init__(self, db_path: str):
         self.db_path = db_path
+        self._lock = threading.Lock()
         self._ensure_database_exists()
+        # One long-lived connection shared across Streamlit reruns and threads
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
         self._create_tables()
     
     def _ensure_database_exists(self):
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
     
     def _create_tables(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock:
+            conn = self._conn
+            conn.execute('PRAGMA journal_mode=WAL')
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS faqs (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -21,36 +47,217 @@ class FAQDatabase:
                     answer TEXT NOT NULL,
                     category TEXT,
                     date_created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    frequency INTEGER DEFAULT 1
+                    frequency INTEGER DEFAULT 1,
+                    question_key TEXT,
+                    embedding BLOB
                 )
             ''')
+            self._migrate_question_keys(conn)
+            conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_faqs_question_key ON faqs (question_key)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_faqs_category_frequency ON faqs (category, frequency DESC)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_faqs_frequency ON faqs (frequency DESC)')
+            self._create_search_index(conn)
             conn.commit()
     
-    def insert_faqs(self, faqs: List[Dict[str, str]]):
-        with sqlite3.connect(self.db_path) as conn:
-            for faq in faqs:
-                # Check if similar question exists
-                existing = conn.execute(
-                    'SELECT id, frequency FROM faqs WHERE question = ?',
-                    (faq['question'],)
-                ).fetchone()
-                
-                if existing:
-                    # Update frequency
-                    conn.execute(
-                        'UPDATE faqs SET frequency = frequency + 1 WHERE id = ?',
-                        (existing[0],)
-                    )
-                else:
-                    # Insert new FAQ
-                    conn.execute(
-                        'INSERT INTO faqs (question, answer, category) VALUES (?, ?, ?)',
-                        (faq['question'], faq['answer'], faq.get('category', 'General'))
+    def _migrate_question_keys(self, conn: sqlite3.Connection):
+        """Adds and backfills `question_key` on databases created before it existed, merging duplicate questions."""
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(faqs)')]
+        if 'question_key' not in columns:
+            conn.execute('ALTER TABLE faqs ADD COLUMN question_key TEXT')
+        if 'embedding' not in columns:
+            conn.execute('ALTER TABLE faqs ADD COLUMN embedding BLOB')
+
+        rows = conn.execute('SELECT id, question, frequency FROM faqs WHERE question_key IS NULL ORDER BY id').fetchall()
+        if not rows:
+            return
+        keepers = {row[0]: row[1] for row in conn.execute('SELECT question_key, id FROM faqs WHERE question_key IS NOT NULL')}
+        for faq_id, question, frequency in rows:
+            key = question_key(question)
+            if key in keepers:
+                # Fold the duplicate's frequency into the oldest FAQ with the same key
+                conn.execute('UPDATE faqs SET frequency = frequency + ? WHERE id = ?', (frequency or 1, keepers[key]))
+                conn.execute('DELETE FROM faqs WHERE id = ?', (faq_id,))
+            else:
+                conn.execute('UPDATE faqs SET question_key = ? WHERE id = ?', (key, faq_id))
+                keepers[key] = faq_id
+    
+    def _create_search_index(self, conn: sqlite3.Connection):
+        """FTS5 index over questions and answers, kept in step with `faqs` by triggers."""
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'faqs_fts'").fetchone()
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS faqs_fts
+            USING fts5(question, answer, content='faqs', content_rowid='id')
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS faqs_fts_insert AFTER INSERT ON faqs BEGIN
+                INSERT INTO faqs_fts (rowid, question, answer) VALUES (new.id, new.question, new.answer);
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS faqs_fts_delete AFTER DELETE ON faqs BEGIN
+                INSERT INTO faqs_fts (faqs_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+            END
+        ''')
+        # Frequency bumps do not touch the text, so only edits of question or answer reindex a row
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS faqs_fts_update AFTER UPDATE OF question, answer ON faqs BEGIN
+                INSERT INTO faqs_fts (faqs_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+                INSERT INTO faqs_fts (rowid, question, answer) VALUES (new.id, new.question, new.answer);
+            END
+        ''')
+        if not exists:
+            conn.execute("INSERT INTO faqs_fts (faqs_fts) VALUES ('rebuild')")
+    
+    def insert_faqs(self, faqs: List[Dict[str, str]], embeddings: Optional[List[List[float]]] = None,
+                    similarity_threshold: Optional[float] = None, candidates: int = 50):
+        """
+        Inserts new FAQs and bumps the frequency of already stored questions in one batched statement.
+
+        With question `embeddings` and a `similarity_threshold`, paraphrases
+        count as already stored: a FAQ whose question is at least that
+        similar to a stored one (or to an earlier one in the batch) bumps the
+        existing entry instead of being inserted. Stored questions are
+        compared only against the best full-text `candidates`, so the check
+        stays cheap on large tables.
+        """
+        vectors = [_normalize(vector) for vector in embeddings] if embeddings is not None else [None] * len(faqs)
+        with self._lock:
+            rows, bumps, accepted = [], [], []
+            for faq, vector in zip(faqs, vectors):
+                if vector is not None and similarity_threshold is not None:
+                    match = self._find_near_duplicate(faq['question'], vector, similarity_threshold, candidates)
+                    if match is not None:
+                        bumps.append((match,))
+                        continue
+                    batch_match = next(
+                        (row for row, other in accepted if float(other @ vector) >= similarity_threshold), None
                     )
-            conn.commit()
+                    if batch_match is not None:
+                        # Re-inserting the earlier question hits its key and bumps its frequency
+                        rows.append(batch_match)
+                        continue
+                row = (
+                    faq['question'], faq['answer'], faq.get('category', 'General'), question_key(faq['question']),
+                    vector.tobytes() if vector is not None else None
+                )
+                rows.append(row)
+                if vector is not None:
+                    accepted.append((row, vector))
+
+            self._conn.executemany(
+                '''
+                INSERT INTO faqs (question, answer, category, question_key, embedding) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (question_key) DO UPDATE SET
+                    frequency = frequency + 1, embedding = COALESCE(embedding, excluded.embedding)
+                ''',
+                rows
+            )
+            self._conn.executemany('UPDATE faqs SET frequency = frequency + 1 WHERE id = ?', bumps)
+            self._conn.commit()
+    
+    def _find_near_duplicate(self, question: str, vector: np.ndarray, threshold: float, candidates: int) -> Optional[int]:
+        """Id of the stored FAQ most similar to `vector`, if any reaches `threshold`."""
+        words = re.findall(r"\w+", question.lower())
+        if not words:
+            return None
+        rows = self._conn.execute(
+            '''
+            SELECT faqs.id, faqs.embedding FROM faqs_fts CROSS JOIN faqs ON faqs.id = faqs_fts.rowid
+            WHERE faqs_fts MATCH ? AND faqs.embedding IS NOT NULL ORDER BY bm25(faqs_fts) LIMIT ?
+            ''',
+            (" OR ".join(f'"{word}"' for word in set(words)), candidates)
+        ).fetchall()
+        if not rows:
+            return None
+        similarities = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows]) @ vector
+        best = int(np.argmax(similarities))
+        return rows[best][0] if similarities[best] >= threshold else None
+    
+    def get_question_embeddings(self) -> List[Tuple[int, str, int, Optional[np.ndarray]]]:
+        """Returns (id, question, frequency, embedding or None) for every FAQ."""
+        with self._lock:
+            rows = self._conn.execute('SELECT id, question, frequency, embedding FROM faqs ORDER BY id').fetchall()
+            return [
+                (row[0], row[1], row[2] or 1, np.frombuffer(row[3], dtype=np.float32) if row[3] is not None else None)
+                for row in rows
+            ]
+    
+    def set_embeddings(self, embeddings: List[Tuple[int, List[float]]]):
+        with self._lock:
+            self._conn.executemany(
+                'UPDATE faqs SET embedding = ? WHERE id = ?',
+                [(_normalize(vector).tobytes(), faq_id) for faq_id, vector in embeddings]
+            )
+            self._conn.commit()
+    
+    def merge_faqs(self, keeper_id: int, duplicate_ids: List[int]):
+        """Adds the frequencies of `duplicate_ids` to `keeper_id` and deletes the duplicates."""
+        if not duplicate_ids:
+            return
+        placeholders = ",".join("?" * len(duplicate_ids))
+        with self._lock:
+            self._conn.execute(
+                f'UPDATE faqs SET frequency = frequency + (SELECT COALESCE(SUM(frequency), 0) FROM faqs WHERE id IN ({placeholders})) WHERE id = ?',
+                duplicate_ids + [keeper_id]
+            )
+            self._conn.execute(f'DELETE FROM faqs WHERE id IN ({placeholders})', duplicate_ids)
+            self._conn.commit()
     
     def get_all_faqs(self) -> List[Dict]:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            rows = conn.execute('SELECT question, answer, category FROM faqs ORDER BY category, frequency DESC').fetchall()
-            return [dict(row) for row in rows]
\ No newline at end of file
+        with self._lock:
+            rows = self._conn.execute('SELECT question, answer, category FROM faqs ORDER BY category, frequency DESC').fetchall()
+            return [dict(row) for row in rows]
+    
+    def get_top_questions(self, limit: int) -> List[str]:
+        """The `limit` most frequently asked questions."""
+        with self._lock:
+            rows = self._conn.execute('SELECT question FROM faqs ORDER BY frequency DESC LIMIT ?', (limit,)).fetchall()
+            return [row[0] for row in rows]
+    
+    def get_categories(self) -> List[Tuple[str, int]]:
+        """Returns (category, FAQ count) pairs, ordered by name."""
+        with self._lock:
+            rows = self._conn.execute('SELECT category, COUNT(*) FROM faqs GROUP BY category ORDER BY category').fetchall()
+            return [(row[0], row[1]) for row in rows]
+    
+    def _filters(self, category: Optional[str], search: Optional[str]) -> Tuple[str, str, list]:
+        """Builds the FROM and WHERE clauses shared by `get_faqs` and `count_faqs`."""
+        source, conditions, params = 'faqs', [], []
+        query = _fts_query(search or "")
+        if query:
+            # CROSS JOIN keeps the full-text match as the outer loop; otherwise SQLite may
+            # walk the category index and evaluate the MATCH once per row
+            source = 'faqs_fts CROSS JOIN faqs ON faqs.id = faqs_fts.rowid'
+            conditions.append('faqs_fts MATCH ?')
+            params.append(query)
+        if category:
+            conditions.append('faqs.category = ?')
+            params.append(category)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return source, where, params
+    
+    def get_faqs(self, category: Optional[str] = None, search: Optional[str] = None,
+                 limit: int = 20, offset: int = 0) -> List[Dict]:
+        """
+        Returns one page of FAQs, optionally restricted to a category and/or
+        matching a full-text search. Search results are ranked by relevance,
+        others by category and frequency.
+        """
+        source, where, params = self._filters(category, search)
+        if 'MATCH' in where:
+            order = 'ORDER BY bm25(faqs_fts), faqs.frequency DESC'
+        elif category:
+            order = 'ORDER BY faqs.frequency DESC'
+        else:
+            order = 'ORDER BY faqs.category, faqs.frequency DESC'
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT faqs.id, faqs.question, faqs.answer, faqs.category, faqs.frequency FROM {source} {where} {order} LIMIT ? OFFSET ?',
+                params + [limit, offset]
+            ).fetchall()
+            return [dict(row) for row in rows]
+    
+    def count_faqs(self, category: Optional[str] = None, search: Optional[str] = None) -> int:
+        source, where, params = self._filters(category, search)
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM {source} {where}', params).fetchone()[0]
\ No newline at end of file
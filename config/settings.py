@@ -15,17 +15,118 @@ class Settings:
     # Pinecone Configuration
     PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
     PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "legal-documents")
+
+    # Vector Store Backend: "pinecone" or "local"
+    VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone")
+    LOCAL_VECTOR_STORE_PATH = "database/vectors"
+    LOCAL_ANN_MIN_VECTORS = 50000 # switch from exact search to the IVF index above this size
+    LOCAL_ANN_PROBES = 8
     
     # Document Processing
     CHUNK_SIZE = 1200
     CHUNK_OVERLAP = 250
+    CHUNKING_STRATEGY = "legal" # "legal" (Part/Chapter/Section headings) or "character" (blank lines)
+
+    # Ingestion Pipeline
+    INGEST_PARSE_WORKERS = 4
+    INGEST_EMBED_CONCURRENCY = 4
+    INGEST_BATCH_SIZE = 64
+    INGEST_QUEUE_SIZE = 8 # batches buffered between stages
+    INGESTION_MANIFEST_PATH = "database/ingestion_manifest.db"
     
     # RAG Configuration
     RETRIEVAL_TOP_K = 5
     RELEVANCE_THRESHOLD = 7
     MAX_RETRIEVAL_ATTEMPTS = 2
+
+    # Conversation History (sent to the assistant model)
+    HISTORY_TOKEN_BUDGET = 6000
+    HISTORY_KEEP_RECENT_TURNS = 4 # turns kept verbatim; older ones are summarized once over budget
+    HISTORY_SUMMARY_MODEL = "gpt-4o-mini"
+    HISTORY_SUMMARY_CACHE_SIZE = 256
+
+    # Local Relevance Pre-Scoring (gates the LLM grader)
+    PRESCORE_ENABLED = True
+    PRESCORE_AMBIGUOUS_BAND = 1.5 # the LLM grader runs only when |estimate - RELEVANCE_THRESHOLD| < band
+    PRESCORE_AUDIT_RATE = 0.05 # share of confident estimates still sent to the grader to track agreement
+    PRESCORE_SIMILARITY_FLOOR = 0.2
+    PRESCORE_SIMILARITY_CEILING = 0.6
+    PRESCORE_WEIGHTS = {"similarity": 0.5, "overlap": 0.3, "sections": 0.2}
+
+    # Hybrid Retrieval (BM25 + vector, fused with reciprocal rank fusion)
+    HYBRID_SEARCH_ENABLED = True
+    LEXICAL_INDEX_PATH = "database/lexical_index.db"
+    RRF_K = 60
+    HYBRID_DENSE_WEIGHT = 1.0
+    HYBRID_LEXICAL_WEIGHT = 1.0
+    HYBRID_LEXICAL_WEIGHT_EXACT = 2.0 # used when the query cites a section, article or quoted term
+
+    # Diversity Reranking (over-fetch, MMR, then merge neighbouring chunks)
+    RERANK_ENABLED = True
+    RERANK_FETCH_MULTIPLIER = 4 # candidates retrieved per returned chunk
+    RERANK_MMR_LAMBDA = 0.7 # 1.0 ranks by relevance alone; lower values favour diversity
+    RERANK_MAX_MERGED_CHUNKS = 3 # neighbouring chunks of a page joined into one passage
+
+    # Retrieval Cache
+    RETRIEVAL_CACHE_MAX_ENTRIES = 512
+    RETRIEVAL_CACHE_TTL_SECONDS = 600
+    RETRIEVAL_CACHE_SEMANTIC_DISTANCE = 0.05 # cosine distance, None disables near-duplicate reuse
+    KB_VERSION_PATH = "database/kb_version"
+    
+    # Related Questions
+    RELATED_QUESTIONS_TIMEOUT_SECONDS = 0.5 # wait after the answer has streamed before showing none
     
+    # Answer Cache (complete answers to opening questions)
+    ANSWER_CACHE_ENABLED = True
+    ANSWER_CACHE_PATH = "database/answer_cache.db"
+    ANSWER_CACHE_TTL_SECONDS = 7 * 24 * 3600
+    ANSWER_CACHE_WARM_TOP_N = 25 # most frequent FAQ questions answered ahead of time, per persona
+    
+    # LLM Scheduler (budgets are per process; split the account's OpenAI limits across workers)
+    LLM_REQUESTS_PER_MINUTE = 500
+    LLM_TOKENS_PER_MINUTE = 200000
+    LLM_BACKGROUND_RESERVE = 0.25 # share of each budget background calls may not use
+    LLM_ESTIMATED_COMPLETION_TOKENS = 500 # reserved per call until its real usage is known
+    LLM_MAX_RETRIES = 5
+    LLM_RETRY_BASE_SECONDS = 1.0 # doubled after every rate-limited or transient failure, with jitter
+    LLM_RETRY_MAX_SECONDS = 30.0
+
+    # Embedding Cache
+    EMBEDDING_CACHE_PATH = "database/embeddings.db"
+    EMBEDDING_CACHE_MAX_ENTRIES = 20000
+
+    # Tracing & Metrics
+    TRACING_ENABLED = True
+    TRACE_PATH = "logs/traces.jsonl"
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # Set to 0.0.0.0 to let a remote Prometheus scrape
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+    # HTTP API
+    API_HOST = os.getenv("API_HOST", "0.0.0.0")
+    API_PORT = int(os.getenv("API_PORT", "8000"))
+    API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+    API_MAX_CONCURRENT_STREAMS = 16 # per worker process
+    API_MAX_QUEUED_REQUESTS = 64 # waiting for a stream slot; beyond this requests get 503
+    API_QUEUE_TIMEOUT_SECONDS = 10.0
+    API_RETRY_AFTER_SECONDS = 2
+    ASSISTANT_API_URL = os.getenv("ASSISTANT_API_URL") # e.g. http://localhost:8000; unset runs the graph in the Streamlit process
+    ASSISTANT_API_TIMEOUT_SECONDS = 120.0
+    
+    # Background Content Generation
+    JOB_QUEUE_PATH = "database/jobs.db"
+    CONTENT_WORKER_CONCURRENCY = 2
+    JOB_MAX_ATTEMPTS = 5
+    JOB_VISIBILITY_TIMEOUT_SECONDS = 300 # a claimed job is re-delivered if not finished within this time
+    JOB_RETRY_BACKOFF_SECONDS = 30 # doubled after every failed attempt
+    JOB_POLL_INTERVAL_SECONDS = 1.0
+    FAQ_BATCH_SIZE = 8 # queued conversations summarized per FAQ generation call
+
     DATABASE_PATH = "database/faqs.db"
+    FAQ_PAGE_SIZE = 20
+
+    # Semantic Deduplication (generated FAQs and suggested questions)
+    DEDUP_SIMILARITY_THRESHOLD = 0.9 # cosine similarity at which two questions count as paraphrases
+    FAQ_DEDUP_CANDIDATES = 50 # stored FAQs, preselected by full-text rank, compared per new question
     PINECONE_FAQ_NAMESPACE = "faq-questions"
 
     # Streamlit Configuration
@@ -1,6 +1,7 @@
 import argparse
 import json
 import os
+import signal
 import sys
 import logging
 from typing import List, Dict
@@ -12,54 +13,71 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 try:
     project_root = os.path.dirname(os.path.abspath(__file__))
     sys.path.insert(0, project_root)
-    from src.faq_generator import FAQGenerator
-    from src.question_generator import QuestionGenerator
-    from src.vector_store import VectorStoreManager
+    from src.content_worker import ContentWorker, enqueue_conversation, create_job_queue
 except ImportError as e:
     logging.error(f"Failed to import project modules. Error: {e}")
     sys.exit(1)
 
-def run_content_generation(conversation_file: str):
+def run_worker(concurrency: int):
     """
-    Orchestrates the generation of both FAQs (to SQLite) and suggested questions (to Pinecone).
+    Runs the long-lived content worker, which generates FAQs (to SQLite) and
+    suggested questions (to the vector store) from queued conversations.
     """
+    worker = ContentWorker(create_job_queue(), concurrency=concurrency)
+
+    def shutdown(signum, frame):
+        logging.info("Shutting down after in-flight jobs finish...")
+        worker.stop()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    worker.run()
+
+def compact_duplicates():
+    """Merges near-duplicate FAQs and suggested questions that were stored before deduplication."""
+    from config.database import FAQDatabase
+    from config.settings import settings
+    from src.dedup import compact_faqs, compact_suggested_questions
+    from src.clients import get_vector_store_manager
+
+    vector_store_manager = get_vector_store_manager()
+    threshold = settings.DEDUP_SIMILARITY_THRESHOLD
+    faqs_removed = compact_faqs(FAQDatabase(settings.DATABASE_PATH), vector_store_manager.embeddings, threshold)
+    questions_removed = compact_suggested_questions(vector_store_manager, threshold)
+    logging.info(f"Compaction removed {faqs_removed} FAQs and {questions_removed} suggested questions.")
+
+def enqueue_conversation_file(conversation_file: str):
+    """Queues content generation for a conversation saved as JSON."""
     try:
         logging.info(f"Loading conversation from {conversation_file}")
         with open(conversation_file, 'r') as f:
             conversation_history: List[Dict[str, str]] = json.load(f)
-        
+
         if len(conversation_history) < 2:
             logging.warning("Conversation too short. Skipping content generation.")
             return
 
-        # --- 1. Generate and Store FAQs ---
-        logging.info("Starting FAQ generation...")
-        faq_generator = FAQGenerator()
-        faq_generator.generate_and_store_faqs(conversation_history)
-        
-        # --- 2. Generate and Store Suggested Questions ---
-        logging.info("Starting Suggested Questions generation...")
-        question_generator = QuestionGenerator()
-        questions = question_generator.generate_questions_from_conversation(conversation_history)
-        
-        if questions:
-            logging.info(f"Storing {len(questions)} suggested questions in vector store...")
-            vector_store_manager = VectorStoreManager()
-            vector_store_manager.add_suggested_questions(questions)
-            logging.info("Successfully stored suggested questions.")
-        else:
-            logging.info("No suggested questions were generated.")
-
-    except Exception as e:
-        logging.error(f"An unexpected error occurred during content generation: {e}", exc_info=True)
+        job_ids = enqueue_conversation(create_job_queue(), conversation_history)
+        logging.info(f"Queued content generation jobs {job_ids}.")
     finally:
         if os.path.exists(conversation_file):
             os.remove(conversation_file)
             logging.info(f"Cleaned up temporary file: {conversation_file}")
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Generate and store FAQs and suggested questions from a conversation.")
-    parser.add_argument("conversation_file", type=str, help="Path to the JSON file containing the conversation history.")
-    
+    parser = argparse.ArgumentParser(description="Generate and store FAQs and suggested questions from conversations.")
+    parser.add_argument("conversation_file", type=str, nargs="?", help="Path to a JSON conversation history to queue for processing.")
+    parser.add_argument("--worker", action="store_true", help="Run the background worker that processes queued conversations.")
+    parser.add_argument("--compact", action="store_true", help="Merge near-duplicate FAQs and suggested questions, then exit.")
+    parser.add_argument("--concurrency", type=int, default=None, help="Jobs processed in parallel by the worker.")
+
     args = parser.parse_args()
-    run_content_generation(args.conversation_file)
\ No newline at end of file
+    if args.compact:
+        compact_duplicates()
+    elif args.worker:
+        from config.settings import settings
+        run_worker(args.concurrency or settings.CONTENT_WORKER_CONCURRENCY)
+    elif args.conversation_file:
+        enqueue_conversation_file(args.conversation_file)
+    else:
+        parser.error("Pass a conversation file to queue, or --worker to process the queue.")
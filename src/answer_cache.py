@@ -0,0 +1,104 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterator, List, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from src.retrieval_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+def persona_key(is_professional: bool) -> str:
+    """The assistant has one prompt for professionals and one for everyone else."""
+    return "professional" if is_professional else "general"
+
+
+def first_turn_question(messages: List[BaseMessage]) -> Optional[str]:
+    """The question if `messages` is a lone user message (no prior context), else None."""
+    if len(messages) == 1 and isinstance(messages[0], HumanMessage):
+        return str(messages[0].content)
+    return None
+
+
+def stream_cached(answer: str, chunk_size: int = 24) -> Iterator[str]:
+    """Replays a cached answer as small chunks so it renders like a streamed one."""
+    for start in range(0, len(answer), chunk_size):
+        yield answer[start:start + chunk_size]
+
+
+class AnswerCache:
+    """
+    Complete assistant answers to opening questions, persisted in SQLite so
+    every app process and the content worker share them.
+
+    Entries are keyed by (persona, normalized question, knowledge base
+    version). Re-ingesting documents changes the version, which makes every
+    older entry unreachable; those rows are purged on the next write.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: float = 7 * 24 * 3600):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._purged_version: Optional[str] = None
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS answers (
+                    persona TEXT NOT NULL,
+                    question_key TEXT NOT NULL,
+                    kb_version TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (persona, question_key, kb_version)
+                )
+            ''')
+            self._conn.commit()
+
+    def get(self, is_professional: bool, question: str, kb_version: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT answer FROM answers WHERE persona = ? AND question_key = ? AND kb_version = ? AND created_at >= ?',
+                (persona_key(is_professional), normalize_query(question), kb_version, time.time() - self.ttl_seconds)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def contains(self, is_professional: bool, question: str, kb_version: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                'SELECT 1 FROM answers WHERE persona = ? AND question_key = ? AND kb_version = ? AND created_at >= ?',
+                (persona_key(is_professional), normalize_query(question), kb_version, time.time() - self.ttl_seconds)
+            ).fetchone() is not None
+
+    def put(self, is_professional: bool, question: str, kb_version: str, answer: str):
+        if not answer:
+            return
+        with self._lock:
+            if self._purged_version != kb_version:
+                # Answers grounded in an older knowledge base can never be served again
+                deleted = self._conn.execute('DELETE FROM answers WHERE kb_version != ?', (kb_version,)).rowcount
+                if deleted:
+                    logger.info(f"Dropped {deleted} cached answers from previous knowledge base versions.")
+                self._purged_version = kb_version
+            self._conn.execute(
+                'INSERT OR REPLACE INTO answers (persona, question_key, kb_version, question, answer, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (persona_key(is_professional), normalize_query(question), kb_version, question, answer, time.time())
+            )
+            self._conn.commit()
@@ -0,0 +1,235 @@
+"""
+Headless HTTP API for the legal assistant graph.
+
+The service is stateless: every request carries the full conversation, so
+any number of workers can run behind a load balancer.
+
+    uvicorn src.api:app --host 0.0.0.0 --port 8000 --workers 4
+    python -m src.api
+
+Endpoints:
+    POST /v1/chat               {"messages": [{"role": "user", "content": "..."}], "persona": "professional"}
+                                streams the answer as server-sent events: `token` events
+                                with {"text": ...}, then one `done` event with {"answer": ...}
+                                (or an `error` event)
+    POST /v1/related-questions  {"question": "...", "k": 3} -> {"questions": [...]}
+    GET  /healthz
+    GET  /metrics               Prometheus text format
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from typing import Any, AsyncIterator, Dict, List
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from config.settings import settings
+from src import clients
+from src.embedding_cache import embedding_turn
+from src.graph import astream_answer
+from src.tracing import register_metrics, trace_turn, tracer
+
+logger = logging.getLogger(__name__)
+
+# The assistant has one prompt for legal professionals and one for everyone else
+PERSONAS = {"professional": True, "student": False, "general": False}
+
+
+class RequestError(ValueError):
+    """A malformed request body; reported to the client as HTTP 400."""
+
+
+class AdmissionControl:
+    """
+    Caps concurrent answer streams per worker. Requests beyond the cap wait
+    in a bounded queue; when the queue is full, or a request waits longer
+    than `queue_timeout`, it is rejected so the load balancer can retry
+    elsewhere instead of piling up latency here.
+    """
+
+    def __init__(self, max_concurrent: int, max_queued: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queued = 0
+        self.rejected = 0
+        self._semaphore = None
+        self._lock = threading.Lock()
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the server's event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+
+    async def acquire(self) -> bool:
+        semaphore = self._get_semaphore()
+        with self._lock:
+            if semaphore.locked() and self.queued >= self.max_queued:
+                self.rejected += 1
+                return False
+            self.queued += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.rejected += 1
+            return False
+        finally:
+            with self._lock:
+                self.queued -= 1
+        with self._lock:
+            self.active += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+        self._get_semaphore().release()
+
+    def metrics(self) -> List[str]:
+        with self._lock:
+            return [
+                "# HELP legal_assistant_api_streams Answer streams in progress and waiting for a slot.",
+                "# TYPE legal_assistant_api_streams gauge",
+                f'legal_assistant_api_streams{{state="active"}} {self.active}',
+                f'legal_assistant_api_streams{{state="queued"}} {self.queued}',
+                "# HELP legal_assistant_api_rejected_total Requests rejected because the queue was full or timed out.",
+                "# TYPE legal_assistant_api_rejected_total counter",
+                f"legal_assistant_api_rejected_total {self.rejected}",
+            ]
+
+
+admission = AdmissionControl(
+    settings.API_MAX_CONCURRENT_STREAMS,
+    settings.API_MAX_QUEUED_REQUESTS,
+    settings.API_QUEUE_TIMEOUT_SECONDS
+)
+register_metrics(admission.metrics)
+
+
+def parse_messages(raw_messages: Any) -> List[BaseMessage]:
+    """Converts [{"role": "user" | "assistant", "content": str}, ...] into chat messages ending with a user turn."""
+    if not isinstance(raw_messages, list) or not raw_messages:
+        raise RequestError("`messages` must be a non-empty list")
+    messages: List[BaseMessage] = []
+    for message in raw_messages:
+        if not isinstance(message, dict) or not isinstance(message.get("content"), str):
+            raise RequestError("every message needs a string `content`")
+        role = message.get("role")
+        if role == "user":
+            messages.append(HumanMessage(content=message["content"]))
+        elif role == "assistant":
+            messages.append(AIMessage(content=message["content"]))
+        else:
+            raise RequestError(f"unknown role: {role!r}")
+    if not isinstance(messages[-1], HumanMessage):
+        raise RequestError("the last message must come from the user")
+    return messages
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _read_json(request: Request) -> Dict[str, Any]:
+    try:
+        body = await request.json()
+    except ValueError:
+        raise RequestError("the request body must be JSON")
+    if not isinstance(body, dict):
+        raise RequestError("the request body must be a JSON object")
+    return body
+
+
+async def _answer_events(messages: List[BaseMessage], persona: str) -> AsyncIterator[str]:
+    chunks = []
+    with trace_turn(persona=persona, history_messages=len(messages), channel="api"):
+        try:
+            async for chunk in astream_answer(messages, PERSONAS[persona]):
+                chunks.append(chunk)
+                yield _sse("token", {"text": chunk})
+        except Exception as e:
+            logger.error(f"Failed to answer a chat request: {e}")
+            yield _sse("error", {"error": "The assistant failed to answer. Please try again."})
+            return
+    yield _sse("done", {"answer": "".join(chunks)})
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """Releases the admission slot once the response is finished, failed or abandoned by the client."""
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            admission.release()
+
+
+async def chat(request: Request) -> Response:
+    try:
+        body = await _read_json(request)
+        messages = parse_messages(body.get("messages"))
+        persona = body.get("persona", "general")
+        if persona not in PERSONAS:
+            raise RequestError(f"`persona` must be one of {sorted(PERSONAS)}")
+    except RequestError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    if not await admission.acquire():
+        return JSONResponse(
+            {"error": "The assistant is busy. Please retry shortly."},
+            status_code=503,
+            headers={"Retry-After": str(settings.API_RETRY_AFTER_SECONDS)}
+        )
+    return AdmittedStreamingResponse(
+        _answer_events(messages, persona),
+        media_type="text/event-stream",
+        # Proxies must pass tokens through as they arrive
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def related_questions(request: Request) -> Response:
+    try:
+        body = await _read_json(request)
+        question = body.get("question")
+        k = body.get("k", 3)
+        if not isinstance(question, str) or not isinstance(k, int) or not 1 <= k <= 10:
+            raise RequestError("`question` must be a string and `k` an integer from 1 to 10")
+    except RequestError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    with embedding_turn():
+        questions = await clients.get_vector_store_manager().aget_similar_faq_questions(question, k=k)
+    return JSONResponse({"questions": questions})
+
+
+async def healthz(request: Request) -> Response:
+    return JSONResponse({"status": "ok"})
+
+
+async def metrics(request: Request) -> Response:
+    return PlainTextResponse(tracer.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+app = Starlette(routes=[
+    Route("/v1/chat", chat, methods=["POST"]),
+    Route("/v1/related-questions", related_questions, methods=["POST"]),
+    Route("/healthz", healthz, methods=["GET"]),
+    Route("/metrics", metrics, methods=["GET"]),
+])
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO)
+    uvicorn.run("src.api:app", host=settings.API_HOST, port=settings.API_PORT, workers=settings.API_WORKERS)
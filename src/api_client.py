@@ -0,0 +1,53 @@
+import json
+import logging
+from typing import Iterator, List
+
+import httpx
+from langchain_core.messages import BaseMessage, HumanMessage
+
+logger = logging.getLogger(__name__)
+
+
+class AssistantAPIError(RuntimeError):
+    """The assistant API rejected a request or reported a failure mid-stream."""
+
+
+class AssistantAPIClient:
+    """Synchronous client for the HTTP API in `src.api`, used by the Streamlit app."""
+
+    def __init__(self, base_url: str, timeout: float = 120.0):
+        self.base_url = base_url.rstrip("/")
+        self._client = httpx.Client(timeout=timeout)
+
+    def stream_answer(self, messages: List[BaseMessage], persona: str) -> Iterator[str]:
+        """Yields answer tokens as the server streams them."""
+        payload = {
+            "messages": [
+                {"role": "user" if isinstance(message, HumanMessage) else "assistant", "content": str(message.content)}
+                for message in messages
+            ],
+            "persona": persona,
+        }
+        with self._client.stream("POST", f"{self.base_url}/v1/chat", json=payload) as response:
+            if response.status_code != 200:
+                response.read()
+                raise AssistantAPIError(f"{response.status_code}: {response.text}")
+            event = None
+            for line in response.iter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    data = json.loads(line[len("data: "):])
+                    if event == "token":
+                        yield data["text"]
+                    elif event == "error":
+                        raise AssistantAPIError(data["error"])
+
+    def related_questions(self, question: str, k: int = 3) -> List[str]:
+        try:
+            response = self._client.post(f"{self.base_url}/v1/related-questions", json={"question": question, "k": k})
+            response.raise_for_status()
+            return response.json()["questions"]
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            logger.error(f"Failed to fetch related questions from the assistant API: {e}")
+            return []
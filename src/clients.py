@@ -0,0 +1,144 @@
+"""
+Process-wide registry of model, embedding and vector store clients.
+
+Clients are created on first use instead of at import time, so importing
+the graph, the tools or a background task makes no network calls and does
+not load client libraries it never uses. Every caller in a process shares
+the same instances, and the Pinecone index check runs once per process.
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Set
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_instances: Dict[str, Any] = {}
+_checked_indexes: Set[str] = set()
+# Reentrant, because factories build on other registry entries
+_lock = threading.RLock()
+
+
+def _get(name: str, factory: Callable[[], Any]) -> Any:
+    instance = _instances.get(name)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(name)
+            if instance is None:
+                instance = factory()
+                _instances[name] = instance
+    return instance
+
+
+def override(name: str, instance: Any):
+    """Replaces a registry entry, e.g. with a fake client in benchmarks."""
+    with _lock:
+        _instances[name] = instance
+
+
+def reset():
+    """Drops every client so the next use creates it again from the current settings."""
+    with _lock:
+        _instances.clear()
+        _checked_indexes.clear()
+
+
+def create_chat_model(model: str, priority: str = "interactive", **kwargs):
+    """
+    A new, unshared chat model client, for callers that wrap it (e.g. with structured output).
+    Its calls go through the process-wide LLM scheduler at `priority`, which also owns retries.
+    """
+    from src.scheduled_chat_model import ScheduledChatOpenAI
+    return ScheduledChatOpenAI(model=model, api_key=settings.OPENAI_API_KEY, priority=priority, max_retries=0, **kwargs)
+
+
+def get_chat_model():
+    return _get("chat_model", lambda: create_chat_model(settings.PRIMARY_MODEL, stream_usage=True))
+
+
+def get_agent_with_tool():
+    """The primary chat model with the knowledge base search tool bound."""
+    def factory():
+        from src.tools import search_knowledge_base
+        return get_chat_model().bind_tools([search_knowledge_base])
+    return _get("agent_with_tool", factory)
+
+
+def get_scoring_model():
+    return _get("scoring_model", lambda: create_chat_model(settings.SCORE_DOCUMENTS_MODEL, temperature=0.5))
+
+
+def get_rewriter_model():
+    return _get("rewriter_model", lambda: create_chat_model(settings.REWRITE_QUERY_MODEL, temperature=0.5))
+
+
+def get_summary_model():
+    return _get("summary_model", lambda: create_chat_model(settings.HISTORY_SUMMARY_MODEL, temperature=0))
+
+
+def get_history_manager():
+    def factory():
+        from src.history import HistoryManager
+        return HistoryManager(
+            get_summary_model(),
+            budget_tokens=settings.HISTORY_TOKEN_BUDGET,
+            keep_recent_turns=settings.HISTORY_KEEP_RECENT_TURNS,
+            cache_size=settings.HISTORY_SUMMARY_CACHE_SIZE
+        )
+    return _get("history_manager", factory)
+
+
+def get_embeddings():
+    """The OpenAI embedder behind the on-disk embedding cache."""
+    def factory():
+        from langchain_openai import OpenAIEmbeddings
+        from src.embedding_cache import CachedEmbeddings
+        return CachedEmbeddings(
+            OpenAIEmbeddings(model=settings.EMBEDDING_MODEL, openai_api_key=settings.OPENAI_API_KEY),
+            model=settings.EMBEDDING_MODEL,
+            db_path=settings.EMBEDDING_CACHE_PATH,
+            max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+        )
+    return _get("embeddings", factory)
+
+
+def get_vector_store_manager():
+    def factory():
+        from src.vector_store import VectorStoreManager
+        return VectorStoreManager()
+    return _get("vector_store_manager", factory)
+
+
+def get_pinecone():
+    def factory():
+        from pinecone import Pinecone
+        return Pinecone(api_key=settings.PINECONE_API_KEY)
+    return _get("pinecone", factory)
+
+
+def get_pinecone_index(index_name: str):
+    """A shared handle to `index_name`, creating the index the first time this process uses it."""
+    def factory():
+        _ensure_pinecone_index(index_name)
+        return get_pinecone().Index(index_name)
+    return _get(f"pinecone_index:{index_name}", factory)
+
+
+def _ensure_pinecone_index(index_name: str):
+    if index_name in _checked_indexes:
+        return
+    from pinecone import ServerlessSpec
+    pc = get_pinecone()
+    if index_name not in pc.list_indexes().names():
+        logger.info(f"Creating Pinecone index: {index_name}")
+        pc.create_index(
+            name=index_name,
+            dimension=3072, # Dimension for text-embedding-3-large
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1")
+        )
+    else:
+        logger.info(f"Pinecone index '{index_name}' already exists.")
+    _checked_indexes.add(index_name)
@@ -0,0 +1,178 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from config.settings import settings
+from src import clients
+from src.faq_generator import FAQGenerator
+from src.job_queue import Job, JobQueue
+from src.llm_scheduler import llm_priority
+from src.question_generator import QuestionGenerator
+
+logger = logging.getLogger(__name__)
+
+# Each ended chat becomes one job per kind, so a failure in one step never replays the other
+FAQ_JOB = "faqs"
+SUGGESTED_QUESTIONS_JOB = "suggested_questions"
+WARM_ANSWERS_JOB = "warm_answers"
+# Warming is fanned out to one job per question, so each stays well within the job lease
+WARM_QUESTION_JOB = "warm_question"
+
+
+def create_job_queue() -> JobQueue:
+    return JobQueue(
+        settings.JOB_QUEUE_PATH,
+        visibility_timeout=settings.JOB_VISIBILITY_TIMEOUT_SECONDS,
+        retry_backoff=settings.JOB_RETRY_BACKOFF_SECONDS,
+        max_attempts=settings.JOB_MAX_ATTEMPTS
+    )
+
+
+def enqueue_conversation(job_queue: JobQueue, conversation_history: List[Dict[str, str]]) -> List[int]:
+    """Queues FAQ and suggested-question generation for an ended conversation."""
+    payload = {"conversation": conversation_history}
+    return [job_queue.enqueue(kind, payload) for kind in (FAQ_JOB, SUGGESTED_QUESTIONS_JOB)]
+
+
+def enqueue_answer_warming(job_queue: JobQueue) -> Optional[int]:
+    """Queues answering the most frequent FAQ questions ahead of time, unless that is already queued."""
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    if job_queue.has_pending(WARM_ANSWERS_JOB) or job_queue.has_pending(WARM_QUESTION_JOB):
+        return None
+    return job_queue.enqueue(WARM_ANSWERS_JOB, {"top_n": settings.ANSWER_CACHE_WARM_TOP_N})
+
+
+class ContentWorker:
+    """
+    Long-lived consumer of the content-generation job queue.
+
+    Model clients and the vector store connection are created once and
+    shared by up to `concurrency` jobs running in parallel.
+    """
+
+    def __init__(self, job_queue: JobQueue, concurrency: int = settings.CONTENT_WORKER_CONCURRENCY,
+                 faq_batch_size: int = settings.FAQ_BATCH_SIZE):
+        self.job_queue = job_queue
+        self.concurrency = concurrency
+        self.faq_batch_size = faq_batch_size
+        self.vector_store_manager = clients.get_vector_store_manager()
+        self.faq_generator = FAQGenerator(embeddings=self.vector_store_manager.embeddings)
+        self.question_generator = QuestionGenerator()
+        self.handlers: Dict[str, Callable[[Dict], None]] = {
+            FAQ_JOB: self._generate_faqs,
+            SUGGESTED_QUESTIONS_JOB: self._generate_suggested_questions,
+            WARM_ANSWERS_JOB: self._plan_answer_warming,
+            WARM_QUESTION_JOB: self._warm_answer,
+        }
+        self._stop = threading.Event()
+
+    def _generate_faqs(self, payload: Dict):
+        self.faq_generator.generate_and_store_faqs(payload["conversation"])
+
+    def _generate_faqs_batch(self, jobs: List[Job]) -> List[List[Dict[str, str]]]:
+        return self.faq_generator.generate_faqs_batch([job.payload["conversation"] for job in jobs])
+
+    def _generate_suggested_questions(self, payload: Dict):
+        questions = self.question_generator.generate_questions_from_conversation(payload["conversation"])
+        if questions:
+            self.vector_store_manager.add_suggested_questions(questions)
+            logger.info(f"Stored {len(questions)} suggested questions.")
+        else:
+            logger.info("No suggested questions were generated.")
+
+    def _plan_answer_warming(self, payload: Dict):
+        questions = self.faq_generator.db.get_top_questions(payload["top_n"])
+        for question in questions:
+            self.job_queue.enqueue(WARM_QUESTION_JOB, {"question": question})
+        logger.info(f"Queued answer warming for {len(questions)} questions.")
+
+    def _warm_answer(self, payload: Dict):
+        # The assistant graph is only needed for this job, so it is loaded on first use
+        from src.graph import warm_answer_cache
+        # Answers are precomputed here, so they queue behind live conversations for the model
+        with llm_priority("background"):
+            warm_answer_cache([payload["question"]])
+
+    def process_faq_batch(self, jobs: List[Job]):
+        """
+        Generates FAQs for several jobs with one LLM call, then stores and completes each job on its own.
+        If the batched call fails, every job is run separately instead.
+        """
+        try:
+            faq_lists = self._generate_faqs_batch(jobs)
+        except Exception as e:
+            # One bad conversation must not burn the attempts of the others; only the failing job is retried
+            logger.warning(f"Batched FAQ generation failed ({type(e).__name__}: {e}); processing {len(jobs)} jobs one by one.")
+            for job in jobs:
+                self.process(job)
+            return
+        completed = 0
+        for job, faqs in zip(jobs, faq_lists):
+            try:
+                self.faq_generator.store_faqs(faqs)
+            except Exception as e:
+                self.job_queue.fail(job, f"{type(e).__name__}: {e}")
+            else:
+                if self.job_queue.complete(job):
+                    completed += 1
+        logger.info(f"Completed {completed} of {len(jobs)} FAQ jobs in one batch.")
+        if completed:
+            # New FAQs can change which questions are most popular
+            enqueue_answer_warming(self.job_queue)
+
+    def process(self, job: Job):
+        """Runs a single job and records the outcome in the queue."""
+        handler = self.handlers.get(job.kind)
+        if handler is None:
+            self.job_queue.fail(job, f"Unknown job kind: {job.kind}")
+            return
+        try:
+            handler(job.payload)
+        except Exception as e:
+            self.job_queue.fail(job, f"{type(e).__name__}: {e}")
+        else:
+            if self.job_queue.complete(job):
+                logger.info(f"Completed job {job.id} ({job.kind}) on attempt {job.attempts}.")
+
+    def _consume(self, poll_interval: float):
+        while not self._stop.is_set():
+            try:
+                job = self.job_queue.claim()
+            except Exception as e:
+                logger.error(f"Failed to claim a job: {e}")
+                job = None
+            if job is None:
+                self._stop.wait(poll_interval)
+                continue
+            try:
+                self._dispatch(job)
+            except Exception:
+                # e.g. the queue database was locked while recording the outcome; the lease makes
+                # the job claimable again, and this consumer must keep running
+                logger.exception(f"Failed to process job {job.id} ({job.kind}).")
+
+    def _dispatch(self, job: Job):
+        if job.kind == FAQ_JOB and self.faq_batch_size > 1:
+            # Sweep up other queued conversations so a burst costs one LLM call
+            try:
+                batch = [job] + self.job_queue.claim_batch(FAQ_JOB, self.faq_batch_size - 1)
+            except Exception as e:
+                logger.error(f"Failed to claim a batch of FAQ jobs: {e}")
+                batch = [job]
+            self.process_faq_batch(batch)
+            return
+        self.process(job)
+
+    def run(self, poll_interval: float = settings.JOB_POLL_INTERVAL_SECONDS):
+        """Processes jobs until `stop()` is called."""
+        logger.info(f"Content worker started with concurrency {self.concurrency}.")
+        enqueue_answer_warming(self.job_queue)
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="content-worker") as pool:
+            for _ in range(self.concurrency):
+                pool.submit(self._consume, poll_interval)
+        logger.info("Content worker stopped.")
+
+    def stop(self):
+        self._stop.set()
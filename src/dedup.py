@@ -0,0 +1,91 @@
+import logging
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim != 2 or not len(matrix):
+        return matrix.reshape(len(matrix), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def near_duplicate_groups(
+    vectors: np.ndarray,
+    priority: Sequence[float],
+    threshold: float,
+    block_size: int = 1024,
+) -> List[Tuple[int, List[int]]]:
+    """
+    Clusters rows of a normalized matrix whose cosine similarity is at least
+    `threshold`. Returns (keeper, duplicates) pairs, one per cluster with
+    more than one member.
+
+    Rows are visited in descending `priority` (e.g. frequency); each
+    unassigned row becomes a keeper and absorbs its unassigned neighbours.
+    Clusters are built around a keeper rather than by transitive closure,
+    so a chain of small rewordings cannot drift into a different question.
+    Similarities are computed in blocks to bound memory.
+    """
+    count = len(vectors)
+    neighbours: List[np.ndarray] = []
+    for start in range(0, count, block_size):
+        similarities = vectors[start:start + block_size] @ vectors.T
+        neighbours.extend(np.flatnonzero(row >= threshold) for row in similarities)
+
+    assigned = np.zeros(count, dtype=bool)
+    groups = []
+    for keeper in np.argsort(-np.asarray(priority, dtype=np.float64), kind="stable"):
+        if assigned[keeper]:
+            continue
+        assigned[keeper] = True
+        duplicates = [int(row) for row in neighbours[keeper] if not assigned[row]]
+        if duplicates:
+            assigned[duplicates] = True
+            groups.append((int(keeper), duplicates))
+    return groups
+
+
+def compact_faqs(faq_db, embeddings, threshold: float) -> int:
+    """Merges near-duplicate FAQs into their most frequent variant. Returns the number of FAQs removed."""
+    rows = faq_db.get_question_embeddings()
+    missing = [i for i, (_, _, _, vector) in enumerate(rows) if vector is None]
+    if missing:
+        # FAQs stored before embeddings were kept
+        vectors = embeddings.embed_documents([rows[i][1] for i in missing])
+        faq_db.set_embeddings([(rows[i][0], vector) for i, vector in zip(missing, vectors)])
+        for i, vector in zip(missing, vectors):
+            rows[i] = (*rows[i][:3], vector)
+    if len(rows) < 2:
+        return 0
+
+    matrix = normalize([vector for _, _, _, vector in rows])
+    groups = near_duplicate_groups(matrix, [frequency for _, _, frequency, _ in rows], threshold)
+    for keeper, duplicates in groups:
+        faq_db.merge_faqs(rows[keeper][0], [rows[i][0] for i in duplicates])
+    removed = sum(len(duplicates) for _, duplicates in groups)
+    logger.info(f"Merged {removed} near-duplicate FAQs into {len(groups)} entries.")
+    return removed
+
+
+def compact_suggested_questions(vector_store_manager, threshold: float) -> int:
+    """Merges near-duplicate suggested questions into their most frequent variant. Returns the number removed."""
+    namespace = vector_store_manager.faq_namespace
+    ids, vectors, _, metadatas = vector_store_manager.load_namespace(namespace)
+    if len(ids) < 2:
+        return 0
+
+    frequencies = [int(metadata.get("frequency", 1)) for metadata in metadatas]
+    groups = near_duplicate_groups(normalize(vectors), frequencies, threshold)
+    for keeper, duplicates in groups:
+        total = frequencies[keeper] + sum(frequencies[i] for i in duplicates)
+        vector_store_manager.update_vector_metadata(ids[keeper], {"frequency": total}, namespace=namespace)
+    removed_ids = [ids[i] for _, duplicates in groups for i in duplicates]
+    vector_store_manager.delete_vectors(removed_ids, namespace=namespace)
+    logger.info(f"Merged {len(removed_ids)} near-duplicate suggested questions into {len(groups)} entries.")
+    return len(removed_ids)
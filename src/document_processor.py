@@ -1,14 +1,225 @@
+import io
+import os
 import re
-from typing import List, Dict, Any
-from langchain_text_splitters import CharacterTextSplitter
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from langchain_text_splitters import CharacterTextSplitter, RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from langchain_community.document_loaders import PyPDFLoader
-import streamlit as st
+from pypdf import PdfReader
+from config.settings import settings
 
-class LegalDocumentProcessor:
+_NUMBER = r"(?P<number>(?-i:[0-9]+[A-Z]?|[IVXLC]+))"
+_TITLE = r"\.?\s*[-–—:]?\s*(?P<title>.*)$"
+
+# (kind, level, pattern) for headings that open a unit of a statute; lower levels enclose higher ones.
+# Titles must be empty or capitalized, so running text such as "Section 12 of this Act" is not a heading.
+_HEADING_PATTERNS = [
+    ("schedule", 0, re.compile(
+        r"^(?:(?:first|second|third|fourth|fifth|sixth|seventh|eighth|ninth|tenth)\s+)?schedule(?:\s+" + _NUMBER + r")?\b" + _TITLE,
+        re.IGNORECASE)),
+    ("part", 1, re.compile(r"^part\s+" + _NUMBER + r"\b" + _TITLE, re.IGNORECASE)),
+    ("chapter", 2, re.compile(r"^chapter\s+" + _NUMBER + r"\b" + _TITLE, re.IGNORECASE)),
+    ("section", 3, re.compile(r"^(?:section|sec\.|§)\s*(?P<number>(?-i:[0-9]+[A-Z]?))(?![(\d])" + _TITLE, re.IGNORECASE)),
+    ("article", 3, re.compile(r"^article\s+(?P<number>(?-i:[0-9]+[A-Z]?))(?![(\d])" + _TITLE, re.IGNORECASE)),
+]
+# Statutes often number sections bare, as in "23. Offences and penalties". Wrapped body text can look
+# the same ("2016. The amendment applies."), so these need the extra checks in `_is_bare_section`.
+_BARE_SECTION_PATTERN = re.compile(r"^(?P<number>(?P<digits>[0-9]{1,3})(?P<suffix>[A-Z]?))\.\s+(?P<title>.+)$")
+_MAX_HEADING_LENGTH = 120
+_MAX_BARE_HEADING_LENGTH = 60
+
+def _section_order(number: str) -> Optional[Tuple[int, str]]:
+    """Sort key of a section number such as "23A", or None if it is not numeric."""
+    match = re.match(r"^([0-9]+)([A-Z]?)$", number or "")
+    return (int(match.group(1)), match.group(2)) if match else None
+
+def _is_bare_section(match: re.Match, line: str, after_blank_line: bool, current_section: Optional[str]) -> bool:
+    # Must stand apart from the text around it: after a blank line, or short and without closing punctuation
+    if not after_blank_line and (len(line) > _MAX_BARE_HEADING_LENGTH or line[-1] in ".,;:?!"):
+        return False
+    # Section numbers only go up within a Part or Chapter
+    current = _section_order(current_section)
+    return current is None or (int(match.group("digits")), match.group("suffix")) > current
+
+def match_heading(line: str, after_blank_line: bool = True,
+                  current_section: Optional[str] = None) -> Optional[Tuple[int, str, str, str]]:
+    """
+    Returns (level, kind, number, label) if `line` is a structural heading, e.g. (1, "part", "II", "PART II").
+    Bare numbered sections ("23. Offences") are only recognized after a blank line or when short and
+    unpunctuated, and only if they number higher than `current_section`.
+    """
+    line = line.strip()
+    if not line or len(line) > _MAX_HEADING_LENGTH:
+        return None
+    for kind, level, pattern in _HEADING_PATTERNS:
+        match = pattern.match(line)
+        if match and not match.group("title")[:1].islower():
+            number = match.group("number") or ""
+            label = line[:match.start("title")].strip(" .-–—:")
+            if not re.search(r"[^\W\d]", label):
+                label = f"{kind.capitalize()} {number}".strip()
+            return level, kind, number, label
+    match = _BARE_SECTION_PATTERN.match(line)
+    if match and not match.group("title")[:1].islower() and _is_bare_section(match, line, after_blank_line, current_section):
+        number = match.group("number")
+        return 3, "section", number, f"Section {number}"
+    return None
+
+class LegalStructureSplitter:
+    """
+    Chunks statute text along its Part, Chapter, Section, Article and
+    Schedule headings, so no section is ever cut between two chunks unless
+    it is longer than `chunk_size` on its own.
+
+    Consecutive short sections under the same Part/Chapter are packed
+    together up to `chunk_size`; oversized sections fall back to size-based
+    splitting. The enclosing headings are tracked across pages and attached
+    as `section`, `heading` and `hierarchy` metadata. Chunks never cross
+    pages, so page citations stay exact.
+    """
+    
     def __init__(self, chunk_size: int = 1500, chunk_overlap: int = 300):
+        self.chunk_size = chunk_size
+        self.fallback_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            separators=["\n\n", "\n", ". ", " ", ""],
+        )
+    
+    def split_pages(self, pages: Iterable[Tuple[int, str]], source: str) -> Iterator[Document]:
+        """Yields chunks for consecutive (page, text) pairs of one document."""
+        outline: Dict[int, Tuple[str, str, str, str]] = {}  # level -> (kind, number, heading line, label)
+        for page, text in pages:
+            chunk_id = 0
+            for body, metadata in self._chunks(self._sections(text, outline)):
+                yield Document(
+                    page_content=body,
+                    metadata={'source': source, 'page': page, 'chunk_id': chunk_id, **metadata}
+                )
+                chunk_id += 1
+    
+    def _sections(self, text: str, outline: Dict[int, Tuple[str, str, str, str]]) -> Iterator[Tuple[str, Dict]]:
+        """
+        Splits one page at headings into (text, outline) pairs. `outline` is
+        updated in place so the next page continues it; headings with no text
+        of their own (a Part title directly followed by its first section)
+        stay with the text that follows.
+        """
+        lines: List[str] = []
+        has_body = False
+        # The top of a page may continue a sentence from the previous page, so it does not count as a break
+        after_blank_line = False
+        for line in text.splitlines():
+            current_section = outline[3][1] if 3 in outline else None
+            heading = match_heading(line, after_blank_line=after_blank_line, current_section=current_section)
+            after_blank_line = not line.strip()
+            if heading is not None:
+                if has_body:
+                    yield "\n".join(lines).strip(), dict(outline)
+                    lines, has_body = [], False
+                level, kind, number, label = heading
+                for deeper in [key for key in outline if key >= level]:
+                    del outline[deeper]
+                outline[level] = (kind, number, line.strip(), label)
+            elif line.strip():
+                has_body = True
+            lines.append(line)
+        body = "\n".join(lines).strip()
+        if body:
+            yield body, dict(outline)
+    
+    def _chunks(self, sections: Iterable[Tuple[str, Dict]]) -> Iterator[Tuple[str, Dict[str, str]]]:
+        pending: List[Tuple[str, Dict]] = []
+        size = 0
+        for body, outline in sections:
+            parent = {level: entry for level, entry in outline.items() if level < 3}
+            fits = size + len(body) + 2 <= self.chunk_size
+            if pending and (not fits or parent != {level: entry for level, entry in pending[0][1].items() if level < 3}):
+                yield "\n\n".join(text for text, _ in pending), self._metadata([item for _, item in pending])
+                pending, size = [], 0
+            if len(body) > self.chunk_size:
+                for piece in self.fallback_splitter.split_text(body):
+                    yield piece, self._metadata([outline])
+                continue
+            pending.append((body, outline))
+            size += len(body) + 2
+        if pending:
+            yield "\n\n".join(text for text, _ in pending), self._metadata([item for _, item in pending])
+    
+    @staticmethod
+    def _metadata(outlines: List[Dict]) -> Dict[str, str]:
+        """Metadata for a chunk covering the sections in `outlines`, e.g. section "5-7" for three packed sections."""
+        first, last = outlines[0], outlines[-1]
+        if not first:
+            return {}
+        levels = sorted(first)
+        metadata = {
+            'heading': first[levels[-1]][2],
+            'hierarchy': " > ".join(first[level][3] for level in levels),
+        }
+        if 3 in first:
+            metadata['section'] = first[3][1]
+            if 3 in last and last[3][1] != first[3][1]:
+                metadata['section'] += f"-{last[3][1]}"
+                metadata['hierarchy'] += f" to {last[3][3]}"
+        return metadata
+
+def count_pages(data: bytes) -> int:
+    return len(PdfReader(io.BytesIO(data)).pages)
+
+def extract_pages(data: bytes, start: int = 0, stop: Optional[int] = None) -> List[Tuple[int, str]]:
+    """Extracts (page, text) pairs for pages [start, stop) of in-memory PDF bytes. Safe to run in a worker process."""
+    reader = PdfReader(io.BytesIO(data))
+    pages = reader.pages[start:stop]
+    return [(start + i, page.extract_text() or "") for i, page in enumerate(pages)]
+
+# The PDF a pool worker of `iter_pdf_pages` extracts from; set once per worker process
+_worker_reader: Optional[PdfReader] = None
+
+def _init_pdf_worker(data: bytes):
+    global _worker_reader
+    _worker_reader = PdfReader(io.BytesIO(data))
+
+def _extract_worker_pages(start: int, stop: int) -> List[Tuple[int, str]]:
+    return [(start + i, page.extract_text() or "") for i, page in enumerate(_worker_reader.pages[start:stop])]
+
+def iter_pdf_pages(data: bytes, workers: int = 1, pages_per_task: int = 16) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (page, text) pairs from PDF bytes in page order, without touching disk.
+
+    With `workers` > 1, ranges of `pages_per_task` pages are extracted in a
+    process pool. The PDF is sent to each worker once, when it starts, and
+    tasks carry only their page range. At most two ranges per worker are in
+    flight, so memory stays bounded however long the document is.
+    """
+    if workers <= 1:
+        reader = PdfReader(io.BytesIO(data))
+        for i, page in enumerate(reader.pages):
+            yield i, page.extract_text() or ""
+        return
+
+    starts = iter(range(0, count_pages(data), pages_per_task))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_pdf_worker, initargs=(data,)) as pool:
+        in_flight = deque()
+        for start in starts:
+            in_flight.append(pool.submit(_extract_worker_pages, start, start + pages_per_task))
+            if len(in_flight) >= 2 * workers:
+                break
+        while in_flight:
+            pages = in_flight.popleft().result()
+            start = next(starts, None)
+            if start is not None:
+                in_flight.append(pool.submit(_extract_worker_pages, start, start + pages_per_task))
+            yield from pages
+
+class LegalDocumentProcessor:
+    def __init__(self, chunk_size: int = 1500, chunk_overlap: int = 300, strategy: str = settings.CHUNKING_STRATEGY):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.strategy = strategy
+        self.legal_splitter = LegalStructureSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
         self.text_splitter = CharacterTextSplitter(
             separator="\n\n",
             chunk_size=chunk_size,
@@ -27,33 +238,37 @@ class LegalDocumentProcessor:
         """Process documents with legal structure awareness"""
         processed_docs = []
         
+        by_source: Dict[str, List[Tuple[int, str]]] = {}
         for doc in documents:
-            # Split the document
-            chunks = self.text_splitter.split_documents([doc])
-            
-            # Add enhanced metadata to each chunk
-            for i, chunk in enumerate(chunks):
-                metadata = {
-                    'source': doc.metadata['source'][5:], # remove temp_ prefix
-                    'page': int(doc.metadata.get('page', 0)),
-                    'chunk_id': i
-                }
-                processed_docs.append(Document(page_content=chunk.page_content, metadata=metadata))
+            source = os.path.basename(doc.metadata['source'])
+            by_source.setdefault(source, []).append((int(doc.metadata.get('page', 0)), doc.page_content))
+        for source, pages in by_source.items():
+            processed_docs.extend(self.split_pages(pages, source=source))
         
         return processed_docs
     
-    def process_uploaded_file(self, uploaded_file) -> List[Document]:
+    def split_pages(self, pages: Iterable[Tuple[int, str]], source: str) -> Iterator[Document]:
+        """Chunks consecutive (page, text) pairs of one document with the configured strategy"""
+        if self.strategy == "legal":
+            yield from self.legal_splitter.split_pages(pages, source=source)
+            return
+        for page, text in pages:
+            yield from self.split_page(text, source=source, page=page)
+    
+    def split_page(self, text: str, source: str, page: int) -> List[Document]:
+        """Split the text of a single page into chunks with source/page/chunk_id metadata"""
+        if self.strategy == "legal":
+            return list(self.legal_splitter.split_pages([(page, text)], source=source))
+        chunks = self.text_splitter.split_text(text)
+        return [
+            Document(page_content=chunk, metadata={'source': source, 'page': page, 'chunk_id': i})
+            for i, chunk in enumerate(chunks)
+        ]
+    
+    def iter_chunks(self, data: bytes, source: str, workers: int = 1) -> Iterator[Document]:
+        """Yields chunks of in-memory PDF bytes page by page; see `iter_pdf_pages` for `workers`."""
+        yield from self.split_pages(iter_pdf_pages(data, workers=workers), source=source)
+    
+    def process_uploaded_file(self, uploaded_file, workers: int = 1) -> List[Document]:
         """Process uploaded Streamlit file"""
-        # Save uploaded file temporarily
-        with open(f"temp_{uploaded_file.name}", "wb") as f:
-            f.write(uploaded_file.getvalue())
-        
-        # Load and process
-        documents = self.load_pdf(f"temp_{uploaded_file.name}")
-        processed_docs = self.process_documents(documents)
-        
-        # Clean up temp file
-        import os
-        os.remove(f"temp_{uploaded_file.name}")
-        
-        return processed_docs
\ No newline at end of file
+        return list(self.iter_chunks(uploaded_file.getvalue(), uploaded_file.name, workers=workers))
@@ -0,0 +1,256 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class TurnEmbeddings:
+    """
+    Query vectors computed during one conversational turn, in memory.
+
+    The user's question can reach the retrieval tool, the rewrite loop and
+    the related-question lookup, possibly from different threads; each
+    distinct text is embedded at most once per turn.
+    """
+
+    def __init__(self):
+        self.vectors: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, text: str, compute: Callable[[str], List[float]]) -> List[float]:
+        # Only the lookup is locked; a concurrent lookup of the same text waits on its future,
+        # while different texts are embedded in parallel
+        with self._lock:
+            future = self.vectors.get(text)
+            is_owner = future is None
+            if is_owner:
+                future = self.vectors[text] = Future()
+        if not is_owner:
+            return future.result()
+        try:
+            future.set_result(compute(text))
+        except BaseException as e:
+            # Not memoized, so a later lookup in the turn can try again
+            with self._lock:
+                del self.vectors[text]
+            future.set_exception(e)
+            raise
+        return future.result()
+
+    async def aget_or_compute(self, text: str, compute: Callable[[str], Awaitable[List[float]]]) -> List[float]:
+        with self._lock:
+            future = self.vectors.get(text)
+            is_owner = future is None
+            if is_owner:
+                future = self.vectors[text] = Future()
+        if not is_owner:
+            return await asyncio.wrap_future(future)
+        try:
+            future.set_result(await compute(text))
+        except BaseException as e:
+            with self._lock:
+                del self.vectors[text]
+            future.set_exception(e)
+            raise
+        return future.result()
+
+
+_turn_embeddings: ContextVar[Optional[TurnEmbeddings]] = ContextVar("turn_embeddings", default=None)
+
+
+@contextmanager
+def embedding_turn() -> Iterator[TurnEmbeddings]:
+    """Shares query vectors across everything that runs in this context, including copied contexts."""
+    token = _turn_embeddings.set(TurnEmbeddings())
+    try:
+        yield _turn_embeddings.get()
+    finally:
+        _turn_embeddings.reset(token)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Content-addressed, on-disk cache in front of an embeddings client.
+
+    Vectors are stored as float32 blobs in SQLite, keyed by a hash of
+    (model, text). The least recently used entries are evicted once the
+    cache grows past `max_entries`. Concurrent misses for the same query
+    text share one request to the underlying client.
+    """
+
+    def __init__(self, underlying: Embeddings, model: str, db_path: str, max_entries: int = 20000):
+        self.underlying = underlying
+        self.model = model
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._query_flight = SingleFlight("embed_query")
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)')
+            self._conn.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})', batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    'UPDATE embeddings SET last_used = ? WHERE key = ?',
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+        return found
+
+    def _put_many(self, items: Dict[str, List[float]]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)',
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                'DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)',
+                (overflow,)
+            )
+            logger.info(f"Evicted {overflow} entries from the embedding cache.")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        cached = self._get_many(keys)
+
+        # Embed each distinct missing text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._put_many(computed)
+            cached.update(computed)
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        turn = _turn_embeddings.get()
+        if turn is not None:
+            return turn.get_or_compute(text, self._embed_query)
+        return self._embed_query(text)
+
+    def _embed_query(self, text: str) -> List[float]:
+        return self._query_flight.do(text, lambda: self._lookup_or_embed_query(text))
+
+    def _lookup_or_embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        cached = self._get_many([key])
+        if key in cached:
+            with self._lock:
+                self.hits += 1
+            return cached[key]
+
+        with self._lock:
+            self.misses += 1
+        vector = self.underlying.embed_query(text)
+        self._put_many({key: vector})
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        cached = await asyncio.to_thread(self._get_many, keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            vectors = await self.underlying.aembed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            await asyncio.to_thread(self._put_many, computed)
+            cached.update(computed)
+
+        return [cached[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        turn = _turn_embeddings.get()
+        if turn is None:
+            return await self._aembed_query(text)
+        return await turn.aget_or_compute(text, self._aembed_query)
+
+    async def _aembed_query(self, text: str) -> List[float]:
+        return await self._query_flight.ado(text, lambda: self._alookup_or_embed_query(text))
+
+    async def _alookup_or_embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        cached = await asyncio.to_thread(self._get_many, [key])
+        if key in cached:
+            with self._lock:
+                self.hits += 1
+            return cached[key]
+
+        with self._lock:
+            self.misses += 1
+        vector = await self.underlying.aembed_query(text)
+        await asyncio.to_thread(self._put_many, {key: vector})
+        return vector
+
+    def stats(self) -> Dict[str, int]:
+        """Returns hit/miss counters for this process."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
@@ -1,11 +1,15 @@
-from typing import List, Dict
-from langchain_openai import ChatOpenAI
+import logging
+from typing import List, Dict, Optional
+from langchain_core.embeddings import Embeddings
 from langchain_core.messages import HumanMessage, SystemMessage
 from pydantic import BaseModel, Field
 from config.settings import settings
 from config.database import FAQDatabase
 
-from .prompts import FAQ_PROMPT
+from . import clients
+from .prompts import FAQ_PROMPT, FAQ_BATCH_PROMPT
+
+logger = logging.getLogger(__name__)
 
 class FAQ(BaseModel):
     question: str = Field(description="The FAQ question")
@@ -15,15 +19,37 @@ class FAQ(BaseModel):
 class FAQList(BaseModel):
     faqs: List[FAQ] = Field(description="List of generated FAQs")
 
+class ConversationFAQs(BaseModel):
+    conversation_id: int = Field(description="The id of the <Conversation> the FAQs were generated from")
+    faqs: List[FAQ] = Field(description="FAQs generated from this conversation only")
+
+class FAQBatch(BaseModel):
+    conversations: List[ConversationFAQs] = Field(description="One entry per input conversation")
+
 class FAQGenerator:
-    def __init__(self):
-        self.llm = ChatOpenAI(
-            model=settings.PRIMARY_MODEL,
-            openai_api_key=settings.OPENAI_API_KEY,
-            temperature=0.3
-        ).with_structured_output(FAQList)
+    def __init__(self, embeddings: Optional[Embeddings] = None):
+        """With `embeddings`, paraphrases of stored questions are merged into them instead of inserted."""
+        self.embeddings = embeddings
+        model = clients.create_chat_model(settings.PRIMARY_MODEL, temperature=0.3, priority="background")
+        self.llm = model.with_structured_output(FAQList)
+        self.batch_llm = model.with_structured_output(FAQBatch)
         self.db = FAQDatabase(settings.DATABASE_PATH)
 
+    def store_faqs(self, faq_dicts: List[Dict[str, str]]):
+        """Upserts FAQs; a question matching a stored one bumps its frequency."""
+        if not faq_dicts:
+            return
+        if self.embeddings is None:
+            self.db.insert_faqs(faq_dicts)
+            return
+        vectors = self.embeddings.embed_documents([faq["question"] for faq in faq_dicts])
+        self.db.insert_faqs(
+            faq_dicts,
+            embeddings=vectors,
+            similarity_threshold=settings.DEDUP_SIMILARITY_THRESHOLD,
+            candidates=settings.FAQ_DEDUP_CANDIDATES
+        )
+
     def generate_and_store_faqs(self, conversation_history: List[Dict[str, str]]):
         """Generates FAQs from conversation and stores them directly in the database."""
         if not conversation_history or len(conversation_history) < 2:
@@ -39,10 +65,39 @@ class FAQGenerator:
             
             if result and result.faqs:
                 faq_dicts = [{"question": f.question, "answer": f.answer, "category": f.category} for f in result.faqs]
-                self.db.insert_faqs(faq_dicts)
-                print(f"Successfully generated and stored {len(faq_dicts)} FAQs.")
+                self.store_faqs(faq_dicts)
+                logger.info(f"Successfully generated and stored {len(faq_dicts)} FAQs.")
         except Exception as e:
-            print(f"Error generating or storing FAQs: {e}")
+            logger.error(f"Error generating or storing FAQs: {e}")
+            # Re-raised so the job queue can retry the conversation
+            raise
+
+    def generate_faqs_batch(self, conversations: List[List[Dict[str, str]]]) -> List[List[Dict[str, str]]]:
+        """
+        Generates FAQs for many conversations with a single LLM call, without storing them.
+        Returns one FAQ list per input conversation, in order, so each can be stored on its own
+        and a question asked in N conversations counts N times, as in the unbatched path.
+        """
+        faq_lists: List[List[Dict[str, str]]] = [[] for _ in conversations]
+        pending = [i for i, conversation in enumerate(conversations) if conversation and len(conversation) >= 2]
+        if not pending:
+            return faq_lists
+
+        formatted_conversations = "\n\n".join(
+            f'<Conversation id="{n}">\n{self._format_conversation(conversations[i])}\n</Conversation>'
+            for n, i in enumerate(pending, start=1)
+        )
+        result = self.batch_llm.invoke([
+            SystemMessage(content=FAQ_PROMPT + FAQ_BATCH_PROMPT),
+            HumanMessage(content=formatted_conversations)
+        ])
+        for entry in (result.conversations if result else []):
+            if 1 <= entry.conversation_id <= len(pending):
+                faq_lists[pending[entry.conversation_id - 1]].extend(
+                    {"question": f.question, "answer": f.answer, "category": f.category} for f in entry.faqs
+                )
+        logger.info(f"Generated {sum(len(faqs) for faqs in faq_lists)} FAQs from {len(pending)} conversations.")
+        return faq_lists
 
     def _format_conversation(self, conversation: List[Dict[str, str]]) -> str:
         formatted = []
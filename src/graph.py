@@ -1,7 +1,19 @@
+import logging
+from typing import AsyncIterator, List, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, MessagesState, END
 
 # Import the node functions directly
-from .nodes import assistant_node, rag_node
+from .nodes import assistant_node, rag_node, aassistant_node, arag_node
+from . import clients
+from .answer_cache import AnswerCache, first_turn_question, stream_cached
+from .tracing import trace_turn
+from .embedding_cache import embedding_turn
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
 
 # 1. Define the State for our graph
 class AgentState(MessagesState):
@@ -20,9 +32,10 @@ def should_continue(state: AgentState) -> str:
 def create_legal_assistant_graph():
     workflow = StateGraph(AgentState)
 
-    # Add the nodes directly
-    workflow.add_node("assistant", assistant_node)
-    workflow.add_node("rag_loop", rag_node)
+    # Each node carries a sync and an async implementation, so the same graph
+    # serves both `stream` (Streamlit) and `astream` (event-loop servers)
+    workflow.add_node("assistant", RunnableLambda(assistant_node, afunc=aassistant_node))
+    workflow.add_node("rag_loop", RunnableLambda(rag_node, afunc=arag_node))
 
     workflow.set_entry_point("assistant")
     
@@ -39,4 +52,57 @@ def create_legal_assistant_graph():
     return workflow.compile()
 
 # Instantiate the graph for use in the Streamlit app
-legal_assistant = create_legal_assistant_graph()
\ No newline at end of file
+legal_assistant = create_legal_assistant_graph()
+
+answer_cache = AnswerCache(settings.ANSWER_CACHE_PATH, ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS)
+
+
+def cached_answer(messages: List[BaseMessage], is_professional: bool) -> Optional[str]:
+    """Returns a cached answer when `messages` is an opening question already answered for this persona."""
+    question = first_turn_question(messages)
+    if not settings.ANSWER_CACHE_ENABLED or question is None:
+        return None
+    return answer_cache.get(is_professional, question, clients.get_vector_store_manager().get_kb_version())
+
+
+def remember_answer(messages: List[BaseMessage], is_professional: bool, answer: str, kb_version: str):
+    """Caches the answer to an opening question, under the knowledge base version it was generated from."""
+    question = first_turn_question(messages)
+    if settings.ANSWER_CACHE_ENABLED and question is not None:
+        answer_cache.put(is_professional, question, kb_version, answer)
+
+
+def warm_answer_cache(questions: List[str]) -> int:
+    """Answers `questions` for both personas unless cached for the current knowledge base. Returns the number answered."""
+    answered = 0
+    for question in questions:
+        for is_professional in (True, False):
+            kb_version = clients.get_vector_store_manager().get_kb_version()
+            if answer_cache.contains(is_professional, question, kb_version):
+                continue
+            messages = [HumanMessage(content=question)]
+            with trace_turn(persona="answer_cache_warmup"), embedding_turn():
+                result = legal_assistant.invoke({"messages": messages, "is_professional": is_professional})
+            remember_answer(messages, is_professional, str(result["messages"][-1].content), kb_version)
+            answered += 1
+    logger.info(f"Warmed the answer cache with {answered} answers for {len(questions)} questions.")
+    return answered
+
+
+async def astream_answer(messages: List[BaseMessage], is_professional: bool) -> AsyncIterator[str]:
+    """Streams the assistant's answer tokens without blocking the event loop."""
+    cached = cached_answer(messages, is_professional)
+    if cached is not None:
+        for chunk in stream_cached(cached):
+            yield chunk
+        return
+
+    kb_version = clients.get_vector_store_manager().get_kb_version()
+    graph_input = {"messages": messages, "is_professional": is_professional}
+    chunks = []
+    with embedding_turn():
+        async for chunk, metadata in legal_assistant.astream(graph_input, stream_mode="messages"):
+            if metadata.get("langgraph_node") == "assistant" and chunk.content:
+                chunks.append(chunk.content)
+                yield chunk.content
+    remember_answer(messages, is_professional, "".join(chunks), kb_version)
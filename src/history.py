@@ -0,0 +1,209 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from .prompts import HISTORY_SUMMARY_PROMPT
+
+logger = logging.getLogger(__name__)
+
+_DOCUMENT_TAG_RE = re.compile(r'<Document source="([^"]*)" page="([^"]*)"')
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """Rough token count (about 4 characters per token plus per-message overhead), good enough for budgeting."""
+    total = 0
+    for message in messages:
+        total += 4 + len(str(message.content)) // 4
+        if isinstance(message, AIMessage) and message.tool_calls:
+            total += len(json.dumps([call["args"] for call in message.tool_calls])) // 4
+    return total
+
+
+def _citations(message: ToolMessage) -> List[str]:
+    """Source and page of every chunk in a retrieval result, in order of first appearance."""
+    if message.artifact:
+        pairs = [(doc.metadata.get("source"), doc.metadata.get("page")) for doc, _ in message.artifact]
+    else:
+        pairs = _DOCUMENT_TAG_RE.findall(str(message.content))
+    return list(dict.fromkeys(f"{source}, page {page}" for source, page in pairs))
+
+
+def collapse_tool_message(message: ToolMessage) -> ToolMessage:
+    """Replaces retrieved chunk text with a list of citations, keeping the tool call pairing intact."""
+    citations = _citations(message)
+    content = "Previously retrieved (full text omitted): " + ("; ".join(citations) if citations else "no documents")
+    return ToolMessage(content=content, tool_call_id=message.tool_call_id, name=message.name)
+
+
+def _split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """Groups messages into turns, each starting at a user message."""
+    turns: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _transcript(turns: List[List[BaseMessage]]) -> str:
+    lines = []
+    for turn in turns:
+        for message in turn:
+            if isinstance(message, HumanMessage):
+                lines.append(f"User: {message.content}")
+            elif isinstance(message, AIMessage) and message.content:
+                lines.append(f"Assistant: {message.content}")
+            elif isinstance(message, ToolMessage):
+                lines.append(f"(Assistant consulted: {'; '.join(_citations(message)) or 'no documents'})")
+    return "\n\n".join(lines)
+
+
+@dataclass
+class HistoryStats:
+    original_tokens: int
+    sent_tokens: int
+    summarized_turns: int
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.sent_tokens
+
+
+class HistoryManager:
+    """
+    Fits conversation history into a token budget before it is sent to the assistant model.
+
+    The current turn is always kept verbatim. Retrieval results of earlier
+    turns are collapsed to citations. If the history is still over budget,
+    all but the last `keep_recent_turns` turns are folded into a rolling
+    summary, and further turns after them, oldest first, until the summary
+    and the remaining turns fit. The fold boundary normally advances
+    `keep_recent_turns` turns at a time and summaries are cached by a hash
+    of the folded prefix, so a long conversation needs one incremental
+    summary call every few turns rather than one per model call. Only a
+    current turn that is over budget on its own is sent over budget.
+    """
+
+    def __init__(self, model, budget_tokens: int = 6000, keep_recent_turns: int = 4, cache_size: int = 256):
+        self.model = model
+        self.budget_tokens = budget_tokens
+        self.keep_recent_turns = max(1, keep_recent_turns)
+        self.cache_size = cache_size
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _plan(self, messages: List[BaseMessage]) -> Tuple[List[List[BaseMessage]], List[str], int]:
+        """Returns (turns, cumulative prefix hashes, number of leading turns to fold into the summary)."""
+        turns = _split_turns(messages)
+        # Collapse tool results of every turn except the one being answered
+        turns = [
+            [collapse_tool_message(m) if isinstance(m, ToolMessage) else m for m in turn]
+            for turn in turns[:-1]
+        ] + turns[-1:]
+
+        hashes, digest = [], hashlib.sha256()
+        for turn in turns:
+            for message in turn:
+                digest.update(f"{message.type}\x00{message.content}\x00".encode("utf-8"))
+            hashes.append(digest.copy().hexdigest())
+
+        if estimate_tokens([m for turn in turns for m in turn]) <= self.budget_tokens:
+            return turns, hashes, 0
+        step = self.keep_recent_turns
+        fold = max(0, (len(turns) - step) // step * step)
+        # A few long turns (pasted statutes, large answers) can be over budget on their own
+        while fold < len(turns) - 1 and not self._fits(None, turns[fold:]):
+            fold += 1
+        return turns, hashes, fold
+
+    def _messages(self, summary: Optional[str], kept: List[List[BaseMessage]]) -> List[BaseMessage]:
+        prepared = [m for turn in kept for m in turn]
+        if summary:
+            prepared = [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")] + prepared
+        return prepared
+
+    def _fits(self, summary: Optional[str], kept: List[List[BaseMessage]]) -> bool:
+        return estimate_tokens(self._messages(summary, kept)) <= self.budget_tokens
+
+    def _cached(self, key: str) -> Optional[str]:
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is not None:
+                self._summaries.move_to_end(key)
+            return summary
+
+    def _store(self, key: str, summary: str):
+        with self._lock:
+            self._summaries[key] = summary
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+
+    def _summary_request(self, previous: Optional[str], turns: List[List[BaseMessage]]) -> List[BaseMessage]:
+        content = f"<NewTurns>\n{_transcript(turns)}\n</NewTurns>"
+        if previous:
+            content = f"<PreviousSummary>\n{previous}\n</PreviousSummary>\n\n" + content
+        return [SystemMessage(content=HISTORY_SUMMARY_PROMPT), HumanMessage(content=content)]
+
+    def _resume_point(self, hashes: List[str], fold: int) -> Tuple[int, Optional[str]]:
+        """Longest already summarized prefix of the folded turns."""
+        for end in range(fold, 0, -1):
+            summary = self._cached(hashes[end - 1])
+            if summary is not None:
+                return end, summary
+        return 0, None
+
+    def _assemble(self, summary: Optional[str], kept: List[List[BaseMessage]], original: List[BaseMessage],
+                  folded: int) -> Tuple[List[BaseMessage], HistoryStats]:
+        prepared = self._messages(summary, kept)
+        stats = HistoryStats(estimate_tokens(original), estimate_tokens(prepared), folded)
+        if stats.saved_tokens:
+            logger.info(
+                f"History trimmed from ~{stats.original_tokens} to ~{stats.sent_tokens} tokens "
+                f"({stats.saved_tokens} saved, {folded} turns summarized)."
+            )
+        return prepared, stats
+
+    def _summarize(self, turns: List[List[BaseMessage]], hashes: List[str], fold: int) -> Optional[str]:
+        if not fold:
+            return None
+        start, summary = self._resume_point(hashes, fold)
+        if start < fold:
+            response = self.model.invoke(self._summary_request(summary, turns[start:fold]))
+            summary = str(response.content)
+            self._store(hashes[fold - 1], summary)
+        return summary
+
+    async def _asummarize(self, turns: List[List[BaseMessage]], hashes: List[str], fold: int) -> Optional[str]:
+        if not fold:
+            return None
+        start, summary = self._resume_point(hashes, fold)
+        if start < fold:
+            response = await self.model.ainvoke(self._summary_request(summary, turns[start:fold]))
+            summary = str(response.content)
+            self._store(hashes[fold - 1], summary)
+        return summary
+
+    def prepare(self, messages: List[BaseMessage]) -> Tuple[List[BaseMessage], HistoryStats]:
+        turns, hashes, fold = self._plan(messages)
+        summary = self._summarize(turns, hashes, fold)
+        # The summary itself can push the kept turns back over budget
+        while fold and fold < len(turns) - 1 and not self._fits(summary, turns[fold:]):
+            fold += 1
+            summary = self._summarize(turns, hashes, fold)
+        return self._assemble(summary, turns[fold:], messages, fold)
+
+    async def aprepare(self, messages: List[BaseMessage]) -> Tuple[List[BaseMessage], HistoryStats]:
+        """Async variant of `prepare`."""
+        turns, hashes, fold = self._plan(messages)
+        summary = await self._asummarize(turns, hashes, fold)
+        while fold and fold < len(turns) - 1 and not self._fits(summary, turns[fold:]):
+            fold += 1
+            summary = await self._asummarize(turns, hashes, fold)
+        return self._assemble(summary, turns[fold:], messages, fold)
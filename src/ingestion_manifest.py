@@ -0,0 +1,106 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from langchain_core.documents import Document
+
+
+def chunk_vector_id(metadata: Dict) -> str:
+    """Deterministic vector ID derived from a chunk's source, page and chunk_id."""
+    source_hash = hashlib.sha1(metadata['source'].encode("utf-8")).hexdigest()[:16]
+    return f"{source_hash}#p{metadata['page']}#c{metadata['chunk_id']}"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class IngestionPlan:
+    """The difference between freshly chunked documents and what is already indexed."""
+    to_upsert: List[Document] = field(default_factory=list)
+    to_delete: List[str] = field(default_factory=list)
+    unchanged: int = 0
+
+
+class IngestionManifest:
+    """Persists the vector ID and content hash of every indexed chunk, per source."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS chunks (
+                    vector_id TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    content_hash TEXT NOT NULL
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks (source)')
+            self._conn.commit()
+
+    def plan(self, documents: List[Document]) -> IngestionPlan:
+        """
+        Diffs chunks against the manifest. `documents` must hold every chunk of
+        each source it mentions, so that chunks missing from it can be deleted.
+        """
+        by_source = defaultdict(list)
+        for doc in documents:
+            by_source[doc.metadata['source']].append(doc)
+
+        plan = IngestionPlan()
+        with self._lock:
+            for source, docs in by_source.items():
+                indexed = dict(self._conn.execute(
+                    'SELECT vector_id, content_hash FROM chunks WHERE source = ?', (source,)
+                ).fetchall())
+                seen = set()
+                for doc in docs:
+                    vector_id = chunk_vector_id(doc.metadata)
+                    seen.add(vector_id)
+                    if indexed.get(vector_id) == content_hash(doc.page_content):
+                        plan.unchanged += 1
+                    else:
+                        plan.to_upsert.append(doc)
+                plan.to_delete.extend(vector_id for vector_id in indexed if vector_id not in seen)
+        return plan
+
+    def has_source(self, source: str) -> bool:
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM chunks WHERE source = ? LIMIT 1', (source,)).fetchone() is not None
+
+    def adopt(self, source: str, vector_ids: List[str]):
+        """
+        Records vectors indexed without a manifest entry (e.g. under random IDs, before this manifest existed).
+        With an empty content hash they never count as unchanged, so the next plan deletes or overwrites them.
+        """
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunks (vector_id, source, content_hash) VALUES (?, ?, '')",
+                [(vector_id, source) for vector_id in vector_ids]
+            )
+            self._conn.commit()
+
+    def record(self, documents: List[Document]):
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO chunks (vector_id, source, content_hash) VALUES (?, ?, ?)',
+                [(chunk_vector_id(doc.metadata), doc.metadata['source'], content_hash(doc.page_content)) for doc in documents]
+            )
+            self._conn.commit()
+
+    def remove(self, vector_ids: List[str]):
+        with self._lock:
+            self._conn.executemany('DELETE FROM chunks WHERE vector_id = ?', [(vector_id,) for vector_id in vector_ids])
+            self._conn.commit()
@@ -0,0 +1,248 @@
+import logging
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from config.settings import settings
+from src.document_processor import LegalDocumentProcessor, extract_pages
+from src.vector_store import VectorStoreManager
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# How often a stage blocked on a queue or on parsing re-checks for cancellation
+_POLL_SECONDS = 0.1
+
+
+def _put(q: "queue.Queue", item, cancel: threading.Event) -> bool:
+    """Puts `item` on a bounded queue, giving up (returning False) once `cancel` is set."""
+    while not cancel.is_set():
+        try:
+            q.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: "queue.Queue", cancel: threading.Event):
+    """Takes the next item from a queue, or `_STOP` once `cancel` is set."""
+    while not cancel.is_set():
+        try:
+            return q.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            continue
+    return _STOP
+
+
+def _drain(q: "queue.Queue"):
+    while True:
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            return
+
+
+@dataclass
+class IngestionProgress:
+    """A progress event emitted by the pipeline for a single file."""
+    file_name: str
+    stage: str  # "parsed", "stored" or "failed"
+    chunks_total: int = 0
+    chunks_unchanged: int = 0
+    chunks_stored: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class _FileBatches:
+    """One file's batches on their way through the pipeline; updated by the upsert stage only."""
+    file_name: str
+    to_delete: List[str]
+    remaining: int
+    failed: bool = False
+
+
+class IngestionPipeline:
+    """
+    Staged ingestion: PDF parsing in a process pool, chunking, batched
+    embedding with bounded concurrency and batched upserts.
+
+    Batches flow between stages through bounded queues, so a slow stage
+    applies backpressure to the ones before it instead of letting chunks
+    pile up in memory.
+
+    Unlike `LegalDocumentProcessor.iter_chunks`, each file is parsed
+    whole by one worker and its chunks are held in memory until they are
+    queued: the manifest diff needs a source's complete chunk list to tell
+    which stored chunks are stale. Peak memory therefore grows with the
+    largest file, times `parse_workers`.
+    """
+
+    def __init__(
+        self,
+        doc_processor: LegalDocumentProcessor,
+        vector_store_manager: VectorStoreManager,
+        parse_workers: int = settings.INGEST_PARSE_WORKERS,
+        embed_concurrency: int = settings.INGEST_EMBED_CONCURRENCY,
+        batch_size: int = settings.INGEST_BATCH_SIZE,
+        queue_size: int = settings.INGEST_QUEUE_SIZE,
+    ):
+        self.doc_processor = doc_processor
+        self.vector_store_manager = vector_store_manager
+        self.parse_workers = parse_workers
+        self.embed_concurrency = embed_concurrency
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+
+    def run(self, files: List[Tuple[str, bytes]]) -> Iterator[IngestionProgress]:
+        """
+        Ingests (file name, PDF bytes) pairs, yielding progress events as they happen.
+        If the caller stops iterating early (or raises), every stage is cancelled and joined.
+        """
+        events: "queue.Queue" = queue.Queue()
+        embed_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        upsert_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        cancel = threading.Event()
+        # Set once any chunk is deleted or stored
+        changed = threading.Event()
+
+        threads = [threading.Thread(target=self._parse_and_chunk, args=(files, embed_queue, events, cancel, changed), daemon=True)]
+        threads += [
+            threading.Thread(target=self._embed, args=(embed_queue, upsert_queue, events, cancel), daemon=True)
+            for _ in range(self.embed_concurrency)
+        ]
+        threads.append(threading.Thread(target=self._upsert, args=(upsert_queue, events, cancel, changed), daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                event = events.get()
+                if event is _STOP:
+                    break
+                yield event
+        finally:
+            # A no-op after a complete run; otherwise unblocks stages waiting on full queues
+            cancel.set()
+            for q in (embed_queue, upsert_queue):
+                _drain(q)
+            for thread in threads:
+                thread.join()
+            # Cached retrievals are invalidated once per run rather than once per batch
+            if changed.is_set():
+                self.vector_store_manager.bump_kb_version()
+
+    def _parse_and_chunk(self, files: List[Tuple[str, bytes]], embed_queue: "queue.Queue",
+                         events: "queue.Queue", cancel: threading.Event, changed: threading.Event):
+        pending_files = list(files)
+        pool = ProcessPoolExecutor(max_workers=self.parse_workers)
+        try:
+            in_flight = {}
+            while (pending_files or in_flight) and not cancel.is_set():
+                # Keep only a bounded number of parsed files waiting to be chunked
+                while pending_files and len(in_flight) < self.parse_workers:
+                    file_name, data = pending_files.pop(0)
+                    in_flight[pool.submit(extract_pages, data)] = file_name
+
+                done, _ = wait(in_flight, timeout=_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_name = in_flight.pop(future)
+                    try:
+                        self._chunk(file_name, future.result(), embed_queue, events, cancel, changed)
+                    except Exception as e:
+                        logger.error(f"Failed to process {file_name}: {e}")
+                        events.put(IngestionProgress(file_name, "failed", error=str(e)))
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            for _ in range(self.embed_concurrency):
+                _put(embed_queue, _STOP, cancel)
+
+    def _chunk(self, file_name: str, pages: List[Tuple[int, str]], embed_queue: "queue.Queue",
+               events: "queue.Queue", cancel: threading.Event, changed: threading.Event):
+        chunks: List[Document] = list(self.doc_processor.split_pages(pages, source=file_name))
+
+        # Only changed chunks go downstream
+        plan = self.vector_store_manager.plan_ingestion(chunks)
+        events.put(IngestionProgress(
+            file_name, "parsed", chunks_total=len(plan.to_upsert), chunks_unchanged=plan.unchanged
+        ))
+        if not plan.to_upsert:
+            self._remove_stale(file_name, plan.to_delete, events, changed)
+            return
+        # Stale chunks are deleted by the upsert stage once the file's new chunks are all stored
+        starts = range(0, len(plan.to_upsert), self.batch_size)
+        file_batches = _FileBatches(file_name, plan.to_delete, remaining=len(starts))
+        for start in starts:
+            # Blocks while downstream stages are saturated
+            if not _put(embed_queue, (file_batches, plan.to_upsert[start:start + self.batch_size]), cancel):
+                return
+
+    def _remove_stale(self, file_name: str, vector_ids: List[str], events: "queue.Queue", changed: threading.Event):
+        if not vector_ids:
+            return
+        try:
+            self.vector_store_manager.remove_chunks(vector_ids)
+            changed.set()
+        except Exception as e:
+            logger.error(f"Failed to delete stale chunks of {file_name}: {e}")
+            events.put(IngestionProgress(file_name, "failed", error=str(e)))
+
+    def _embed(self, embed_queue: "queue.Queue", upsert_queue: "queue.Queue", events: "queue.Queue",
+               cancel: threading.Event):
+        while True:
+            item = _get(embed_queue, cancel)
+            if item is _STOP:
+                _put(upsert_queue, _STOP, cancel)
+                return
+            file_batches, batch = item
+            try:
+                vectors = self.vector_store_manager.embeddings.embed_documents(
+                    [doc.page_content for doc in batch]
+                )
+            except Exception as e:
+                logger.error(f"Failed to embed a batch of {file_batches.file_name}: {e}")
+                events.put(IngestionProgress(file_batches.file_name, "failed", error=str(e)))
+                # Still passed on, so the upsert stage knows the file is incomplete
+                vectors = None
+            if not _put(upsert_queue, (file_batches, batch, vectors), cancel):
+                return
+
+    def _upsert(self, upsert_queue: "queue.Queue", events: "queue.Queue", cancel: threading.Event,
+                changed: threading.Event):
+        remaining_producers = self.embed_concurrency
+        while remaining_producers and not cancel.is_set():
+            item = _get(upsert_queue, cancel)
+            if item is _STOP:
+                remaining_producers -= 1
+                continue
+            file_batches, batch, vectors = item
+            if vectors is None:
+                file_batches.failed = True
+            else:
+                try:
+                    self.vector_store_manager.upsert_chunks(batch, vectors)
+                    changed.set()
+                    events.put(IngestionProgress(file_batches.file_name, "stored", chunks_stored=len(batch)))
+                except Exception as e:
+                    logger.error(f"Failed to upsert a batch of {file_batches.file_name}: {e}")
+                    events.put(IngestionProgress(file_batches.file_name, "failed", error=str(e)))
+                    file_batches.failed = True
+
+            file_batches.remaining -= 1
+            if file_batches.remaining:
+                continue
+            if file_batches.failed:
+                # The old chunks stay searchable; they remain in the manifest, so the next upload retries the delete
+                logger.warning(
+                    f"Keeping {len(file_batches.to_delete)} stale chunks of {file_batches.file_name} "
+                    f"because some of its new chunks were not stored."
+                )
+                continue
+            self._remove_stale(file_batches.file_name, file_batches.to_delete, events, changed)
+        events.put(_STOP)
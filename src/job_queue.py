@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    payload: Dict[str, Any]
+    attempts: int
+    max_attempts: int
+
+
+class JobQueue:
+    """
+    Durable job queue in SQLite, shared between the apps (producers) and the
+    content worker (consumer).
+
+    Delivery is at-least-once: a claimed job is leased for
+    `visibility_timeout` seconds and becomes claimable again if the worker
+    neither completes nor fails it in time, e.g. because it crashed. Failed
+    jobs are retried with exponential backoff until `max_attempts`.
+    """
+
+    def __init__(self, db_path: str, visibility_timeout: float = 300, retry_backoff: float = 30, max_attempts: int = 5):
+        self.db_path = db_path
+        self.visibility_timeout = visibility_timeout
+        self.retry_backoff = retry_backoff
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        # Autocommit mode, so claims can take the write lock up front with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    available_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_available ON jobs (status, available_at)')
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], max_attempts: Optional[int] = None) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT INTO jobs (kind, payload, max_attempts, available_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (kind, json.dumps(payload), max_attempts or self.max_attempts, now, now, now)
+            )
+            return cursor.lastrowid
+
+    def claim(self) -> Optional[Job]:
+        """Leases the oldest runnable job: pending and due, or running with an expired lease."""
+        jobs = self._claim(None, 1)
+        return jobs[0] if jobs else None
+
+    def claim_batch(self, kind: str, limit: int) -> List[Job]:
+        """Leases up to `limit` runnable jobs of one kind, for handlers that process jobs in bulk."""
+        return self._claim(kind, limit)
+
+    def _claim(self, kind: Optional[str], limit: int) -> List[Job]:
+        now = time.time()
+        query = "SELECT id, kind, payload, attempts, max_attempts FROM jobs WHERE status IN ('pending', 'running') AND available_at <= ?"
+        params = [now]
+        if kind is not None:
+            query += " AND kind = ?"
+            params.append(kind)
+        query += " ORDER BY available_at, id LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._conn.execute(query, params).fetchall()
+                # While running, available_at holds the lease expiry
+                self._conn.executemany(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, available_at = ?, updated_at = ? WHERE id = ?",
+                    [(now + self.visibility_timeout, now, row[0]) for row in rows]
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return [
+            Job(job_id, kind, json.loads(payload), attempts + 1, max_attempts)
+            for job_id, kind, payload, attempts, max_attempts in rows
+        ]
+
+    def complete(self, job: Job) -> bool:
+        """Marks the job done, unless its lease expired and another worker has claimed it since."""
+        with self._lock:
+            # attempts identifies the lease: every claim increments it
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'done', last_error = NULL, updated_at = ? "
+                "WHERE id = ? AND status = 'running' AND attempts = ?",
+                (time.time(), job.id, job.attempts)
+            )
+        if not cursor.rowcount:
+            logger.warning(f"Job {job.id} ({job.kind}) was reclaimed after attempt {job.attempts}; not marking it done.")
+        return cursor.rowcount > 0
+
+    def fail(self, job: Job, error: str) -> bool:
+        """
+        Schedules a retry with exponential backoff, or marks the job failed once attempts run out.
+        Like `complete`, does nothing once the lease has passed to another worker.
+        """
+        now = time.time()
+        if job.attempts >= job.max_attempts:
+            status, available_at = 'failed', now
+        else:
+            status, available_at = 'pending', now + self.retry_backoff * 2 ** (job.attempts - 1)
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, available_at = ?, last_error = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'running' AND attempts = ?",
+                (status, available_at, error, now, job.id, job.attempts)
+            )
+        if not cursor.rowcount:
+            logger.warning(f"Job {job.id} ({job.kind}) was reclaimed after attempt {job.attempts}; ignoring its failure: {error}")
+        elif status == 'failed':
+            logger.error(f"Job {job.id} ({job.kind}) failed permanently after {job.attempts} attempts: {error}")
+        else:
+            logger.warning(f"Job {job.id} ({job.kind}) failed on attempt {job.attempts}, retrying: {error}")
+        return cursor.rowcount > 0
+
+    def has_pending(self, kind: str) -> bool:
+        """Whether a job of `kind` is queued or running, so producers of idempotent jobs can skip duplicates."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM jobs WHERE kind = ? AND status IN ('pending', 'running') LIMIT 1", (kind,)
+            ).fetchone() is not None
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def purge(self, older_than_seconds: float = 7 * 24 * 3600) -> int:
+        """Deletes finished jobs last updated more than `older_than_seconds` ago."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status = 'done' AND updated_at < ?",
+                (time.time() - older_than_seconds,)
+            )
+            return cursor.rowcount
@@ -0,0 +1,157 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import List, Optional, Set, Tuple
+
+from langchain_core.documents import Document
+
+# Keeps references such as "23(4)" or "12(1)(a)" together as a single token
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\([a-z0-9]+\))*")
+_SECTION_REFERENCE_RE = re.compile(
+    r"\b(?:section|sections|sec|article|art|regulation|reg|rule|schedule|part|chapter)\.?\s*"
+    r"(\d+[a-z]?(?:\(\w+\))*)",
+    re.IGNORECASE,
+)
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it its of on or that the this to "
+    "under was what when where which who will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; compound references also emit their parts."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        if "(" in token:
+            tokens.extend(re.findall(r"[a-z0-9]+", token))
+    return tokens
+
+
+def find_section_references(text: str) -> List[str]:
+    """Returns section/article style references, e.g. ['23(4)', '15'] for 'Section 23(4) and Article 15'."""
+    return [reference.lower() for reference in _SECTION_REFERENCE_RE.findall(text)]
+
+
+class BM25Index:
+    """
+    On-disk inverted index over knowledge base chunks, scored with Okapi BM25.
+
+    Chunks are keyed by the same deterministic vector IDs used for the vector
+    store, so ingestion can keep both indexes in step.
+    """
+
+    def __init__(self, db_path: str, k1: float = 1.5, b: float = 0.75):
+        self.db_path = db_path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS docs (
+                    vector_id TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    length INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                )
+            ''')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    vector_id TEXT NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, vector_id)
+                ) WITHOUT ROWID
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_postings_vector_id ON postings (vector_id)')
+            self._conn.commit()
+
+    def add(self, documents: List[Document], vector_ids: List[str]):
+        """Indexes chunks, replacing any previous version stored under the same ID."""
+        with self._lock:
+            self._delete(vector_ids)
+            for vector_id, doc in zip(vector_ids, documents):
+                term_counts = Counter(tokenize(doc.page_content))
+                self._conn.execute(
+                    'INSERT INTO docs (vector_id, source, length, text, metadata) VALUES (?, ?, ?, ?, ?)',
+                    (vector_id, doc.metadata.get('source', ''), sum(term_counts.values()),
+                     doc.page_content, json.dumps(doc.metadata))
+                )
+                self._conn.executemany(
+                    'INSERT INTO postings (term, vector_id, tf) VALUES (?, ?, ?)',
+                    [(term, vector_id, tf) for term, tf in term_counts.items()]
+                )
+            self._conn.commit()
+
+    def missing(self, vector_ids: List[str]) -> Set[str]:
+        """Returns the subset of `vector_ids` that is not indexed."""
+        with self._lock:
+            present = set()
+            for start in range(0, len(vector_ids), 500):
+                batch = vector_ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                present.update(row[0] for row in self._conn.execute(
+                    f'SELECT vector_id FROM docs WHERE vector_id IN ({placeholders})', batch
+                ))
+        return set(vector_ids) - present
+
+    def remove(self, vector_ids: List[str]):
+        with self._lock:
+            self._delete(vector_ids)
+            self._conn.commit()
+
+    def _delete(self, vector_ids: List[str]):
+        params = [(vector_id,) for vector_id in vector_ids]
+        self._conn.executemany('DELETE FROM postings WHERE vector_id = ?', params)
+        self._conn.executemany('DELETE FROM docs WHERE vector_id = ?', params)
+
+    def search(self, query: str, k: int = 5, source: Optional[str] = None) -> List[Tuple[Document, float]]:
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            doc_count, total_length = self._conn.execute('SELECT COUNT(*), SUM(length) FROM docs').fetchone()
+            if not doc_count:
+                return []
+            avg_length = total_length / doc_count
+
+            scores = Counter()
+            for term in terms:
+                rows = self._conn.execute(
+                    'SELECT p.vector_id, p.tf, d.length FROM postings p JOIN docs d ON d.vector_id = p.vector_id '
+                    'WHERE p.term = ?' + (' AND d.source = ?' if source else ''),
+                    (term, source) if source else (term,)
+                ).fetchall()
+                if not rows:
+                    continue
+                # Document frequency is corpus-wide, independent of the source filter
+                df = self._conn.execute(
+                    'SELECT COUNT(*) FROM postings WHERE term = ?', (term,)
+                ).fetchone()[0]
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                for vector_id, tf, length in rows:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[vector_id] += idf * tf * (self.k1 + 1) / norm
+
+            top = scores.most_common(k)
+            results = []
+            for vector_id, score in top:
+                text, metadata = self._conn.execute(
+                    'SELECT text, metadata FROM docs WHERE vector_id = ?', (vector_id,)
+                ).fetchone()
+                results.append((Document(id=vector_id, page_content=text, metadata=json.loads(metadata)), score))
+            return results
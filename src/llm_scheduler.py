@@ -0,0 +1,353 @@
+"""
+Process-wide admission control for chat model calls.
+
+Every call waits for budget from two token buckets, one counting requests
+and one counting tokens, both refilled continuously at the configured
+per-minute rates. Waiting calls are admitted in priority order, so
+interactive turns overtake background jobs (FAQ and question generation,
+answer cache warming), and background calls may not dip into the share of
+each budget reserved for interactive traffic.
+
+Rate-limited (429) and transient failures are retried with jittered
+exponential backoff; a 429 also pauses admission for everyone, since every
+caller in the process shares the same OpenAI limits.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from config.settings import settings
+from src.tracing import register_metrics
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+# Lower ranks are admitted first
+PRIORITIES = {INTERACTIVE: 0, BACKGROUND: 1}
+
+# How often an async caller that is not first in line re-checks the queue
+_ASYNC_POLL_SECONDS = 0.05
+
+_priority_override: ContextVar[Optional[str]] = ContextVar("llm_priority", default=None)
+
+
+@contextmanager
+def llm_priority(priority: str) -> Iterator[None]:
+    """Runs every chat model call in this context (including copied contexts) at `priority`."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown LLM priority: {priority!r}")
+    token = _priority_override.set(priority)
+    try:
+        yield
+    finally:
+        _priority_override.reset(token)
+
+
+def effective_priority(default: str) -> str:
+    return _priority_override.get() or default
+
+
+class TokenBucket:
+    """Holds up to `per_minute` units and refills at `per_minute / 60` units per second. May go negative."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until(self, amount: float, floor: float = 0.0) -> float:
+        """Seconds until `amount` can be taken without leaving less than `floor` behind."""
+        # A request larger than the whole bucket waits for a full bucket instead of forever
+        needed = min(amount, self.capacity - floor) + floor - self.level
+        return max(0.0, needed / self.rate)
+
+
+class LLMScheduler:
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, background_reserve: float = 0.25,
+                 max_retries: int = 5, retry_base_seconds: float = 1.0, retry_max_seconds: float = 30.0,
+                 window: int = 1024):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.background_reserve = background_reserve
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._waiting: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+        self._queued = {priority: 0 for priority in PRIORITIES}
+        self._admitted = {priority: 0 for priority in PRIORITIES}
+        self._waits = {priority: deque(maxlen=window) for priority in PRIORITIES}
+        self._wait_sums = {priority: 0.0 for priority in PRIORITIES}
+        self._retries = {"rate_limit": 0, "transient": 0}
+
+    # Admission
+
+    def _enqueue(self, priority: str) -> Tuple[int, int]:
+        entry = (PRIORITIES[priority], next(self._sequence))
+        heapq.heappush(self._waiting, entry)
+        self._queued[priority] += 1
+        return entry
+
+    def _dequeue(self, entry: Tuple[int, int], priority: str):
+        self._waiting.remove(entry)
+        heapq.heapify(self._waiting)
+        self._queued[priority] -= 1
+        self._condition.notify_all()
+
+    def _try_admit(self, entry: Tuple[int, int], priority: str, tokens: int) -> Optional[float]:
+        """
+        Admits the call if it is first in line and both budgets allow it.
+        Returns 0 when admitted, the seconds to wait when first in line, or None when others are ahead.
+        """
+        if self._waiting[0] != entry:
+            return None
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        reserve = self.background_reserve if entry[0] > 0 else 0.0
+        delay = max(
+            self._paused_until - now,
+            self.requests.time_until(1, reserve * self.requests.capacity),
+            self.tokens.time_until(tokens, reserve * self.tokens.capacity)
+        )
+        if delay > 0:
+            return delay
+        self.requests.level -= 1
+        self.tokens.level -= tokens
+        self._dequeue(entry, priority)
+        return 0.0
+
+    def _record_wait(self, priority: str, waited: float):
+        self._admitted[priority] += 1
+        self._waits[priority].append(waited)
+        self._wait_sums[priority] += waited
+
+    def acquire(self, priority: str, tokens: int):
+        """Blocks until the call may be sent, taking one request and `tokens` from the budgets."""
+        start = time.monotonic()
+        with self._condition:
+            entry = self._enqueue(priority)
+            try:
+                while True:
+                    delay = self._try_admit(entry, priority, tokens)
+                    if delay == 0:
+                        break
+                    self._condition.wait(timeout=delay)
+            except BaseException:
+                self._dequeue(entry, priority)
+                raise
+            self._record_wait(priority, time.monotonic() - start)
+
+    async def aacquire(self, priority: str, tokens: int):
+        """Async variant of `acquire`; waits on the event loop instead of blocking a thread."""
+        start = time.monotonic()
+        with self._condition:
+            entry = self._enqueue(priority)
+        try:
+            while True:
+                with self._condition:
+                    delay = self._try_admit(entry, priority, tokens)
+                if delay == 0:
+                    break
+                await asyncio.sleep(_ASYNC_POLL_SECONDS if delay is None else delay)
+        except BaseException:
+            with self._condition:
+                self._dequeue(entry, priority)
+            raise
+        with self._condition:
+            self._record_wait(priority, time.monotonic() - start)
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Corrects the token budget once a call's real usage is known (None keeps the estimate)."""
+        if actual_tokens is None:
+            return
+        with self._condition:
+            self.tokens.level -= actual_tokens - estimated_tokens
+            self._condition.notify_all()
+
+    # Retries
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying after `error`, or None when the call should fail."""
+        reason, retry_after = _retry_reason(error)
+        if reason is None or attempt >= self.max_retries:
+            return None
+        backoff = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** attempt)
+        # Half fixed, half random, so callers that failed together do not retry together
+        delay = max(retry_after or 0.0, backoff / 2 + random.uniform(0, backoff / 2))
+        with self._condition:
+            self._retries[reason] += 1
+            if reason == "rate_limit":
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        logger.warning(f"LLM call failed ({type(error).__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        return delay
+
+    def run(self, priority: str, tokens: int, call: Callable[[], Any], count_tokens: Callable[[Any], Optional[int]]) -> Any:
+        """Runs `call` once admitted, retrying failures that are worth retrying."""
+        for attempt in itertools.count():
+            self.acquire(priority, tokens)
+            try:
+                result = call()
+            except Exception as e:
+                self.settle(tokens, 0)
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self.settle(tokens, count_tokens(result))
+            return result
+
+    async def arun(self, priority: str, tokens: int, call: Callable[[], Awaitable[Any]],
+                   count_tokens: Callable[[Any], Optional[int]]) -> Any:
+        for attempt in itertools.count():
+            await self.aacquire(priority, tokens)
+            try:
+                result = await call()
+            except Exception as e:
+                self.settle(tokens, 0)
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self.settle(tokens, count_tokens(result))
+            return result
+
+    def stream(self, priority: str, tokens: int, call: Callable[[], Iterator[Any]],
+               count_tokens: Callable[[Any], Optional[int]]) -> Iterator[Any]:
+        """Like `run` for streaming calls; only failures before the first chunk are retried."""
+        for attempt in itertools.count():
+            self.acquire(priority, tokens)
+            used, started = 0, False
+            try:
+                for chunk in call():
+                    started = True
+                    used += count_tokens(chunk) or 0
+                    yield chunk
+            except Exception as e:
+                self.settle(tokens, used)
+                delay = None if started else self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # e.g. the consumer closed the stream early
+                self.settle(tokens, used)
+                raise
+            self.settle(tokens, used or None)
+            return
+
+    async def astream(self, priority: str, tokens: int, call: Callable[[], AsyncIterator[Any]],
+                      count_tokens: Callable[[Any], Optional[int]]) -> AsyncIterator[Any]:
+        for attempt in itertools.count():
+            await self.aacquire(priority, tokens)
+            used, started = 0, False
+            try:
+                async for chunk in call():
+                    started = True
+                    used += count_tokens(chunk) or 0
+                    yield chunk
+            except Exception as e:
+                self.settle(tokens, used)
+                delay = None if started else self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.settle(tokens, used)
+                raise
+            self.settle(tokens, used or None)
+            return
+
+    # Metrics
+
+    def metrics(self) -> List[str]:
+        with self._condition:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            lines = [
+                "# HELP legal_assistant_llm_queue_depth Chat model calls waiting for rate limit budget.",
+                "# TYPE legal_assistant_llm_queue_depth gauge",
+            ]
+            lines += [f'legal_assistant_llm_queue_depth{{priority="{priority}"}} {count}' for priority, count in self._queued.items()]
+            lines += [
+                "# HELP legal_assistant_llm_wait_seconds Time chat model calls waited before being sent, over recent calls.",
+                "# TYPE legal_assistant_llm_wait_seconds summary",
+            ]
+            for priority, waits in self._waits.items():
+                if waits:
+                    for quantile in (0.5, 0.95, 0.99):
+                        value = float(np.quantile(list(waits), quantile))
+                        lines.append(f'legal_assistant_llm_wait_seconds{{priority="{priority}",quantile="{quantile}"}} {value:.6f}')
+                lines.append(f'legal_assistant_llm_wait_seconds_sum{{priority="{priority}"}} {self._wait_sums[priority]:.6f}')
+                lines.append(f'legal_assistant_llm_wait_seconds_count{{priority="{priority}"}} {self._admitted[priority]}')
+            lines += [
+                "# HELP legal_assistant_llm_retries_total Chat model calls retried after a failure.",
+                "# TYPE legal_assistant_llm_retries_total counter",
+            ]
+            lines += [f'legal_assistant_llm_retries_total{{reason="{reason}"}} {count}' for reason, count in self._retries.items()]
+            lines += [
+                "# HELP legal_assistant_llm_budget_available Rate limit budget currently available.",
+                "# TYPE legal_assistant_llm_budget_available gauge",
+                f'legal_assistant_llm_budget_available{{budget="requests"}} {self.requests.level:.1f}',
+                f'legal_assistant_llm_budget_available{{budget="tokens"}} {self.tokens.level:.0f}',
+            ]
+            return lines
+
+
+def _retry_reason(error: Exception) -> Tuple[Optional[str], Optional[float]]:
+    """Classifies an OpenAI client error as ("rate_limit" | "transient" | None, server-suggested delay)."""
+    import openai
+
+    if isinstance(error, openai.RateLimitError):
+        # An exhausted quota will not recover by waiting
+        if getattr(error, "code", None) == "insufficient_quota":
+            return None, None
+        try:
+            retry_after = float(error.response.headers.get("retry-after"))
+        except (AttributeError, TypeError, ValueError):
+            retry_after = None
+        return "rate_limit", retry_after
+    if isinstance(error, (openai.APIConnectionError, openai.InternalServerError)):
+        return "transient", None
+    return None, None
+
+
+def estimate_tokens(messages: List[Any]) -> int:
+    """Rough prompt size (about four characters per token) plus an allowance for the completion."""
+    characters = sum(len(str(getattr(message, "content", message))) for message in messages)
+    return characters // 4 + settings.LLM_ESTIMATED_COMPLETION_TOKENS
+
+
+llm_scheduler = LLMScheduler(
+    settings.LLM_REQUESTS_PER_MINUTE,
+    settings.LLM_TOKENS_PER_MINUTE,
+    background_reserve=settings.LLM_BACKGROUND_RESERVE,
+    max_retries=settings.LLM_MAX_RETRIES,
+    retry_base_seconds=settings.LLM_RETRY_BASE_SECONDS,
+    retry_max_seconds=settings.LLM_RETRY_MAX_SECONDS
+)
+register_metrics(llm_scheduler.metrics)
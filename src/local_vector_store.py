@@ -0,0 +1,412 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within a process
+    fcntl = None
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NAMESPACE = "__default__"
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Vector store kept on local disk, one directory per namespace.
+
+    Normalized float32 vectors are appended to a vector file and memory-mapped
+    for search; ids, texts and metadata live in `records.json`, which also
+    names the vector file's generation. Search is an exact vectorized dot
+    product; unfiltered searches use an IVF index once the namespace holds
+    at least `ann_min_vectors` live vectors.
+
+    Several processes (the apps, the content worker, maintenance scripts)
+    may write the same namespace; writes hold an exclusive lock on
+    `.lock` in its directory, so none of them loses another's records.
+    """
+
+    def __init__(
+        self,
+        root_dir: str,
+        embedding: Embeddings,
+        namespace: Optional[str] = None,
+        ann_min_vectors: int = 50000,
+        ann_probes: int = 8,
+    ):
+        self.embedding = embedding
+        self.namespace = namespace
+        self.ann_min_vectors = ann_min_vectors
+        self.ann_probes = ann_probes
+        self.dir = os.path.join(root_dir, namespace or DEFAULT_NAMESPACE)
+        self._records_path = os.path.join(self.dir, "records.json")
+        self._lock_path = os.path.join(self.dir, ".lock")
+        self._lock = threading.RLock()
+        self._loaded_stamp = None
+        self._generation = 0
+        self._dim = 0
+        self._ids: List[Optional[str]] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._masks: Dict[str, np.ndarray] = {}
+        self._ivf: Optional[Tuple[np.ndarray, List[np.ndarray]]] = None
+        os.makedirs(self.dir, exist_ok=True)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    # --- Persistence ---
+
+    @property
+    def _vectors_path(self) -> str:
+        # Compaction writes a new generation instead of rewriting the file records.json points at
+        name = f"vectors.{self._generation}.f32" if self._generation else "vectors.f32"
+        return os.path.join(self.dir, name)
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        """Serializes read-modify-write cycles across threads and processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _records_stamp(self) -> Tuple[int, int, int]:
+        # The mtime alone can repeat for two writes within one timestamp tick; every write also makes a new file
+        stat = os.stat(self._records_path)
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _reload_if_changed(self):
+        """Picks up writes made by other processes (e.g. the dashboard)."""
+        while True:
+            try:
+                stamp = self._records_stamp()
+            except FileNotFoundError:
+                return
+            if stamp == self._loaded_stamp:
+                return
+
+            with open(self._records_path, "r") as f:
+                records = json.load(f)
+            self._generation = records.get("generation", 0)
+            self._dim = records["dim"]
+            self._ids = records["ids"]
+            self._texts = records["texts"]
+            self._metadatas = records["metadatas"]
+            self._id_to_row = {vector_id: row for row, vector_id in enumerate(self._ids) if vector_id is not None}
+            try:
+                self._map_vectors()
+            except FileNotFoundError:
+                # Compacted by another process after these records were read; the new ones name the new file
+                continue
+            self._loaded_stamp = stamp
+            return
+
+    def _map_vectors(self):
+        rows = len(self._ids)
+        self._matrix = (
+            np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self._dim))
+            if rows else None
+        )
+        self._masks = {}
+        self._ivf = None
+
+    def _compact_if_needed(self) -> bool:
+        """
+        Rewrites the vectors without deleted rows once they outnumber live ones, saving the records.
+
+        The live vectors go to a new generation's file, and only replacing
+        `records.json` switches readers over to it, so no reader ever pairs
+        records with the vector file of another generation.
+        """
+        live_rows = [row for row, vector_id in enumerate(self._ids) if vector_id is not None]
+        dead = len(self._ids) - len(live_rows)
+        if dead < 1000 or dead < len(live_rows):
+            return False
+
+        old_path = self._vectors_path
+        self._generation += 1
+        with open(self._vectors_path, "wb") as f:
+            for start in range(0, len(live_rows), 8192):
+                f.write(np.ascontiguousarray(self._matrix[live_rows[start:start + 8192]]).tobytes())
+        self._matrix = None
+
+        self._ids = [self._ids[row] for row in live_rows]
+        self._texts = [self._texts[row] for row in live_rows]
+        self._metadatas = [self._metadatas[row] for row in live_rows]
+        self._id_to_row = {vector_id: row for row, vector_id in enumerate(self._ids)}
+        self._save_records()
+        try:
+            os.remove(old_path)
+        except OSError as e:
+            # e.g. still mapped by a reader on Windows; the file is no longer referenced
+            logger.warning(f"Could not remove compacted vector file '{old_path}': {e}")
+        logger.info(f"Compacted '{self.dir}', dropping {dead} deleted vectors.")
+        return True
+
+    def _save_records(self):
+        tmp_path = self._records_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "generation": self._generation, "dim": self._dim,
+                "ids": self._ids, "texts": self._texts, "metadatas": self._metadatas,
+            }, f)
+        os.replace(tmp_path, self._records_path)
+        self._loaded_stamp = self._records_stamp()
+
+    # --- Writes ---
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        vectors = self.embedding.embed_documents(texts)
+        return self.add_embeddings(vectors, texts, metadatas=metadatas, ids=ids)
+
+    def add_embeddings(
+        self,
+        vectors: List[List[float]],
+        texts: List[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+    ) -> List[str]:
+        """Upserts precomputed vectors. Existing ids are replaced."""
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [os.urandom(16).hex() for _ in texts]
+        matrix = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+        with self._write_lock():
+            self._reload_if_changed()
+            if not self._dim:
+                self._dim = matrix.shape[1]
+            for vector_id in ids:
+                self._tombstone(vector_id)
+
+            with open(self._vectors_path, "ab") as f:
+                f.write(matrix.tobytes())
+            for vector_id, text, metadata in zip(ids, texts, metadatas):
+                self._id_to_row[vector_id] = len(self._ids)
+                self._ids.append(vector_id)
+                self._texts.append(text)
+                self._metadatas.append(metadata)
+
+            self._save_records()
+            self._map_vectors()
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._write_lock():
+            self._reload_if_changed()
+            for vector_id in ids:
+                self._tombstone(vector_id)
+            if not self._compact_if_needed():
+                self._save_records()
+            self._map_vectors()
+        return True
+
+    def update_metadata(self, vector_id: str, metadata: Dict[str, Any]):
+        """Merges `metadata` into the stored metadata of a vector."""
+        with self._write_lock():
+            self._reload_if_changed()
+            row = self._id_to_row.get(vector_id)
+            if row is None:
+                return
+            self._metadatas[row] = {**self._metadatas[row], **metadata}
+            self._masks = {}
+            self._save_records()
+
+    def get_all(self) -> Tuple[List[str], np.ndarray, List[str], List[Dict[str, Any]]]:
+        """Returns ids, normalized vectors, texts and metadata of every live vector."""
+        with self._lock:
+            self._reload_if_changed()
+            rows = self._live_rows(None)
+            if self._matrix is None or not len(rows):
+                return [], np.zeros((0, self._dim), dtype=np.float32), [], []
+            return (
+                [self._ids[row] for row in rows],
+                np.array(self._matrix[rows]),
+                [self._texts[row] for row in rows],
+                [dict(self._metadatas[row]) for row in rows],
+            )
+
+    def get_ids(self, filter: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Returns the ids of live vectors matching `filter`."""
+        with self._lock:
+            self._reload_if_changed()
+            return [self._ids[row] for row in self._live_rows(filter)]
+
+    def get_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Returns the normalized vectors of the given ids that exist."""
+        with self._lock:
+            self._reload_if_changed()
+            rows = {vector_id: self._id_to_row[vector_id] for vector_id in ids if vector_id in self._id_to_row}
+            if self._matrix is None or not rows:
+                return {}
+            matrix = np.array(self._matrix[list(rows.values())])
+            return dict(zip(rows, matrix))
+
+    def _tombstone(self, vector_id: str):
+        row = self._id_to_row.pop(vector_id, None)
+        if row is not None:
+            self._ids[row] = None
+            self._texts[row] = ""
+            self._metadatas[row] = {}
+
+    # --- Search ---
+
+    def _live_rows(self, filter: Optional[Dict[str, Any]]) -> np.ndarray:
+        """Rows that are not deleted and match `filter`, cached until the next write."""
+        key = json.dumps(filter, sort_keys=True)
+        if key not in self._masks:
+            self._masks[key] = np.array(
+                [row for row, vector_id in enumerate(self._ids)
+                 if vector_id is not None and _matches(self._metadatas[row], filter)],
+                dtype=np.int64,
+            )
+        return self._masks[key]
+
+    def _build_ivf(self, rows: np.ndarray):
+        """Clusters live vectors with a few rounds of k-means (inverted file index)."""
+        n_lists = max(1, int(np.sqrt(len(rows))))
+        rng = np.random.default_rng(0)
+        sample = rows[rng.choice(len(rows), size=min(len(rows), n_lists * 64), replace=False)]
+        centroids = np.array(self._matrix[rng.choice(sample, size=n_lists, replace=False)])
+        for _ in range(10):
+            assignments = np.argmax(self._matrix[sample] @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = sample[assignments == c]
+                if len(members):
+                    centroids[c] = self._matrix[members].mean(axis=0)
+            centroids = _normalize_rows(centroids)
+
+        assignments = np.concatenate([
+            np.argmax(self._matrix[rows[i:i + 8192]] @ centroids.T, axis=1)
+            for i in range(0, len(rows), 8192)
+        ])
+        inverted_lists = [rows[assignments == c] for c in range(n_lists)]
+        self._ivf = (centroids, inverted_lists)
+        logger.info(f"Built IVF index with {n_lists} lists over {len(rows)} vectors in '{self.dir}'.")
+
+    def _candidate_rows(self, query: np.ndarray, filter: Optional[Dict[str, Any]]) -> np.ndarray:
+        live_rows = self._live_rows(None)
+        # A filter (e.g. one source) usually selects few rows, most of them outside the probed lists,
+        # so filtered searches scan every matching row exactly
+        if filter or len(live_rows) < self.ann_min_vectors:
+            return self._live_rows(filter)
+
+        if self._ivf is None:
+            self._build_ivf(live_rows)
+        centroids, inverted_lists = self._ivf
+        probes = np.argsort(-(centroids @ query))[:self.ann_probes]
+        return np.concatenate([inverted_lists[c] for c in probes])
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        query = _normalize_rows(np.asarray([embedding], dtype=np.float32))[0]
+        with self._lock:
+            self._reload_if_changed()
+            if self._matrix is None:
+                return []
+            rows = self._candidate_rows(query, filter)
+            if not len(rows):
+                return []
+            scores = self._matrix[rows] @ query
+            top = np.argsort(-scores)[:k] if len(rows) <= k else np.argpartition(-scores, k)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                (
+                    Document(id=self._ids[rows[i]], page_content=self._texts[rows[i]], metadata=dict(self._metadatas[rows[i]])),
+                    float(scores[i]),
+                )
+                for i in top
+            ]
+
+    async def asimilarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return await asyncio.to_thread(self.similarity_search_by_vector_with_score, embedding, k=k, filter=filter)
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k=k, filter=filter)
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        root_dir: str = "database/vectors",
+        namespace: Optional[str] = None,
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        store = cls(root_dir, embedding, namespace=namespace, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _matches(metadata: Dict[str, Any], filter: Optional[Dict[str, Any]]) -> bool:
+    """Evaluates the subset of Pinecone's metadata filter syntax used in this project."""
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            if "$eq" in condition and value != condition["$eq"]:
+                return False
+            if "$ne" in condition and value == condition["$ne"]:
+                return False
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+        elif value != condition:
+            return False
+    return True
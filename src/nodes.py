@@ -1,10 +1,14 @@
 # tasks.py (Refactored)
 
+import random
+
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage
-from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 
 from .tools import search_knowledge_base
+from .relevance import estimate_relevance, is_ambiguous, grader_agreement
+from .tracing import tracer
+from . import clients
 from .prompts import (
     ASSISTANT_PROMPT_FOR_PROFESSIONALS,
     ASSISTANT_PROMPT_FOR_STUDENTS,
@@ -13,13 +17,6 @@ from .prompts import (
 )
 from config.settings import settings
 
-# --- Initialize Models (No changes) ---
-model = ChatOpenAI(model=settings.PRIMARY_MODEL, api_key=settings.OPENAI_API_KEY)
-scoring_model = ChatOpenAI(model=settings.SCORE_DOCUMENTS_MODEL, api_key=settings.OPENAI_API_KEY, temperature=0.5)
-rewriter_model = ChatOpenAI(model=settings.REWRITE_QUERY_MODEL, api_key=settings.OPENAI_API_KEY, temperature=0.5)
-
-agent_with_tool = model.bind_tools([search_knowledge_base])
-
 # --- Pydantic Models for Structured Output (No changes) ---
 class ScoreDocument(BaseModel):
     score: int = Field(..., description="Score for the documents (combined) from 1-10 for a given query.", ge=1, le=10)
@@ -28,19 +25,92 @@ class ModifiedQuery(BaseModel):
     query: str = Field(..., description="The enhanced query to search into the vector store.")
 
 # --- Helper functions for the RAG node ---
-def _retrieve(tool_call: dict) -> ToolMessage:
-    retrieved_context = search_knowledge_base.invoke(tool_call["args"])
-    return ToolMessage(content=retrieved_context, tool_call_id=tool_call["id"])
+def _retrieve(tool_call: dict, iteration: int) -> ToolMessage:
+    with tracer.span("retrieve", iteration=iteration, k=tool_call["args"].get("limit", settings.RETRIEVAL_TOP_K)) as span:
+        # Invoking with the full tool call returns a ToolMessage whose artifact holds (document, similarity) pairs
+        message = search_knowledge_base.invoke({**tool_call, "args": dict(tool_call["args"]), "type": "tool_call"})
+        span.set(returned=len(message.artifact or []))
+        return message
+
+def _score_documents(query: str, context: str, iteration: int = 0) -> int:
+    with tracer.span("score_documents", iteration=iteration) as span:
+        prompt = SCORE_PROMPT.format(query=query, context=context)
+        response = clients.get_scoring_model().with_structured_output(ScoreDocument, include_raw=True).invoke([HumanMessage(content=prompt)])
+        span.record_usage(response["raw"])
+        span.set(score=response["parsed"].score)
+        return response["parsed"].score
+
+def _rewrite_query(query: str, iteration: int = 0) -> str:
+    with tracer.span("rewrite_query", iteration=iteration) as span:
+        prompt = REWRITE_PROMPT.format(query=query)
+        response = clients.get_rewriter_model().with_structured_output(ModifiedQuery, include_raw=True).invoke([HumanMessage(content=prompt)])
+        span.record_usage(response["raw"])
+        return response["parsed"].query
+
+def _use_local_estimate(estimate: float) -> bool:
+    """Trust the pre-score unless it is ambiguous, or this call is sampled to audit it against the grader."""
+    return not is_ambiguous(estimate) and random.random() >= settings.PRESCORE_AUDIT_RATE
+
+def _prescore(query: str, retrieved_docs_msg: ToolMessage, iteration: int) -> float:
+    with tracer.span("prescore", iteration=iteration) as span:
+        estimate = estimate_relevance(query, retrieved_docs_msg.artifact or [])
+        span.set(estimate=round(estimate, 2))
+        return estimate
+
+def _grade_retrieval(query: str, retrieved_docs_msg: ToolMessage, iteration: int = 0) -> float:
+    """Scores retrieved context, calling the LLM grader only when the local estimate is ambiguous."""
+    if not settings.PRESCORE_ENABLED:
+        return _score_documents(query, retrieved_docs_msg.content, iteration)
+    estimate = _prescore(query, retrieved_docs_msg, iteration)
+    if _use_local_estimate(estimate):
+        return estimate
+    score = _score_documents(query, retrieved_docs_msg.content, iteration)
+    grader_agreement.record(estimate, score)
+    return score
 
-def _score_documents(query: str, context: str) -> int:
-    prompt = SCORE_PROMPT.format(query=query, context=context)
-    response = scoring_model.with_structured_output(ScoreDocument).invoke([HumanMessage(content=prompt)])
-    return response.score
+# --- Async variants of the helpers ---
+async def _aretrieve(tool_call: dict, iteration: int) -> ToolMessage:
+    with tracer.span("retrieve", iteration=iteration, k=tool_call["args"].get("limit", settings.RETRIEVAL_TOP_K)) as span:
+        message = await search_knowledge_base.ainvoke({**tool_call, "args": dict(tool_call["args"]), "type": "tool_call"})
+        span.set(returned=len(message.artifact or []))
+        return message
 
-def _rewrite_query(query: str) -> str:
-    prompt = REWRITE_PROMPT.format(query=query)
-    response = rewriter_model.with_structured_output(ModifiedQuery).invoke([HumanMessage(content=prompt)])
-    return response.query
+async def _ascore_documents(query: str, context: str, iteration: int = 0) -> int:
+    with tracer.span("score_documents", iteration=iteration) as span:
+        prompt = SCORE_PROMPT.format(query=query, context=context)
+        response = await clients.get_scoring_model().with_structured_output(ScoreDocument, include_raw=True).ainvoke([HumanMessage(content=prompt)])
+        span.record_usage(response["raw"])
+        span.set(score=response["parsed"].score)
+        return response["parsed"].score
+
+async def _arewrite_query(query: str, iteration: int = 0) -> str:
+    with tracer.span("rewrite_query", iteration=iteration) as span:
+        prompt = REWRITE_PROMPT.format(query=query)
+        response = await clients.get_rewriter_model().with_structured_output(ModifiedQuery, include_raw=True).ainvoke([HumanMessage(content=prompt)])
+        span.record_usage(response["raw"])
+        return response["parsed"].query
+
+def _prepare_history(messages) -> list:
+    with tracer.span("history", history_messages=len(messages)) as span:
+        history, stats = clients.get_history_manager().prepare(messages)
+        span.set(history_tokens=stats.sent_tokens, history_tokens_saved=stats.saved_tokens, summarized_turns=stats.summarized_turns)
+        return history
+
+async def _aprepare_history(messages) -> list:
+    with tracer.span("history", history_messages=len(messages)) as span:
+        history, stats = await clients.get_history_manager().aprepare(messages)
+        span.set(history_tokens=stats.sent_tokens, history_tokens_saved=stats.saved_tokens, summarized_turns=stats.summarized_turns)
+        return history
+
+async def _agrade_retrieval(query: str, retrieved_docs_msg: ToolMessage, iteration: int = 0) -> float:
+    if not settings.PRESCORE_ENABLED:
+        return await _ascore_documents(query, retrieved_docs_msg.content, iteration)
+    estimate = _prescore(query, retrieved_docs_msg, iteration)
+    if _use_local_estimate(estimate):
+        return estimate
+    score = await _ascore_documents(query, retrieved_docs_msg.content, iteration)
+    grader_agreement.record(estimate, score)
+    return score
 
 
 
@@ -53,7 +123,12 @@ def assistant_node(state) -> dict:
     is_professional = state['is_professional']
     
     system_prompt = ASSISTANT_PROMPT_FOR_PROFESSIONALS if is_professional else ASSISTANT_PROMPT_FOR_STUDENTS
-    response = agent_with_tool.invoke([SystemMessage(content=system_prompt)] + messages)
+    # Older turns are windowed, collapsed and summarized to stay within the token budget
+    history = _prepare_history(messages)
+    with tracer.span("assistant", history_messages=len(messages)) as span:
+        response = clients.get_agent_with_tool().invoke([SystemMessage(content=system_prompt)] + history)
+        span.record_usage(response)
+        span.set(final=not response.tool_calls)
     
     # The output of a node must be a dictionary that updates the state
     return {"messages": [response]}
@@ -69,26 +144,68 @@ def rag_node(state) -> dict:
     last_ai_message = messages[-1]
     tool_calls = last_ai_message.tool_calls
     
-    loop_count = 0
-    while loop_count < 2:
-        # Use the helper function to retrieve documents
-        retrieved_docs_msg = _retrieve(tool_calls[-1])
-        
-        # Use the helper function to score
-        score = _score_documents(
-            query=human_message.content, 
-            context=retrieved_docs_msg.content
-        )
-
-        if score < settings.RELEVANCE_THRESHOLD:
-            # Use the helper function to rewrite
-            enhanced_query = _rewrite_query(tool_calls[-1]["args"]["query"])
-            tool_calls[-1]["args"]["query"] = enhanced_query
-            loop_count += 1
-            continue
-        else:
-            # If score is good, break and return the successful retrieval
-            return {"messages": [retrieved_docs_msg]}
+    with tracer.span("rag_loop") as span:
+        loop_count = 0
+        while loop_count < 2:
+            # Use the helper function to retrieve documents
+            retrieved_docs_msg = _retrieve(tool_calls[-1], loop_count)
+            
+            # Score locally, escalating to the LLM grader only when ambiguous
+            score = _grade_retrieval(human_message.content, retrieved_docs_msg, loop_count)
+
+            if score < settings.RELEVANCE_THRESHOLD:
+                # Use the helper function to rewrite
+                enhanced_query = _rewrite_query(tool_calls[-1]["args"]["query"], loop_count)
+                tool_calls[-1]["args"]["query"] = enhanced_query
+                loop_count += 1
+                continue
+            else:
+                # If score is good, break and return the successful retrieval
+                span.set(rewrites=loop_count, score=score)
+                return {"messages": [retrieved_docs_msg]}
+                
+        # If the loop finishes, return the last attempt's retrieval
+        span.set(rewrites=loop_count, score=score)
+        return {"messages": [retrieved_docs_msg]}
+
+
+async def aassistant_node(state) -> dict:
+    """Async variant of `assistant_node`."""
+    messages = state['messages']
+    is_professional = state['is_professional']
+    
+    system_prompt = ASSISTANT_PROMPT_FOR_PROFESSIONALS if is_professional else ASSISTANT_PROMPT_FOR_STUDENTS
+    history = await _aprepare_history(messages)
+    with tracer.span("assistant", history_messages=len(messages)) as span:
+        response = await clients.get_agent_with_tool().ainvoke([SystemMessage(content=system_prompt)] + history)
+        span.record_usage(response)
+        span.set(final=not response.tool_calls)
+    
+    return {"messages": [response]}
+
+async def arag_node(state) -> dict:
+    """Async variant of `rag_node`."""
+    messages = state['messages']
+    human_message = next(msg for msg in reversed(messages) if isinstance(msg, HumanMessage))
+    
+    last_ai_message = messages[-1]
+    tool_calls = last_ai_message.tool_calls
+    
+    with tracer.span("rag_loop") as span:
+        loop_count = 0
+        while loop_count < 2:
+            retrieved_docs_msg = await _aretrieve(tool_calls[-1], loop_count)
             
-    # If the loop finishes, return the last attempt's retrieval
-    return {"messages": [retrieved_docs_msg]}
\ No newline at end of file
+            score = await _agrade_retrieval(human_message.content, retrieved_docs_msg, loop_count)
+
+            if score < settings.RELEVANCE_THRESHOLD:
+                enhanced_query = await _arewrite_query(tool_calls[-1]["args"]["query"], loop_count)
+                tool_calls[-1]["args"]["query"] = enhanced_query
+                loop_count += 1
+                continue
+            else:
+                span.set(rewrites=loop_count, score=score)
+                return {"messages": [retrieved_docs_msg]}
+                
+        span.set(rewrites=loop_count, score=score)
+        return {"messages": [retrieved_docs_msg]}
@@ -286,4 +286,24 @@ FAQ_PROMPT="""## ROLE: You are an expert in analyzing legal consultations and ex
 - Don't generate FAQs for topics that require personalized legal advice
 
 NOTE: If the conversation is too simple and doesn't contain any legal issues, generate only 1 FAQ.
-"""
\ No newline at end of file
+"""
+FAQ_BATCH_PROMPT="""
+## BATCH MODE:
+The input contains several independent conversations, each within its own <Conversation id="..."> tags.
+- Apply the instructions above to every conversation separately; the 1-5 FAQ limit applies per conversation.
+- Never combine facts from different conversations into one answer.
+- Return one entry per conversation, with its id as `conversation_id` and the FAQs generated from that conversation alone.
+- When several conversations raise the same question, generate it again for each of them; repeats count how often a question is asked.
+"""
+
+HISTORY_SUMMARY_PROMPT = """
+You are condensing the earlier part of a consultation with a legal assistant so the conversation can continue within a limited context.
+
+Write a concise summary that preserves:
+- The user's situation, goals and any facts they stated (jurisdiction, dates, parties, amounts)
+- Each legal question asked and the substance of the answer given
+- Every statute, section, article or regulation cited, with its name exactly as written
+- Open questions or follow-ups the user said they would come back to
+
+If a previous summary is provided, merge it with the new turns into a single updated summary. Do not add legal analysis that was not in the conversation. Write in the third person ("The user asked...").
+"""
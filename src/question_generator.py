@@ -1,8 +1,8 @@
 from typing import List
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from pydantic import BaseModel, Field
 from config.settings import settings
+from . import clients
 from .prompts import SUGGESTED_QUESTIONS_PROMPT
 
 class SuggestedQuestions(BaseModel):
@@ -13,11 +13,7 @@ class SuggestedQuestions(BaseModel):
 
 class QuestionGenerator:
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model=settings.PRIMARY_MODEL,
-            openai_api_key=settings.OPENAI_API_KEY,
-            temperature=0.5
-        ).with_structured_output(SuggestedQuestions)
+        self.llm = clients.create_chat_model(settings.PRIMARY_MODEL, temperature=0.5, priority="background").with_structured_output(SuggestedQuestions)
 
     def generate_questions_from_conversation(self, conversation_history: List[dict]) -> List[str]:
         """
@@ -36,7 +32,8 @@ class QuestionGenerator:
             return response.questions if response and response.questions else []
         except Exception as e:
             print(f"Error generating questions: {e}")
-            return []
+            # Re-raised so the job queue can retry the conversation
+            raise
 
     def _format_conversation(self, conversation: List[dict]) -> str:
         """Formats conversation for LLM analysis."""
@@ -0,0 +1,75 @@
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from config.settings import settings
+from src.lexical_index import find_section_references, tokenize
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_relevance(query: str, scored_docs: List[Tuple[Document, Optional[float]]]) -> float:
+    """
+    Cheap 1-10 relevance estimate for retrieved chunks, on the same scale as
+    the LLM grader. Combines the retrieval similarity of the best hits, the
+    share of query terms found in the chunks and, when the query cites
+    provisions, the share of those references present in the chunks.
+    """
+    if not scored_docs:
+        return 1.0
+
+    similarities = sorted((score for _, score in scored_docs if score is not None), reverse=True)[:3]
+    similarity = sum(similarities) / len(similarities) if similarities else 0.0
+    floor, ceiling = settings.PRESCORE_SIMILARITY_FLOOR, settings.PRESCORE_SIMILARITY_CEILING
+    components = {"similarity": min(max((similarity - floor) / (ceiling - floor), 0.0), 1.0)}
+
+    query_terms = set(tokenize(query))
+    if query_terms:
+        chunk_terms = set()
+        for doc, _ in scored_docs:
+            chunk_terms.update(tokenize(doc.page_content))
+        components["overlap"] = len(query_terms & chunk_terms) / len(query_terms)
+
+    references = set(find_section_references(query))
+    if references:
+        cited = set()
+        for doc, _ in scored_docs:
+            cited.update(find_section_references(doc.page_content))
+            # Statutes usually number sections as "23. (1)" rather than "Section 23(1)"
+            cited.update(reference for reference in references if reference in doc.page_content.lower())
+        components["sections"] = len(references & cited) / len(references)
+
+    weights = {name: settings.PRESCORE_WEIGHTS[name] for name in components}
+    combined = sum(components[name] * weights[name] for name in components) / sum(weights.values())
+    return 1.0 + 9.0 * combined
+
+
+def is_ambiguous(estimate: float) -> bool:
+    """True when the estimate is too close to the threshold to act on without the LLM grader."""
+    return abs(estimate - settings.RELEVANCE_THRESHOLD) < settings.PRESCORE_AMBIGUOUS_BAND
+
+
+class GraderAgreement:
+    """Tracks how often the pre-scorer and the LLM grader land on the same side of the threshold."""
+
+    def __init__(self):
+        self.total = 0
+        self.agreed = 0
+        self._lock = threading.Lock()
+
+    def record(self, estimate: float, llm_score: int):
+        threshold = settings.RELEVANCE_THRESHOLD
+        agrees = (estimate >= threshold) == (llm_score >= threshold)
+        with self._lock:
+            self.total += 1
+            self.agreed += agrees
+            rate = self.agreed / self.total
+        logger.info(
+            f"Relevance pre-score {estimate:.1f} vs LLM grader {llm_score}: "
+            f"{'agree' if agrees else 'disagree'} (agreement rate {rate:.0%} over {self.total})"
+        )
+
+
+grader_agreement = GraderAgreement()
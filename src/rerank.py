@@ -0,0 +1,127 @@
+"""
+Diversity reranking of over-fetched retrieval candidates.
+
+Chunks overlap by `CHUNK_OVERLAP` characters, so a plain top-k often spends
+several slots on neighbouring chunks of the same page. Maximal marginal
+relevance picks chunks that are relevant to the query but not to each
+other; neighbours that are still picked together are then merged into one
+passage without the repeated overlap.
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+ScoredDocs = List[Tuple[Document, Optional[float]]]
+
+
+def _position(doc: Document) -> Tuple[str, int, int]:
+    return (str(doc.metadata.get("source")), int(doc.metadata.get("page", 0)), int(doc.metadata.get("chunk_id", 0)))
+
+
+def _overlap_length(left: str, right: str, max_overlap: int) -> int:
+    """Length of the longest suffix of `left` that is also a prefix of `right`, up to `max_overlap`."""
+    for length in range(min(len(left), len(right), max_overlap), 0, -1):
+        if left.endswith(right[:length]):
+            return length
+    return 0
+
+
+def _join_chunks(texts: Sequence[str], max_overlap: int) -> str:
+    joined = texts[0]
+    for text in texts[1:]:
+        overlap = _overlap_length(joined, text, max_overlap)
+        # Size-based splits repeat the overlap verbatim; structure-based chunks do not overlap at all
+        joined = joined + text[overlap:] if overlap else joined.rstrip() + "\n" + text.lstrip()
+    return joined
+
+
+def _merge_documents(documents: Sequence[Document], max_overlap: int) -> Document:
+    metadata = dict(documents[0].metadata)
+    metadata["chunk_ids"] = [int(doc.metadata["chunk_id"]) for doc in documents]
+    hierarchies = list(dict.fromkeys(doc.metadata["hierarchy"] for doc in documents if doc.metadata.get("hierarchy")))
+    if len(hierarchies) > 1:
+        metadata["hierarchy"] = " | ".join(hierarchies)
+    return Document(page_content=_join_chunks([doc.page_content for doc in documents], max_overlap), metadata=metadata)
+
+
+def merge_adjacent(scored_docs: ScoredDocs, max_overlap: int, max_chunks: int = 3) -> ScoredDocs:
+    """
+    Joins consecutive chunks (by `chunk_id`) of the same source and page into
+    passages of at most `max_chunks` chunks, removing the repeated overlap.
+    A passage keeps the best similarity of its chunks and takes the place of
+    its best-ranked chunk.
+    """
+    runs: List[List[int]] = []
+    for rank in sorted(range(len(scored_docs)), key=lambda rank: _position(scored_docs[rank][0])):
+        if runs and len(runs[-1]) < max_chunks:
+            source, page, chunk_id = _position(scored_docs[runs[-1][-1]][0])
+            if _position(scored_docs[rank][0]) == (source, page, chunk_id + 1):
+                runs[-1].append(rank)
+                continue
+        runs.append([rank])
+
+    merged = []
+    for run in sorted(runs, key=min):
+        if len(run) == 1:
+            merged.append(scored_docs[run[0]])
+            continue
+        similarities = [scored_docs[rank][1] for rank in run if scored_docs[rank][1] is not None]
+        document = _merge_documents([scored_docs[rank][0] for rank in run], max_overlap)
+        merged.append((document, max(similarities) if similarities else None))
+    return merged
+
+
+def maximal_marginal_relevance(relevance: np.ndarray, vectors: np.ndarray, k: int, lambda_mult: float = 0.7) -> List[int]:
+    """
+    Greedily selects up to `k` rows maximizing
+    `lambda_mult * relevance - (1 - lambda_mult) * max cosine similarity to the rows already selected`.
+    `vectors` must be normalized.
+    """
+    count = min(k, len(relevance))
+    if count <= 0:
+        return []
+    similarities = vectors @ vectors.T
+    redundancy = np.zeros(len(relevance))
+    available = np.ones(len(relevance), dtype=bool)
+    selected: List[int] = []
+    for _ in range(count):
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        choice = int(np.argmax(scores))
+        selected.append(choice)
+        available[choice] = False
+        redundancy = np.maximum(redundancy, similarities[choice])
+    return selected
+
+
+def diversify(
+    scored_docs: ScoredDocs,
+    vectors: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.7,
+    rank_constant: int = 60,
+    max_overlap: int = 250,
+    max_merged_chunks: int = 3,
+) -> ScoredDocs:
+    """
+    Reduces ranked candidates (best first, with normalized `vectors` as rows)
+    to at most `k` diverse chunks, merged into passages where they are
+    neighbours. Relevance comes from the candidate rank as `(c + 1) / (c + rank)`,
+    the same shape as reciprocal rank fusion, so dense-only and hybrid
+    rankings are treated alike.
+    """
+    if not scored_docs:
+        return []
+    ranks = np.arange(1, len(scored_docs) + 1, dtype=np.float64)
+    relevance = (rank_constant + 1) / (rank_constant + ranks)
+    selected = maximal_marginal_relevance(relevance, vectors, k, lambda_mult)
+    return merge_adjacent([scored_docs[i] for i in selected], max_overlap, max_merged_chunks)
+
+
+def passage_label(doc: Document) -> str:
+    """`chunk_id` of a chunk, or the range of chunk ids a merged passage spans, e.g. "3-4"."""
+    chunk_ids = doc.metadata.get("chunk_ids")
+    if chunk_ids and len(chunk_ids) > 1:
+        return f"{chunk_ids[0]}-{chunk_ids[-1]}"
+    return str(doc.metadata["chunk_id"])
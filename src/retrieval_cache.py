@@ -0,0 +1,121 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """Lowercases, collapses whitespace and drops trailing punctuation."""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip("?.! ")
+
+
+@dataclass
+class _CacheEntry:
+    value: Any
+    vector: Optional[np.ndarray]
+    limit: int
+    source: Optional[str]
+    created_at: float
+
+
+class RetrievalCache:
+    """
+    TTL and size-bounded cache of retrieval results.
+
+    Entries are keyed by (normalized query, limit, source). When
+    `semantic_distance` is set, a query whose embedding lies within that
+    cosine distance of a cached query with the same limit and source reuses
+    its results. The whole cache is dropped whenever the knowledge base
+    version changes.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 600, semantic_distance: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_distance = semantic_distance
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, int, Optional[str]], _CacheEntry]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, version: str):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def _is_expired(self, entry: _CacheEntry) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl_seconds
+
+    def get(self, query: str, limit: int, source: Optional[str], version: str):
+        """Returns cached results for an exact (normalized) query match, or None."""
+        key = (normalize_query(query), limit, source)
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None or self._is_expired(entry):
+                self._entries.pop(key, None)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def get_similar(self, query_vector: List[float], limit: int, source: Optional[str], version: str):
+        """Returns cached results for a near-duplicate query embedding, or None."""
+        with self._lock:
+            self._check_version(version)
+            if self.semantic_distance is None:
+                self.misses += 1
+                return None
+
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry.vector is not None and entry.limit == limit
+                and entry.source == source and not self._is_expired(entry)
+            ]
+            if not candidates:
+                self.misses += 1
+                return None
+
+            matrix = np.stack([entry.vector for _, entry in candidates])
+            similarities = matrix @ _normalize(query_vector)
+            best = int(np.argmax(similarities))
+            if 1.0 - float(similarities[best]) > self.semantic_distance:
+                self.misses += 1
+                return None
+
+            key, entry = candidates[best]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def put(self, query: str, limit: int, source: Optional[str], version: str, value: Any,
+            query_vector: Optional[List[float]] = None):
+        key = (normalize_query(query), limit, source)
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = _CacheEntry(
+                value=value,
+                vector=_normalize(query_vector) if query_vector is not None else None,
+                limit=limit,
+                source=source,
+                created_at=time.monotonic(),
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _normalize(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
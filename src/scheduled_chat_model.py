@@ -0,0 +1,74 @@
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+
+from src.llm_scheduler import INTERACTIVE, effective_priority, estimate_tokens, llm_scheduler
+
+
+def _result_tokens(result: ChatResult) -> Optional[int]:
+    usages = [getattr(generation.message, "usage_metadata", None) for generation in result.generations]
+    usages = [usage for usage in usages if usage]
+    return sum(usage.get("total_tokens", 0) for usage in usages) if usages else None
+
+
+def _chunk_tokens(chunk: ChatGenerationChunk) -> Optional[int]:
+    usage = getattr(chunk.message, "usage_metadata", None)
+    return usage.get("total_tokens", 0) if usage else None
+
+
+class ScheduledChatOpenAI(ChatOpenAI):
+    """
+    ChatOpenAI whose calls are admitted, paced and retried by the process-wide
+    `llm_scheduler`. Bound tools and structured output go through the same
+    methods, so wrapped models are scheduled too.
+    """
+
+    priority: str = INTERACTIVE
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        generate = super()._generate
+        if self.streaming:
+            # Delegates to `_stream`, which is scheduled itself
+            return generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        return llm_scheduler.run(
+            effective_priority(self.priority),
+            estimate_tokens(messages),
+            lambda: generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            _result_tokens
+        )
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        agenerate = super()._agenerate
+        if self.streaming:
+            return await agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        return await llm_scheduler.arun(
+            effective_priority(self.priority),
+            estimate_tokens(messages),
+            lambda: agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            _result_tokens
+        )
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        stream = super()._stream
+        yield from llm_scheduler.stream(
+            effective_priority(self.priority),
+            estimate_tokens(messages),
+            lambda: stream(messages, stop=stop, run_manager=run_manager, **kwargs),
+            _chunk_tokens
+        )
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        astream = super()._astream
+        async for chunk in llm_scheduler.astream(
+            effective_priority(self.priority),
+            estimate_tokens(messages),
+            lambda: astream(messages, stop=stop, run_manager=run_manager, **kwargs),
+            _chunk_tokens
+        ):
+            yield chunk
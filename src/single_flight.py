@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import weakref
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+from src.tracing import register_metrics
+
+_groups: "weakref.WeakSet[SingleFlight]" = weakref.WeakSet()
+
+
+class _LeaderCancelled(Exception):
+    """The call that followers were waiting on was cancelled; one of them takes over."""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for a key is in
+    flight, callers with the same key wait for its result instead of
+    issuing their own. Nothing is kept once the call finishes, so results
+    are never stale.
+
+    Sync and async callers share in-flight calls, whichever thread or event
+    loop they run on.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        _groups.add(self)
+
+    def _join(self, key: Hashable):
+        """Returns (future, is_leader) for `key`."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._in_flight[key] = future
+            self.calls += 1
+            return future, True
+
+    def _finish(self, key: Hashable):
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        while True:
+            future, is_leader = self._join(key)
+            if not is_leader:
+                try:
+                    return future.result()
+                except _LeaderCancelled:
+                    continue
+            try:
+                result = fn()
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                self._finish(key)
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            future, is_leader = self._join(key)
+            if not is_leader:
+                try:
+                    # shield: a follower giving up must not cancel the shared call
+                    return await asyncio.shield(asyncio.wrap_future(future))
+                except _LeaderCancelled:
+                    continue
+            try:
+                result = await fn()
+            except asyncio.CancelledError:
+                # e.g. the leader's client disconnected; followers still want the result
+                future.set_exception(_LeaderCancelled())
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                self._finish(key)
+
+
+def _metrics() -> List[str]:
+    # Summed by name, since clients recreated after `clients.reset()` bring their own groups
+    calls, coalesced = Counter(), Counter()
+    for group in list(_groups):
+        calls[group.name] += group.calls
+        coalesced[group.name] += group.coalesced
+    return [
+        "# HELP legal_assistant_singleflight_calls_total Calls actually executed per coalescing group.",
+        "# TYPE legal_assistant_singleflight_calls_total counter",
+        *(f'legal_assistant_singleflight_calls_total{{group="{name}"}} {count}' for name, count in sorted(calls.items())),
+        "# HELP legal_assistant_singleflight_coalesced_total Calls that waited for an identical in-flight call instead of running.",
+        "# TYPE legal_assistant_singleflight_coalesced_total counter",
+        *(f'legal_assistant_singleflight_coalesced_total{{group="{name}"}} {count}' for name, count in sorted(coalesced.items())),
+    ]
+
+
+register_metrics(_metrics)
@@ -1,24 +1,158 @@
-from langchain_core.tools import tool
+import asyncio
+import re
+
+from langchain_core.tools import StructuredTool
 from langchain_core.documents import Document
 
-from src.vector_store import VectorStoreManager
+from src import clients
+from src.retrieval_cache import RetrievalCache, normalize_query
+from src.single_flight import SingleFlight
+from src.lexical_index import find_section_references
+from src.rerank import diversify, passage_label
 from config.settings import settings
 
-vector_store_manager = VectorStoreManager()
+retrieval_cache = RetrievalCache(
+    max_entries=settings.RETRIEVAL_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RETRIEVAL_CACHE_TTL_SECONDS,
+    semantic_distance=settings.RETRIEVAL_CACHE_SEMANTIC_DISTANCE
+)
+# Sessions asking the same question at the same moment share one search
+retrieval_flight = SingleFlight("retrieval")
 
 def _format_docs(docs: list[Document]) -> str:
     formatted_docs = "\n\n---\n\n".join(
         [
-            f'<Document source="{doc.metadata["source"]}" page="{doc.metadata["page"]}" chunk_id="{doc.metadata["chunk_id"]}">\n{doc.page_content}\n</Document>'
+            f'<Document source="{doc.metadata["source"]}" page="{doc.metadata["page"]}" chunk_id="{passage_label(doc)}"{_section_attribute(doc)}>\n{doc.page_content}\n</Document>'
             for i, doc in enumerate(docs)
         ]
     )
     return formatted_docs
 
 
-# Tool to search knowledge base
-@tool
-def search_knowledge_base(query: str, limit: int = settings.RETRIEVAL_TOP_K, source: str = None) -> str:
+def _section_attribute(doc: Document) -> str:
+    """Where the chunk sits in the statute, e.g. ` section="PART II > Section 23"`, for chunks from the legal-structure chunker."""
+    hierarchy = doc.metadata.get("hierarchy")
+    return f' section="{hierarchy}"' if hierarchy else ""
+
+
+def _chunk_key(doc: Document) -> tuple:
+    return (doc.metadata.get("source"), int(doc.metadata.get("page", 0)), int(doc.metadata.get("chunk_id", 0)))
+
+
+def _reciprocal_rank_fusion(ranked_lists: list[list[Document]], weights: list[float], k: int = settings.RRF_K) -> list[Document]:
+    """Merges ranked result lists, scoring each chunk by sum(weight / (k + rank))."""
+    scores = {}
+    documents = {}
+    for ranked, weight in zip(ranked_lists, weights):
+        for rank, doc in enumerate(ranked, start=1):
+            key = _chunk_key(doc)
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+            documents.setdefault(key, doc)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def _lexical_weight(query: str) -> float:
+    """Leans on exact token matching when the query cites a provision or quotes a term."""
+    if find_section_references(query) or re.search(r'"[^"]+"', query):
+        return settings.HYBRID_LEXICAL_WEIGHT_EXACT
+    return settings.HYBRID_LEXICAL_WEIGHT
+
+
+def _fuse_with_lexical(query: str, scored_docs: list, lexical_hits: list, limit: int) -> list[tuple[Document, float]]:
+    """Fuses dense and lexical rankings, keeping the dense similarity (None for lexical-only hits)."""
+    similarities = {_chunk_key(doc): score for doc, score in scored_docs}
+    fused = _reciprocal_rank_fusion(
+        [[doc for doc, _ in scored_docs], [doc for doc, _ in lexical_hits]],
+        [settings.HYBRID_DENSE_WEIGHT, _lexical_weight(query)]
+    )[:limit]
+    return [(doc, similarities.get(_chunk_key(doc))) for doc in fused]
+
+
+def _fetch_k(limit: int) -> int:
+    return limit * settings.RERANK_FETCH_MULTIPLIER if settings.RERANK_ENABLED else limit
+
+
+def _diversify(scored_docs: list, vectors, limit: int) -> list[tuple[Document, float]]:
+    """Picks a non-redundant top `limit` from over-fetched candidates, merging neighbouring chunks."""
+    return diversify(
+        scored_docs,
+        vectors,
+        limit,
+        lambda_mult=settings.RERANK_MMR_LAMBDA,
+        rank_constant=settings.RRF_K,
+        max_overlap=settings.CHUNK_OVERLAP,
+        max_merged_chunks=settings.RERANK_MAX_MERGED_CHUNKS
+    )
+
+
+def _retrieve_documents(query: str, limit: int, source: str = None) -> list[tuple[Document, float]]:
+    """
+    Hybrid (vector + BM25) search with a result cache in front of both indexes.
+    Concurrent identical searches are coalesced into one.
+    Returns (document, dense similarity) pairs.
+    """
+    version = clients.get_vector_store_manager().get_kb_version()
+    scored_docs = retrieval_cache.get(query, limit, source, version)
+    if scored_docs is not None:
+        return scored_docs
+    return retrieval_flight.do(
+        (normalize_query(query), limit, source, version),
+        lambda: _search_documents(query, limit, source, version)
+    )
+
+
+def _search_documents(query: str, limit: int, source: str, version: str) -> list[tuple[Document, float]]:
+    vector_store_manager = clients.get_vector_store_manager()
+    query_vector = vector_store_manager.embeddings.embed_query(query)
+    # Near-duplicate reuse is unsafe when the query hinges on an exact provision number
+    scored_docs = None if find_section_references(query) else retrieval_cache.get_similar(query_vector, limit, source, version)
+    if scored_docs is None:
+        fetch_k = _fetch_k(limit)
+        scored_docs = vector_store_manager.search_documents(query_vector, k=fetch_k, source=source)
+        if settings.HYBRID_SEARCH_ENABLED:
+            lexical_hits = vector_store_manager.lexical_index.search(query, k=fetch_k, source=source)
+            scored_docs = _fuse_with_lexical(query, scored_docs, lexical_hits, fetch_k)
+        if settings.RERANK_ENABLED and scored_docs:
+            vectors = vector_store_manager.get_chunk_vectors([doc for doc, _ in scored_docs])
+            scored_docs = _diversify(scored_docs, vectors, limit)
+    retrieval_cache.put(query, limit, source, version, scored_docs, query_vector)
+    return scored_docs
+
+
+async def _aretrieve_documents(query: str, limit: int, source: str = None) -> list[tuple[Document, float]]:
+    """Async variant of `_retrieve_documents`; coalesces with sync callers too."""
+    version = await asyncio.to_thread(clients.get_vector_store_manager().get_kb_version)
+    scored_docs = retrieval_cache.get(query, limit, source, version)
+    if scored_docs is not None:
+        return scored_docs
+    return await retrieval_flight.ado(
+        (normalize_query(query), limit, source, version),
+        lambda: _asearch_documents(query, limit, source, version)
+    )
+
+
+async def _asearch_documents(query: str, limit: int, source: str, version: str) -> list[tuple[Document, float]]:
+    vector_store_manager = clients.get_vector_store_manager()
+    query_vector = await vector_store_manager.embeddings.aembed_query(query)
+    scored_docs = None if find_section_references(query) else retrieval_cache.get_similar(query_vector, limit, source, version)
+    if scored_docs is None:
+        fetch_k = _fetch_k(limit)
+        if settings.HYBRID_SEARCH_ENABLED:
+            scored_docs, lexical_hits = await asyncio.gather(
+                vector_store_manager.asearch_documents(query_vector, k=fetch_k, source=source),
+                asyncio.to_thread(vector_store_manager.lexical_index.search, query, fetch_k, source)
+            )
+            scored_docs = _fuse_with_lexical(query, scored_docs, lexical_hits, fetch_k)
+        else:
+            scored_docs = await vector_store_manager.asearch_documents(query_vector, k=fetch_k, source=source)
+        if settings.RERANK_ENABLED and scored_docs:
+            vectors = await asyncio.to_thread(vector_store_manager.get_chunk_vectors, [doc for doc, _ in scored_docs])
+            scored_docs = _diversify(scored_docs, vectors, limit)
+    retrieval_cache.put(query, limit, source, version, scored_docs, query_vector)
+    return scored_docs
+
+
+def _search_knowledge_base(query: str, limit: int = settings.RETRIEVAL_TOP_K, source: str = None) -> tuple[str, list]:
     """
     Searches the knowledgebase for relevant legal documents.
     Args:
@@ -31,11 +165,20 @@ def search_knowledge_base(query: str, limit: int = settings.RETRIEVAL_TOP_K, sou
         str: A string representation of the retrieved documents, 
             each wrapped in a `<Document>` XML tag
     """
-    vector_store = vector_store_manager.get_vector_store()
-    documents = vector_store.similarity_search(
-        query, 
-        k=limit,
-        filter={"source": source} if source else None
-    )
-    
-    return _format_docs(documents)
\ No newline at end of file
+    scored_docs = _retrieve_documents(query, limit, source)
+    return _format_docs([doc for doc, _ in scored_docs]), scored_docs
+
+
+async def _asearch_knowledge_base(query: str, limit: int = settings.RETRIEVAL_TOP_K, source: str = None) -> tuple[str, list]:
+    scored_docs = await _aretrieve_documents(query, limit, source)
+    return _format_docs([doc for doc, _ in scored_docs]), scored_docs
+
+
+# Tool to search knowledge base (sync and async implementations).
+# The (document, similarity) pairs ride along as the ToolMessage artifact for local relevance scoring.
+search_knowledge_base = StructuredTool.from_function(
+    func=_search_knowledge_base,
+    coroutine=_asearch_knowledge_base,
+    name="search_knowledge_base",
+    response_format="content_and_artifact"
+)
@@ -0,0 +1,202 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+
+# Extra metric sections (e.g. cache or scheduler counters) contributed by other modules
+_metric_providers = []
+
+
+class Span:
+    """A timed unit of work within a turn. Attributes can be added while it is open."""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = dict(attributes)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def record_usage(self, message):
+        """Adds token usage from an AIMessage (or a structured-output raw response) to the span."""
+        usage = getattr(message, "usage_metadata", None)
+        if not usage:
+            return
+        for key in ("input_tokens", "output_tokens", "total_tokens"):
+            self.attributes[key] = self.attributes.get(key, 0) + usage.get(key, 0)
+
+
+class Tracer:
+    """
+    Records spans to a local JSONL sink and keeps recent per-stage latencies
+    in memory for the Prometheus endpoint.
+    """
+
+    def __init__(self, path: str, enabled: bool = True, max_bytes: int = 50_000_000, window: int = 2048):
+        self.path = path
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self._durations: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._sums: Dict[str, float] = defaultdict(float)
+        self._tokens: Dict[str, int] = defaultdict(int)
+        self._errors: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        if enabled:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        span = Span(name, attributes)
+        started_at = time.time()
+        start = time.perf_counter()
+        error = None
+        try:
+            yield span
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            self._record(span, started_at, duration, error)
+
+    def _record(self, span: Span, started_at: float, duration: float, error: Optional[str]):
+        if not self.enabled:
+            return
+        record = {
+            "trace_id": _trace_id.get(),
+            "span": span.name,
+            "start": started_at,
+            "duration_ms": round(duration * 1000, 3),
+            "error": error,
+            **span.attributes,
+        }
+        with self._lock:
+            self._durations[span.name].append(duration)
+            self._counts[span.name] += 1
+            self._sums[span.name] += duration
+            self._tokens[span.name] += span.attributes.get("total_tokens", 0)
+            if error:
+                self._errors[span.name] += 1
+            try:
+                self._rotate_if_needed()
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(record, default=str) + "\n")
+            except OSError as e:
+                logger.warning(f"Failed to write trace record: {e}")
+
+    def _rotate_if_needed(self):
+        if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+            os.replace(self.path, self.path + ".1")
+
+    def render_prometheus(self) -> str:
+        """Renders stage latencies, token usage and errors in the Prometheus text format."""
+        lines = [
+            "# HELP legal_assistant_stage_duration_seconds Latency of graph stages over recent spans.",
+            "# TYPE legal_assistant_stage_duration_seconds summary",
+        ]
+        with self._lock:
+            for stage, durations in sorted(self._durations.items()):
+                for quantile in (0.5, 0.95, 0.99):
+                    value = float(np.quantile(list(durations), quantile))
+                    lines.append(f'legal_assistant_stage_duration_seconds{{stage="{stage}",quantile="{quantile}"}} {value:.6f}')
+                lines.append(f'legal_assistant_stage_duration_seconds_sum{{stage="{stage}"}} {self._sums[stage]:.6f}')
+                lines.append(f'legal_assistant_stage_duration_seconds_count{{stage="{stage}"}} {self._counts[stage]}')
+            lines += [
+                "# HELP legal_assistant_stage_tokens_total LLM tokens consumed per stage.",
+                "# TYPE legal_assistant_stage_tokens_total counter",
+            ]
+            lines += [f'legal_assistant_stage_tokens_total{{stage="{stage}"}} {tokens}' for stage, tokens in sorted(self._tokens.items())]
+            lines += [
+                "# HELP legal_assistant_stage_errors_total Spans that raised an exception.",
+                "# TYPE legal_assistant_stage_errors_total counter",
+            ]
+            lines += [f'legal_assistant_stage_errors_total{{stage="{stage}"}} {errors}' for stage, errors in sorted(self._errors.items())]
+        for provider in _metric_providers:
+            lines += provider()
+        return "\n".join(lines) + "\n"
+
+
+tracer = Tracer(settings.TRACE_PATH, enabled=settings.TRACING_ENABLED)
+
+
+def register_metrics(provider):
+    """Registers a callable returning extra Prometheus text lines for the metrics endpoint."""
+    _metric_providers.append(provider)
+
+
+@contextmanager
+def trace_turn(**attributes) -> Iterator[Span]:
+    """Opens a new trace for one conversational turn; spans recorded inside share its trace_id."""
+    token = _trace_id.set(uuid.uuid4().hex)
+    try:
+        with tracer.span("turn", **attributes) as span:
+            yield span
+    finally:
+        _trace_id.reset(token)
+
+
+def start_metrics_server(port: int, host: str = settings.METRICS_HOST) -> ThreadingHTTPServer:
+    """Serves `GET /metrics` in Prometheus text format from a daemon thread."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = tracer.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Serving Prometheus metrics on {host}:{port}/metrics")
+    return server
+
+
+def load_stage_percentiles(path: str = settings.TRACE_PATH, limit: int = 20000) -> List[Dict[str, Any]]:
+    """Reads the most recent spans from the JSONL sink and computes p50/p95/p99 latency per stage."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        records = deque(f, maxlen=limit)
+
+    durations = defaultdict(list)
+    for line in records:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        durations[record["span"]].append(record["duration_ms"])
+
+    return [
+        {
+            "stage": stage,
+            "count": len(values),
+            "p50_ms": round(float(np.percentile(values, 50)), 1),
+            "p95_ms": round(float(np.percentile(values, 95)), 1),
+            "p99_ms": round(float(np.percentile(values, 99)), 1),
+        }
+        for stage, values in sorted(durations.items())
+    ]
@@ -1,11 +1,18 @@
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from langchain.schema import Document
-from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from pinecone import Pinecone, ServerlessSpec
+from langchain_core.vectorstores import VectorStore
 from config.settings import settings
-import streamlit as st
+from src import clients
+from src.ingestion_manifest import IngestionManifest, IngestionPlan, chunk_vector_id
+from src.local_vector_store import LocalVectorStore
+from src.lexical_index import BM25Index
+from src.dedup import normalize
+from src.single_flight import SingleFlight
+import numpy as np
 import logging
+import os
+import time
+import uuid
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -13,72 +20,314 @@ logger = logging.getLogger(__name__)
 
 class VectorStoreManager:
     def __init__(self):
-        self.embeddings = OpenAIEmbeddings(
-            model=settings.EMBEDDING_MODEL,
-            openai_api_key=settings.OPENAI_API_KEY
-        )
+        self.embeddings = clients.get_embeddings()
         self.index_name = settings.PINECONE_INDEX_NAME
         self.faq_namespace = settings.PINECONE_FAQ_NAMESPACE
-        self._initialize_pinecone()
+        self.manifest = IngestionManifest(settings.INGESTION_MANIFEST_PATH)
+        self.lexical_index = BM25Index(settings.LEXICAL_INDEX_PATH)
+        self.backend = settings.VECTOR_STORE_BACKEND
+        self._stores: Dict[Optional[str], VectorStore] = {}
+        # Related-question lookups for a trending question arrive together
+        self._faq_flight = SingleFlight("faq_lookup")
+    
+    def _index(self):
+        """Shared Pinecone index handle; the client and the index check are set up on first use."""
+        return clients.get_pinecone_index(self.index_name)
     
-    def _initialize_pinecone(self):
-        """Initialize Pinecone client and index"""
-        pc = Pinecone(api_key=settings.PINECONE_API_KEY)
-        
-        # Check if index exists, create if not
-        if self.index_name not in pc.list_indexes().names():
-            logger.info(f"Creating Pinecone index: {self.index_name}")
-            pc.create_index(
-                name=self.index_name,
-                dimension=3072, # Dimension for text-embedding-3-large
-                metric="cosine",
-                spec=ServerlessSpec(cloud="aws", region="us-east-1")
-            )
-        else:
-            logger.info(f"Pinecone index '{self.index_name}' already exists.")
-
     def store_documents(self, documents: List[Document]) -> bool:
-        """Store documents in Pinecone vector store (default namespace)"""
+        """
+        Store documents in Pinecone vector store (default namespace).
+        Only new or changed chunks are embedded; chunks that disappeared from a source are deleted.
+        """
         try:
-            PineconeVectorStore.from_documents(
-                documents=documents,
-                embedding=self.embeddings,
-                index_name=self.index_name
+            plan = self.plan_ingestion(documents)
+            try:
+                if plan.to_upsert:
+                    vectors = self.embeddings.embed_documents([doc.page_content for doc in plan.to_upsert])
+                    self.upsert_chunks(plan.to_upsert, vectors)
+                # Only once the replacements are stored, so a failure leaves the old chunks searchable
+                self.remove_chunks(plan.to_delete)
+            finally:
+                if plan.to_delete or plan.to_upsert:
+                    self.bump_kb_version()
+            logger.info(
+                f"Upserted {len(plan.to_upsert)} chunks, deleted {len(plan.to_delete)}, "
+                f"skipped {plan.unchanged} unchanged."
             )
             return True
         except Exception as e:
-            st.error(f"Error storing documents: {str(e)}")
+            logger.error(f"Error storing documents: {str(e)}")
             return False
     
-    def get_vector_store(self, namespace: Optional[str] = None) -> PineconeVectorStore:
-        """Get Pinecone vector store instance for a given namespace."""
-        return PineconeVectorStore(
-            index_name=self.index_name,
-            embedding=self.embeddings,
-            namespace=namespace
+    def plan_ingestion(self, documents: List[Document]) -> IngestionPlan:
+        """Diffs complete per-source chunk lists against the ingestion manifest."""
+        for source in dict.fromkeys(doc.metadata['source'] for doc in documents):
+            if not self.manifest.has_source(source):
+                self._adopt_unmanifested_chunks(source)
+        plan = self.manifest.plan(documents)
+
+        # Backfill the lexical index for chunks embedded before it existed
+        pending = {id(doc) for doc in plan.to_upsert}
+        unchanged = [doc for doc in documents if id(doc) not in pending]
+        ids = [chunk_vector_id(doc.metadata) for doc in unchanged]
+        missing = self.lexical_index.missing(ids)
+        if missing:
+            backfill = [(doc, vector_id) for doc, vector_id in zip(unchanged, ids) if vector_id in missing]
+            self.lexical_index.add([doc for doc, _ in backfill], [vector_id for _, vector_id in backfill])
+        return plan
+
+    def _adopt_unmanifested_chunks(self, source: str):
+        """
+        One-off migration for a source first ingested before the manifest existed: its vectors are
+        stored under random IDs, so they are added to the manifest and replaced like stale chunks.
+        """
+        if self.backend == "local":
+            vector_ids = self.get_vector_store().get_ids({"source": source})
+        else:
+            index = self._index()
+            # A filtered query is the metadata lookup every Pinecone index type supports; any probe vector will do
+            probe = [1.0] + [0.0] * (index.describe_index_stats().dimension - 1)
+            matches = index.query(vector=probe, top_k=10000, filter={"source": {"$eq": source}}).matches
+            vector_ids = [match.id for match in matches]
+        if vector_ids:
+            self.manifest.adopt(source, vector_ids)
+            logger.info(f"Found {len(vector_ids)} chunks of '{source}' without manifest entries; they will be replaced.")
+
+    def upsert_chunks(self, documents: List[Document], vectors: List[List[float]]):
+        """
+        Upserts knowledge base chunks under deterministic IDs, indexes them lexically and records them in the manifest.
+        Like `remove_chunks`, leaves `bump_kb_version` to the caller.
+        """
+        ids = [chunk_vector_id(doc.metadata) for doc in documents]
+        self.upsert_embeddings(documents, vectors, ids=ids)
+        self.lexical_index.add(documents, ids)
+        self.manifest.record(documents)
+
+    def remove_chunks(self, vector_ids: List[str]):
+        """Deletes knowledge base chunks from both indexes and drops them from the manifest."""
+        if not vector_ids:
+            return
+        if self.backend == "local":
+            self.get_vector_store().delete(ids=vector_ids)
+        else:
+            index = self._index()
+            for start in range(0, len(vector_ids), 1000):
+                index.delete(ids=vector_ids[start:start + 1000])
+        self.lexical_index.remove(vector_ids)
+        self.manifest.remove(vector_ids)
+
+    def upsert_embeddings(self, documents: List[Document], vectors: List[List[float]],
+                          ids: Optional[List[str]] = None, namespace: Optional[str] = None):
+        """Upserts documents with precomputed embeddings, bypassing the embedding client."""
+        ids = ids or [str(uuid.uuid4()) for _ in documents]
+        if self.backend == "local":
+            self.get_vector_store(namespace).add_embeddings(
+                vectors,
+                [doc.page_content for doc in documents],
+                metadatas=[doc.metadata for doc in documents],
+                ids=ids
+            )
+            return
+
+        records = [
+            {
+                "id": vector_id,
+                "values": vector,
+                "metadata": {**doc.metadata, "text": doc.page_content}
+            }
+            for vector_id, doc, vector in zip(ids, documents, vectors)
+        ]
+        index = self._index()
+        # Keep requests well under Pinecone's 2MB limit for 3072-dim vectors
+        for start in range(0, len(records), 100):
+            index.upsert(vectors=records[start:start + 100], namespace=namespace)
+
+    def get_kb_version(self) -> str:
+        """Returns a marker that changes whenever new chunks are written to the knowledge base."""
+        try:
+            with open(settings.KB_VERSION_PATH, 'r') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return "0"
+
+    def bump_kb_version(self):
+        """
+        Invalidates cached retrievals and answers. Writers of knowledge base chunks
+        call it once when they finish, not per batch, so caches are not rebuilt mid-ingestion.
+        """
+        os.makedirs(os.path.dirname(settings.KB_VERSION_PATH), exist_ok=True)
+        with open(settings.KB_VERSION_PATH, 'w') as f:
+            f.write(str(time.time_ns()))
+
+    def get_vector_store(self, namespace: Optional[str] = None) -> VectorStore:
+        """Get the vector store instance for a given namespace on the configured backend."""
+        if namespace not in self._stores:
+            if self.backend == "local":
+                self._stores[namespace] = LocalVectorStore(
+                    settings.LOCAL_VECTOR_STORE_PATH,
+                    embedding=self.embeddings,
+                    namespace=namespace,
+                    ann_min_vectors=settings.LOCAL_ANN_MIN_VECTORS,
+                    ann_probes=settings.LOCAL_ANN_PROBES
+                )
+            else:
+                from langchain_pinecone import PineconeVectorStore
+                self._stores[namespace] = PineconeVectorStore(
+                    index=self._index(),
+                    embedding=self.embeddings,
+                    namespace=namespace
+                )
+        return self._stores[namespace]
+
+    def search_documents(self, query_vector: List[float], k: int, source: Optional[str] = None) -> List[Tuple[Document, float]]:
+        """
+        Dense search over the knowledge base, optionally restricted to one source document.
+        Returns (document, cosine similarity) pairs.
+        """
+        return self.get_vector_store().similarity_search_by_vector_with_score(
+            query_vector,
+            k=k,
+            filter={"source": source} if source else None
+        )
+
+    async def asearch_documents(self, query_vector: List[float], k: int, source: Optional[str] = None) -> List[Tuple[Document, float]]:
+        """Async variant of `search_documents`."""
+        return await self.get_vector_store().asimilarity_search_by_vector_with_score(
+            query_vector,
+            k=k,
+            filter={"source": source} if source else None
         )
 
+    def get_chunk_vectors(self, documents: List[Document]) -> np.ndarray:
+        """
+        Normalized stored vectors of knowledge base chunks, one row per document.
+        Chunks missing from the index (e.g. deleted since they were retrieved) are re-embedded.
+        """
+        # Pinecone returns numeric metadata as floats (page 3.0), which would not match the stored IDs
+        ids = [
+            chunk_vector_id({**doc.metadata, "page": int(doc.metadata["page"]), "chunk_id": int(doc.metadata["chunk_id"])})
+            for doc in documents
+        ]
+        if self.backend == "local":
+            found = self.get_vector_store().get_vectors(ids)
+        else:
+            fetched = self._index().fetch(ids=list(dict.fromkeys(ids))).vectors
+            found = {vector_id: record.values for vector_id, record in fetched.items()}
+        missing = [i for i, vector_id in enumerate(ids) if vector_id not in found]
+        if missing:
+            vectors = self.embeddings.embed_documents([documents[i].page_content for i in missing])
+            found.update((ids[i], vector) for i, vector in zip(missing, vectors))
+        return normalize([found[vector_id] for vector_id in ids])
+
     def add_suggested_questions(self, questions: List[str]):
-        """Adds a list of questions to the suggestion namespace in Pinecone."""
+        """
+        Adds a list of questions to the suggestion namespace in Pinecone.
+        A question that paraphrases a stored one (or an earlier one in the
+        list) bumps the stored question's frequency instead of being added.
+        """
         if not questions:
             return
         try:
             faq_vector_store = self.get_vector_store(namespace=self.faq_namespace)
-            faq_vector_store.add_texts(questions)
-            logger.info(f"Stored {len(questions)} suggested questions.")
+            vectors = normalize(self.embeddings.embed_documents(questions))
+            threshold = settings.DEDUP_SIMILARITY_THRESHOLD
+            new_rows: List[int] = []
+            merged = 0
+            for row, (question, vector) in enumerate(zip(questions, vectors)):
+                if new_rows and float(np.max(vectors[new_rows] @ vector)) >= threshold:
+                    merged += 1
+                    continue
+                matches = faq_vector_store.similarity_search_by_vector_with_score(vector.tolist(), k=1)
+                if matches and matches[0][1] >= threshold:
+                    existing, _ = matches[0]
+                    frequency = int(existing.metadata.get("frequency", 1)) + 1
+                    self.update_vector_metadata(existing.id, {"frequency": frequency}, namespace=self.faq_namespace)
+                    merged += 1
+                    continue
+                new_rows.append(row)
+
+            if new_rows:
+                self.upsert_embeddings(
+                    [Document(page_content=questions[row], metadata={"frequency": 1}) for row in new_rows],
+                    vectors[new_rows].tolist(),
+                    namespace=self.faq_namespace
+                )
+            logger.info(f"Stored {len(new_rows)} suggested questions, merged {merged} near-duplicates.")
         except Exception as e:
             logger.error(f"Failed to add suggested questions to Pinecone: {e}")
+            raise
+
+    def update_vector_metadata(self, vector_id: str, metadata: Dict, namespace: Optional[str] = None):
+        if self.backend == "local":
+            self.get_vector_store(namespace).update_metadata(vector_id, metadata)
+        else:
+            self._index().update(id=vector_id, set_metadata=metadata, namespace=namespace)
+
+    def delete_vectors(self, vector_ids: List[str], namespace: Optional[str] = None):
+        if not vector_ids:
+            return
+        if self.backend == "local":
+            self.get_vector_store(namespace).delete(ids=vector_ids)
+        else:
+            index = self._index()
+            for start in range(0, len(vector_ids), 1000):
+                index.delete(ids=vector_ids[start:start + 1000], namespace=namespace)
+
+    def load_namespace(self, namespace: Optional[str] = None) -> Tuple[List[str], np.ndarray, List[str], List[Dict]]:
+        """Returns ids, vectors, texts and metadata of every vector in a namespace (for offline maintenance)."""
+        if self.backend == "local":
+            return self.get_vector_store(namespace).get_all()
+
+        index = self._index()
+        ids, vectors, texts, metadatas = [], [], [], []
+        for page in index.list(namespace=namespace):
+            for start in range(0, len(page), 100):
+                fetched = index.fetch(ids=page[start:start + 100], namespace=namespace).vectors
+                for vector_id, record in fetched.items():
+                    metadata = dict(record.metadata or {})
+                    ids.append(vector_id)
+                    vectors.append(record.values)
+                    texts.append(metadata.pop("text", ""))
+                    metadatas.append(metadata)
+        return ids, np.asarray(vectors, dtype=np.float32), texts, metadatas
 
-    def get_similar_faq_questions(self, query: str, k: int = 3) -> List[str]:
-        """Searches for similar questions in the FAQ namespace."""
+    def get_similar_faq_questions(self, query: str, k: int = 3, query_vector: Optional[List[float]] = None) -> List[str]:
+        """
+        Searches for similar questions in the FAQ namespace, reusing `query_vector` when the caller already has it.
+        Concurrent lookups of the same question share one search.
+        """
         if not query:
             return []
         try:
-            faq_vector_store = self.get_vector_store(namespace=self.faq_namespace)
-            results = faq_vector_store.similarity_search(query, k=k)
-            similar_questions = [doc.page_content for doc in results]
-            logger.info(f"Found {len(similar_questions)} similar questions for query: '{query}'")
-            return similar_questions
+            return self._faq_flight.do((query, k), lambda: self._similar_faq_questions(query, k, query_vector))
         except Exception as e:
             logger.error(f"Failed to retrieve similar FAQ questions from Pinecone: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def _similar_faq_questions(self, query: str, k: int, query_vector: Optional[List[float]]) -> List[str]:
+        faq_vector_store = self.get_vector_store(namespace=self.faq_namespace)
+        if query_vector is None:
+            query_vector = self.embeddings.embed_query(query)
+        results = faq_vector_store.similarity_search_by_vector(query_vector, k=k)
+        similar_questions = [doc.page_content for doc in results]
+        logger.info(f"Found {len(similar_questions)} similar questions for query: '{query}'")
+        return similar_questions
+
+    async def aget_similar_faq_questions(self, query: str, k: int = 3, query_vector: Optional[List[float]] = None) -> List[str]:
+        """Async variant of `get_similar_faq_questions`."""
+        if not query:
+            return []
+        try:
+            return await self._faq_flight.ado((query, k), lambda: self._asimilar_faq_questions(query, k, query_vector))
+        except Exception as e:
+            logger.error(f"Failed to retrieve similar FAQ questions from Pinecone: {e}")
+            return []
+
+    async def _asimilar_faq_questions(self, query: str, k: int, query_vector: Optional[List[float]]) -> List[str]:
+        faq_vector_store = self.get_vector_store(namespace=self.faq_namespace)
+        if query_vector is None:
+            query_vector = await self.embeddings.aembed_query(query)
+        results = await faq_vector_store.asimilarity_search_by_vector(query_vector, k=k)
+        similar_questions = [doc.page_content for doc in results]
+        logger.info(f"Found {len(similar_questions)} similar questions for query: '{query}'")
+        return similar_questions
\ No newline at end of file